@@ -2,7 +2,6 @@
 
 import os
 import logging
-import threading
 from flask import (
     Flask,
     jsonify,
@@ -26,6 +25,11 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
 from .config import config
+from .utils.json_provider import FastJSONProvider
+from .utils.compression import init_compression
+from .utils.metrics import init_metrics
+from .utils.slow_log import init_slow_log
+from .utils.lock_stats import init_file_locks
 from .services.user_data_service import UserDataService
 
 login_manager = LoginManager()
@@ -55,6 +59,7 @@ def create_app():
         static_folder=STATIC_DIR,
         static_url_path="/static",
     )
+    app.json = FastJSONProvider(app)  # orjson-backed jsonify (stdlib fallback)
     app.config.from_object(config)
     log.info(f"Flask App Created with config: {type(config).__name__}")
     log.info(f"App Root Path: {app.root_path}")
@@ -98,14 +103,10 @@ def create_app():
     # --- End Limiter Init ---
 
     # --- Initialize Locks ---
-    if "users" in config.FILE_LOCKS and config.FILE_LOCKS["users"] is None:
-        log.info("Initializing file locks within create_app...")
-        for key in config.FILE_LOCKS:
-            if config.FILE_LOCKS[key] is None:
-                config.FILE_LOCKS[key] = threading.Lock()
-                log.debug(f"Initialized lock for '{key}'")
-        log.info("File locks initialization complete.")
-    elif "users" not in config.FILE_LOCKS:
+    # InstrumentedLocks (wait/hold stats); flock-backed when CROSS_PROCESS_LOCKS is set
+    if "users" in config.FILE_LOCKS:
+        init_file_locks(app.config)
+    else:
         log.error("FILE_LOCKS missing 'users' key. Locks not initialized.")
 
     # --- Ensure Data Directory and Users File ---
@@ -142,6 +143,24 @@ def create_app():
     from .public.routes import bp as public_bp
 
     app.register_blueprint(public_bp, url_prefix="/public")
+    from .admin.routes import bp as admin_bp
+
+    app.register_blueprint(admin_bp, url_prefix="/admin")
+    limiter.exempt(admin_bp)  # Token-gated operator endpoints
+    # Share viewers poll all day; the fixed-window defaults (50/hour) would lock them
+    # out. Public endpoints use their own per-share / per-IP token buckets instead.
+    limiter.exempt(public_bp)
+
+    # --- Response Compression (gzip/br for JSON and SVG) ---
+    init_compression(app)
+
+    # --- Metrics (request timing; /metrics when METRICS_TOKEN is set) ---
+    init_metrics(app, background_scheduler)
+    if "metrics" in app.view_functions:
+        limiter.exempt(app.view_functions["metrics"])  # Scrapers poll; the token gates access
+
+    # --- Slow Request/Job Log (queried at /admin/slow) ---
+    init_slow_log(app)
 
     # --- Initialize Scheduler ---
     if not app.config.get("TESTING", False):
@@ -176,6 +195,9 @@ def create_app():
         if request.blueprint == "public":
             log.debug("Allowing access to 'public' blueprint endpoint.")
             return
+        # --- 'admin' endpoints authenticate with ADMIN_TOKEN themselves ---
+        if request.blueprint == "admin":
+            return
 
         # --- Allow specific non-blueprint endpoints (like static) ---
         allowed_endpoints_no_login = {
@@ -187,6 +209,7 @@ def create_app():
             "main.manifest",
             "main.favicon",
             "main.service_worker",
+            "metrics",  # Bearer-token protected (see init_metrics)
             # Add other truly public root endpoints here if any
         }
         endpoint = request.endpoint
@@ -0,0 +1,8 @@
+# app/admin/__init__.py
+from flask import Blueprint
+
+# Note: url_prefix='/admin' will be added during registration in app/__init__.py
+bp = Blueprint('admin', __name__)
+
+# Import routes after blueprint creation
+from . import routes # noqa
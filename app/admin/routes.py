@@ -0,0 +1,102 @@
+# app/admin/routes.py
+# Operator/debug endpoints, authenticated with `Authorization: Bearer <ADMIN_TOKEN>`.
+
+import hmac
+import logging
+import math
+import threading
+from datetime import datetime, timezone
+
+from flask import Response, abort, current_app, jsonify, request
+
+from app.utils.json_utils import dumps_bytes
+from app.utils.lock_stats import lock_snapshots
+from app.utils.sampling_profiler import ProfilerBusy, profile_threads
+from app.utils.slow_log import recent_entries, thresholds_ms
+
+# Use the blueprint defined in app/admin/__init__.py
+from . import bp
+
+log = logging.getLogger(__name__)
+
+
+@bp.before_request
+def require_admin_token():
+    """Hides the blueprint (404) without ADMIN_TOKEN; otherwise requires the bearer token."""
+    token = current_app.config.get("ADMIN_TOKEN")
+    if not token:
+        abort(404)
+    supplied = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(supplied.encode("utf-8"), f"Bearer {token}".encode("utf-8")):
+        log.warning(f"Rejected admin request to {request.path} from {request.remote_addr}")
+        abort(401)
+
+
+@bp.route("/locks", methods=["GET"])
+def get_lock_status():
+    """Current holder/waiters and wait/hold statistics for every instrumented lock."""
+    return jsonify({
+        "locks": lock_snapshots(),
+        "threads": sorted(t.name for t in threading.enumerate()),
+    })
+
+
+@bp.route("/slow", methods=["GET"])
+def get_slow_log():
+    """Recent slow requests/jobs, newest first (`kind=request|job`, `min_ms=`, `limit=`)."""
+    kind = request.args.get("kind") or None
+    if kind not in (None, "request", "job"):
+        abort(400, description="kind must be 'request' or 'job'.")
+    try:
+        min_ms = float(request.args.get("min_ms", 0))
+        limit = max(1, min(int(request.args.get("limit", 50)), 1000))
+    except ValueError:
+        abort(400, description="min_ms and limit must be numbers.")
+    return jsonify({
+        "thresholds_ms": thresholds_ms(),
+        "entries": recent_entries(kind=kind, min_ms=min_ms, limit=limit),
+    })
+
+
+@bp.route("/profile", methods=["GET"])
+def run_profile():
+    """
+    Samples all threads for `seconds` (default 10, capped at PROFILER_MAX_SECONDS)
+    every `interval_ms` (default 10, floored at PROFILER_MIN_INTERVAL_MS) and
+    returns collapsed stacks (`format=collapsed`, for flamegraph.pl) or a
+    speedscope file (`format=speedscope`). `idle=1` keeps parked threads.
+    Blocks this request thread for the duration; one profile runs at a time.
+    """
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval_ms = float(request.args.get("interval_ms", 10))
+    except ValueError:
+        abort(400, description="seconds and interval_ms must be numbers.")
+    output_format = request.args.get("format", "collapsed")
+    if output_format not in ("collapsed", "speedscope"):
+        abort(400, description="format must be 'collapsed' or 'speedscope'.")
+    max_seconds = float(current_app.config.get("PROFILER_MAX_SECONDS", 60))
+    if not 0 < seconds <= max_seconds:
+        abort(400, description=f"seconds must be between 0 and {max_seconds:g}.")
+    if not math.isfinite(interval_ms):
+        abort(400, description="interval_ms must be a finite number.")
+    interval_ms = max(interval_ms, float(current_app.config.get("PROFILER_MIN_INTERVAL_MS", 5)))
+    include_idle = request.args.get("idle", "").lower() in ("1", "true", "yes")
+
+    log.info(f"Admin profile started: {seconds:g}s at {interval_ms:g}ms ({output_format}).")
+    try:
+        result = profile_threads(seconds, interval_ms / 1000.0, include_idle=include_idle)
+    except ProfilerBusy as e:
+        return jsonify({"error": "Conflict", "message": str(e)}), 409
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    if output_format == "speedscope":
+        body = dumps_bytes(result.to_speedscope(name=f"findmy-webapp {stamp}"))
+        filename, mimetype = f"profile-{stamp}.speedscope.json", "application/json"
+    else:
+        body = result.to_collapsed()
+        filename, mimetype = f"profile-{stamp}.collapsed.txt", "text/plain"
+    response = Response(body, mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response.headers["X-Profile-Samples"] = str(result.sample_count)
+    return response
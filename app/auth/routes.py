@@ -75,12 +75,7 @@ def register_route():
         password = form.password.data
         uds = UserDataService(current_app.config)
         try:
-            existing_users = uds.load_users()
-            if any(
-                u_data.get("email", "").lower() == email
-                for u_data in existing_users.values()
-                if u_data.get("email")
-            ):
+            if uds.get_user_id_by_email(email):
                 flash(f"Email address '{email}' is already registered.", "error")
                 return render_template("register.html", title="Register", form=form)
         except Exception as e:
@@ -93,6 +88,7 @@ def register_route():
             if not user_dir:
                 raise IOError(f"Could not create data directory for user '{username}'.")
             new_user_data = {"email": email, "password_hash": hashed_password}
+            existing_users = uds.load_users()
             existing_users[username] = new_user_data
             uds.save_users(existing_users)
             log.info(f"New user registered: '{username}' ({email})")
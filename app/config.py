@@ -119,6 +119,58 @@ class Config:
     USERS_FILE = DATA_DIRECTORY / "users.json"
     SHARES_FILE = DATA_DIRECTORY / "shares.json"
     DEFAULT_SHARE_DURATION_HOURS = int(os.getenv("DEFAULT_SHARE_DURATION_HOURS", 24))
+    # Expired shares are popped off the registry's expiry heap, so this can run often
+    SHARE_PRUNE_INTERVAL_SECONDS = int(os.getenv("SHARE_PRUNE_INTERVAL_SECONDS", 60))
+    # Lower bound for the public share Cache-Control max-age (used once a fetch is overdue)
+    PUBLIC_SHARE_MIN_MAX_AGE_SECONDS = int(os.getenv("PUBLIC_SHARE_MIN_MAX_AGE_SECONDS", 15))
+    # Token-bucket limits for anonymous share viewers (burst capacity + refill per second)
+    PUBLIC_RATE_LIMIT_ENABLED = os.getenv("PUBLIC_RATE_LIMIT_ENABLED", "true").lower() in ("true", "1", "yes")
+    PUBLIC_RATE_LIMIT_PER_SHARE_BURST = int(os.getenv("PUBLIC_RATE_LIMIT_PER_SHARE_BURST", 120))
+    PUBLIC_RATE_LIMIT_PER_SHARE_PER_SECOND = float(os.getenv("PUBLIC_RATE_LIMIT_PER_SHARE_PER_SECOND", 2))
+    PUBLIC_RATE_LIMIT_PER_IP_BURST = int(os.getenv("PUBLIC_RATE_LIMIT_PER_IP_BURST", 20))
+    PUBLIC_RATE_LIMIT_PER_IP_PER_SECOND = float(os.getenv("PUBLIC_RATE_LIMIT_PER_IP_PER_SECOND", 0.5))
+    # "memory" (per process) or "file" (shared between processes via PUBLIC_RATE_LIMIT_STORE_FILE)
+    PUBLIC_RATE_LIMIT_STORE = os.getenv("PUBLIC_RATE_LIMIT_STORE", "memory")
+    PUBLIC_RATE_LIMIT_STORE_FILE = os.getenv("PUBLIC_RATE_LIMIT_STORE_FILE", None)
+    # gzip (and Brotli, if the 'brotli' package is installed) for JSON/SVG responses
+    RESPONSE_COMPRESSION_ENABLED = os.getenv("RESPONSE_COMPRESSION_ENABLED", "true").lower() in ("true", "1", "yes")
+    RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", 1024))
+    RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", 6))
+    RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", 5))
+    # Bearer token for the Prometheus /metrics endpoint (endpoint disabled when unset)
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    # Bearer token for operator endpoints under /admin (lock debug, profiler, ...; disabled when unset)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    # /admin/profile sampling profiler: longest allowed run and fastest sampling rate
+    PROFILER_MAX_SECONDS = int(os.getenv("PROFILER_MAX_SECONDS", 60))
+    PROFILER_MIN_INTERVAL_MS = int(os.getenv("PROFILER_MIN_INTERVAL_MS", 5))
+    # Slow request/job log (ring buffer at /admin/slow): entries keep files touched, lock waits and a stack
+    SLOW_LOG_ENABLED = os.getenv("SLOW_LOG_ENABLED", "true").lower() in ("true", "1", "yes")
+    SLOW_REQUEST_THRESHOLD_MS = int(os.getenv("SLOW_REQUEST_THRESHOLD_MS", 1000))
+    SLOW_JOB_THRESHOLD_MS = int(os.getenv("SLOW_JOB_THRESHOLD_MS", 60000))
+    SLOW_LOG_MAX_ENTRIES = int(os.getenv("SLOW_LOG_MAX_ENTRIES", 200))
+    # Per-fetch trace spans: OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT (e.g. http://collector:4318/v1/traces),
+    # otherwise (or when the collector is unreachable) daily JSONL files in TRACE_DIRECTORY
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("true", "1", "yes")
+    TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT")
+    TRACE_OTLP_TIMEOUT_SECONDS = float(os.getenv("TRACE_OTLP_TIMEOUT_SECONDS", 5))
+    TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "findmy-webapp")
+    TRACE_DIRECTORY = os.getenv("TRACE_DIRECTORY")  # Default: <DATA_DIRECTORY>/traces
+    TRACE_RETENTION_DAYS = int(os.getenv("TRACE_RETENTION_DAYS", 3))
+    # Several app processes on one DATA_DIRECTORY: FILE_LOCKS also take an flock on
+    # LOCK_DIRECTORY/<name>.lock, so JSON writes serialize across processes, not just threads
+    CROSS_PROCESS_LOCKS = os.getenv("CROSS_PROCESS_LOCKS", "false").lower() in ("true", "1", "yes")
+    LOCK_DIRECTORY = os.getenv("LOCK_DIRECTORY")  # Default: <DATA_DIRECTORY>/.locks
+    # Background scheduler: "leader" (only the process holding LOCK_DIRECTORY/scheduler.lock runs it;
+    # the others take over when it exits), "always" (every process) or "off"
+    SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "leader").lower()
+    SCHEDULER_LEADER_RETRY_SECONDS = int(os.getenv("SCHEDULER_LEADER_RETRY_SECONDS", 30))
+    # Fetches and scheduled jobs run in a separate `python -m app.worker` process; web processes
+    # ask it for immediate fetches and hear about finished ones through a file-based change feed
+    FETCH_WORKER_ENABLED = os.getenv("FETCH_WORKER_ENABLED", "false").lower() in ("true", "1", "yes")
+    CHANGE_FEED_FILE = os.getenv("CHANGE_FEED_FILE")  # Default: <DATA_DIRECTORY>/change_feed.jsonl
+    CHANGE_FEED_POLL_MS = int(os.getenv("CHANGE_FEED_POLL_MS", 250))
+    CHANGE_FEED_MAX_BYTES = int(os.getenv("CHANGE_FEED_MAX_BYTES", 1024 * 1024))
     USER_DEVICES_FILENAME = "devices.json"
     USER_GEOFENCES_FILENAME = "geofences.json"
     USER_SUBSCRIPTIONS_FILENAME = "subscriptions.json"
@@ -127,15 +179,67 @@ class Config:
     USER_BATTERY_STATE_FILENAME = "battery_state.json"
     USER_NOTIFICATION_TIMES_FILENAME = "notification_times.json"
     USER_APPLE_CREDS_FILENAME = "apple_credentials.json"
-    USER_NOTIFICATIONS_HISTORY_FILENAME = "notifications_history.json"
+    USER_NOTIFICATIONS_HISTORY_FILENAME = "notifications_history.json"  # Legacy; migrated to the log dir
+    USER_NOTIFICATIONS_LOG_DIRNAME = "notifications_log"
+    USER_HISTORY_ARCHIVE_DIRNAME = "history_archive"
+    USER_TIMELINE_FILENAME = "timeline.json"
+    USER_NOTIFICATION_OUTBOX_FILENAME = "notification_outbox.json"
     NOTIFICATION_HISTORY_DAYS = int(os.getenv("NOTIFICATION_HISTORY_DAYS", 30))
     LOW_BATTERY_THRESHOLD = int(os.getenv("LOW_BATTERY_THRESHOLD", 15))
     NOTIFICATION_COOLDOWN_SECONDS = int(os.getenv("NOTIFICATION_COOLDOWN_SECONDS", 300))
+    # --- Notification Outbox (durable push delivery) ---
+    NOTIFICATION_OUTBOX_INTERVAL_SECONDS = int(
+        os.getenv("NOTIFICATION_OUTBOX_INTERVAL_SECONDS", 15)
+    )
+    NOTIFICATION_OUTBOX_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_OUTBOX_MAX_ATTEMPTS", 8))
+    NOTIFICATION_OUTBOX_BACKOFF_BASE_SECONDS = int(
+        os.getenv("NOTIFICATION_OUTBOX_BACKOFF_BASE_SECONDS", 30)
+    )
+    NOTIFICATION_OUTBOX_BACKOFF_MAX_SECONDS = int(
+        os.getenv("NOTIFICATION_OUTBOX_BACKOFF_MAX_SECONDS", 3600)
+    )
+    NOTIFICATION_OUTBOX_RETENTION_HOURS = int(
+        os.getenv("NOTIFICATION_OUTBOX_RETENTION_HOURS", 24)
+    )
+    # Coalesce a fetch cycle's events into one push per subscription (history keeps every event).
+    # A window > 0 holds events across cycles until the window since the first held event elapses.
+    NOTIFICATION_DIGEST_ENABLED = os.getenv("NOTIFICATION_DIGEST_ENABLED", "true").lower() in (
+        "true",
+        "1",
+        "yes",
+    )
+    NOTIFICATION_DIGEST_WINDOW_SECONDS = int(os.getenv("NOTIFICATION_DIGEST_WINDOW_SECONDS", 0))
+    PUSH_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("PUSH_CIRCUIT_FAILURE_THRESHOLD", 3))
+    PUSH_CIRCUIT_OPEN_SECONDS = int(os.getenv("PUSH_CIRCUIT_OPEN_SECONDS", 600))
     DEFAULT_FETCH_INTERVAL_MINUTES = int(
         os.getenv("DEFAULT_FETCH_INTERVAL_MINUTES", 15)
     )
     FETCH_INTERVAL_MINUTES = int(os.getenv("FETCH_INTERVAL_MINUTES", 15))
     HISTORY_DURATION_DAYS = int(os.getenv("HISTORY_DURATION_DAYS", 7))
+    # Simplified history levels precomputed at fetch time (/api/devices?detail=low|medium|full)
+    HISTORY_DETAIL_MEDIUM_TOLERANCE_M = float(os.getenv("HISTORY_DETAIL_MEDIUM_TOLERANCE_M", 10))
+    HISTORY_DETAIL_LOW_TOLERANCE_M = float(os.getenv("HISTORY_DETAIL_LOW_TOLERANCE_M", 50))
+    HISTORY_DETAIL_LOW_BUCKET_SECONDS = int(os.getenv("HISTORY_DETAIL_LOW_BUCKET_SECONDS", 600))
+    # Merge runs of nearby reports into "stay" records (radius grows with report accuracy, capped)
+    HISTORY_STAY_COMPACTION_ENABLED = os.getenv("HISTORY_STAY_COMPACTION_ENABLED", "true").lower() in ("true", "1", "yes")
+    HISTORY_STAY_RADIUS_M = float(os.getenv("HISTORY_STAY_RADIUS_M", 25))
+    HISTORY_STAY_MAX_ACCURACY_M = float(os.getenv("HISTORY_STAY_MAX_ACCURACY_M", 100))
+    HISTORY_STAY_MIN_POINTS = int(os.getenv("HISTORY_STAY_MIN_POINTS", 3))
+    # Cold storage of raw (pre-compaction) reports as gzip'd daily JSONL per device
+    HISTORY_ARCHIVE_ENABLED = os.getenv("HISTORY_ARCHIVE_ENABLED", "false").lower() in ("true", "1", "yes")
+    HISTORY_ARCHIVE_RETENTION_DAYS = int(os.getenv("HISTORY_ARCHIVE_RETENTION_DAYS", 90))
+    # Process pool for the per-device CPU stages after a fetch (report conversion, dedupe/sort, stay
+    # compaction, detail levels); 0 keeps them in the fetch threads. Fetches below MIN_REPORTS stay
+    # inline; devices are grouped into work units of about BATCH_REPORTS reports
+    FETCH_PROCESS_POOL_WORKERS = int(os.getenv("FETCH_PROCESS_POOL_WORKERS", 0))
+    FETCH_PROCESS_POOL_MIN_REPORTS = int(os.getenv("FETCH_PROCESS_POOL_MIN_REPORTS", 2000))
+    FETCH_PROCESS_POOL_BATCH_REPORTS = int(os.getenv("FETCH_PROCESS_POOL_BATCH_REPORTS", 20000))
+    # Trip/stay timelines (/api/devices/<id>/timeline), extended after each fetch
+    TIMELINE_STAY_RADIUS_M = float(os.getenv("TIMELINE_STAY_RADIUS_M", 75))
+    TIMELINE_MIN_STAY_MINUTES = int(os.getenv("TIMELINE_MIN_STAY_MINUTES", 10))
+    TIMELINE_MIN_TRIP_DISTANCE_M = float(os.getenv("TIMELINE_MIN_TRIP_DISTANCE_M", 200))
+    TIMELINE_PLACE_RADIUS_M = float(os.getenv("TIMELINE_PLACE_RADIUS_M", 150))
+    TIMELINE_RETENTION_DAYS = int(os.getenv("TIMELINE_RETENTION_DAYS", 30))
     ANISETTE_SERVERS = [
         s.strip()
         for s in os.getenv("ANISETTE_SERVERS", "http://localhost:6969").split(",")
@@ -185,6 +289,9 @@ class Config:
         USER_NOTIFICATION_TIMES_FILENAME: None,
         USER_APPLE_CREDS_FILENAME: None,
         USER_NOTIFICATIONS_HISTORY_FILENAME: None,
+        USER_NOTIFICATION_OUTBOX_FILENAME: None,
+        USER_TIMELINE_FILENAME: None,
+        USER_HISTORY_ARCHIVE_DIRNAME: None,
     }
 
 
@@ -3,7 +3,6 @@ import logging
 import time
 import re
 import os
-import threading
 import traceback
 import shutil
 import uuid  # Added for share IDs
@@ -13,7 +12,7 @@ import json
 
 from typing import List, Optional
 from datetime import datetime, timezone, timedelta  # Ensure timedelta is imported
-from app.scheduler.tasks import run_fetch_for_user_task
+from app.scheduler.tasks import request_user_fetch
 from app.utils.json_utils import save_json_atomic, load_json_file
 from app.utils.helpers import get_potential_mac_from_public_key
 
@@ -38,6 +37,11 @@ from flask_login import login_required, current_user
 # Import UserDataService to load keys file content (if helper isn't sufficient)
 from app.services.user_data_service import UserDataService
 from app.services.notification_service import NotificationService
+from app.services.device_payload_cache import DevicePayloadCache
+from app.services.timeline_service import TimelineService
+from app.utils.compression import PrecompressedBody
+from app.utils.report_encoding import encode_reports_compact
+from app.utils.trajectory import DETAIL_LEVELS, select_reports
 
 # Import AppleDataService ONLY if we need its internal key loading helper
 from app.services.apple_data_service import AppleDataService  # Needs AppleDataService
@@ -342,18 +346,9 @@ def upload_device_file():
                 try:
                     apple_id, apple_password = uds.load_apple_credentials(user_id)
                     if apple_id and apple_password:
-                        immediate_fetch_thread = threading.Thread(
-                            target=run_fetch_for_user_task,
-                            args=(
-                                user_id,
-                                apple_id,
-                                apple_password,
-                                current_app.config,
-                            ),
-                            name=f"ImmediateFetchUpload-{user_id}",
-                            daemon=True,
+                        request_user_fetch(
+                            user_id, apple_id, apple_password, current_app.config, "ImmediateFetchUpload"
                         )
-                        immediate_fetch_thread.start()
                         results["fetch_triggered"] = True
                     else:
                         log.warning(
@@ -408,11 +403,67 @@ def upload_device_file():
 
 
 # --- Device API ---
+def _cached_devices_response(
+    payload_cache: DevicePayloadCache, user_id: str, cache_key, response_data
+):
+    """Serializes the /api/devices payload once, caches it (and its compressed variants)."""
+    response = jsonify(response_data)
+    body = PrecompressedBody(response.get_data(), response.mimetype)
+    payload_cache.put(user_id, cache_key, body)
+    response.precompressed = body
+    response.set_etag(body.etag)
+    return response.make_conditional(request)
+
+
 @bp.route("/devices", methods=["GET"])
 @login_required
 def get_devices():
+    """
+    Returns all devices with their latest status and report history.
+
+    Query Params:
+        reports: "compact" to send each history as a columnar `reports_compact`
+            document (encoded polyline + delta timestamps, see
+            app/utils/report_encoding.py) instead of a `reports` object list.
+        detail: "low", "medium" or "full" (default) history resolution; the
+            simplified levels are precomputed at fetch time.
+        tolerance_m: Douglas-Peucker tolerance in metres (overrides `detail`).
+    """
     user_id = current_user.id
     uds = UserDataService(current_app.config)
+    compact_reports = request.args.get("reports") == "compact"
+    detail = request.args.get("detail", "full")
+    if detail not in DETAIL_LEVELS:
+        abort(400, description=f"Invalid detail level. Use one of: {', '.join(DETAIL_LEVELS)}.")
+    tolerance_m = None
+    if request.args.get("tolerance_m") is not None:
+        try:
+            tolerance_m = float(request.args["tolerance_m"])
+        except ValueError:
+            abort(400, description="Invalid tolerance_m (expected metres).")
+        if not 0 <= tolerance_m <= 100000:
+            abort(400, description="tolerance_m must be between 0 and 100000.")
+    variant = "compact" if compact_reports else "json"
+    variant += f":{detail}" if tolerance_m is None else f":tol={tolerance_m:g}"
+
+    # --- Serve the stored body while cache/devices/geofences/shares are unchanged ---
+    # Free-form tolerance_m bodies are built per request: caching one body per
+    # distinct value would let a single client grow the cache without bound
+    payload_cache = DevicePayloadCache(current_app.config, uds)
+    cache_key = None
+    if tolerance_m is None:
+        try:
+            cache_key = payload_cache.cache_key(user_id, variant)
+            cached_body = payload_cache.get(user_id, cache_key)
+            if cached_body is not None:
+                response = current_app.response_class(cached_body.data, mimetype=cached_body.mimetype)
+                response.precompressed = cached_body
+                response.set_etag(cached_body.etag)
+                return response.make_conditional(request)
+        except Exception as e:
+            log.warning(f"User '{user_id}' /api/devices: payload cache unavailable: {e}")
+            cache_key = None
+
     response_data = {
         "devices": [],
         "last_updated": None,
@@ -465,6 +516,8 @@ def get_devices():
                 key=lambda d: d.get("name", d.get("id", "")).lower()
             )
             response_data["code"] = "CACHE_EMPTY_CONFIG_RETURNED"
+            if cache_key is not None:
+                return _cached_devices_response(payload_cache, user_id, cache_key, response_data)
             return jsonify(response_data), 200
 
         devices_list = []
@@ -489,7 +542,17 @@ def get_devices():
                 current_app.config["LOW_BATTERY_THRESHOLD"],
             )
             formatted_device["is_shared"] = device_id in active_shared_device_ids
-            formatted_device["reports"] = all_reports_for_device
+            reports_to_send = select_reports(
+                all_reports_for_device,
+                detail,
+                device_info_from_cache.get("levels"),
+                tolerance_m,
+                current_app.config,
+            )
+            if compact_reports:
+                formatted_device["reports_compact"] = encode_reports_compact(reports_to_send)
+            else:
+                formatted_device["reports"] = reports_to_send
             devices_list.append(formatted_device)
 
         for device_id, config_from_file in current_user_devices_config.items():
@@ -511,6 +574,8 @@ def get_devices():
         response_data["last_updated"] = user_cache.get("timestamp")
         response_data["fetch_errors"] = user_cache.get("error")
         response_data["code"] = "OK"
+        if cache_key is not None:
+            return _cached_devices_response(payload_cache, user_id, cache_key, response_data)
         return jsonify(response_data), status_code
 
     except Exception as e:
@@ -729,6 +794,53 @@ def delete_device(device_id):
         )
 
 
+@bp.route("/devices/<string:device_id>/timeline", methods=["GET"])
+@login_required
+def get_device_timeline(device_id):
+    """
+    Returns a device's precomputed trips and stays.
+
+    Query Params:
+        since: Optional ISO timestamp; only segments ending at/after it are returned.
+        limit: Optional maximum number of (most recent) segments.
+    """
+    user_id = current_user.id
+    uds = UserDataService(current_app.config)
+    since = request.args.get("since")
+    limit = request.args.get("limit", type=int)
+    if limit is not None and limit < 1:
+        abort(400, description="limit must be a positive integer.")
+    if since:
+        try:
+            since_dt = datetime.fromisoformat(since.replace("Z", "+00:00"))
+            if since_dt.tzinfo is None:
+                since_dt = since_dt.replace(tzinfo=timezone.utc)
+            since = since_dt.astimezone(timezone.utc).isoformat()
+        except ValueError:
+            abort(400, description="Invalid 'since' timestamp.")
+    if device_id not in uds.load_devices_config(user_id):
+        abort(404, description="Device not found.")
+    try:
+        timeline = TimelineService(current_app.config, uds).get_device_timeline(user_id, device_id)
+        segments = (timeline or {}).get("segments", [])
+        if since:
+            segments = [s for s in segments if s.get("end", "") >= since]
+        if limit is not None:
+            segments = segments[-limit:]
+        return jsonify({
+            "device_id": device_id,
+            "segments": segments,
+            "places": (timeline or {}).get("places", []),
+            "updated_at": (timeline or {}).get("updated_at"),
+        })
+    except Exception as e:
+        log.exception(f"Error in GET /api/devices/{device_id}/timeline for '{user_id}'")
+        return (
+            jsonify({"error": "Server Error", "message": "Error loading timeline."}),
+            500,
+        )
+
+
 # --- Geofence CRUD ---
 @bp.route("/geofences", methods=["GET"])
 @login_required
@@ -1248,6 +1360,7 @@ def test_device_notification(device_id, notification_type):
             device_color=device_color,
             notification_type=notification_specific_type,
         )
+        notifier.deliver_outbox(user_id)  # Deliver right away for interactive tests
         return (
             jsonify(
                 {
@@ -1275,11 +1388,54 @@ def test_device_notification(device_id, notification_type):
 @bp.route("/notifications/history", methods=["GET"])
 @login_required
 def get_notification_history():
+    """
+    Returns notification history.
+
+    Without query parameters the full list is returned (legacy format). With any of
+    `limit`, `cursor`, `type`, `device`, `read` or `since` a paged envelope is returned:
+    {"items", "next_cursor", "unread_count", "server_time"} (plus "deleted" and
+    "full_sync" for `since` delta requests).
+    """
     user_id = current_user.id
     uds = UserDataService(current_app.config)
+    paged_params = {"limit", "cursor", "type", "device", "read", "since"}
     try:
-        history = uds.load_notification_history(user_id)
-        return jsonify(history or [])  # Ensure list is returned
+        if not paged_params.intersection(request.args.keys()):
+            history = uds.load_notification_history(user_id)
+            return jsonify(history or [])  # Ensure list is returned
+
+        since_arg = request.args.get("since")
+        if since_arg:
+            try:
+                since_ts = float(since_arg)
+            except ValueError:
+                try:
+                    since_ts = datetime.fromisoformat(
+                        since_arg.replace("Z", "+00:00")
+                    ).timestamp()
+                except ValueError:
+                    return jsonify({"error": "Bad Request", "message": "Invalid 'since' value."}), 400
+            return jsonify(uds.get_notification_history_changes(user_id, since_ts))
+
+        try:
+            limit = max(1, min(200, int(request.args.get("limit", 50))))
+        except ValueError:
+            return jsonify({"error": "Bad Request", "message": "Invalid 'limit' value."}), 400
+        types = {t.strip() for t in request.args.get("type", "").split(",") if t.strip()}
+        read_arg = request.args.get("read", "").lower()
+        read_state = {"true": True, "1": True, "false": False, "0": False}.get(read_arg)
+        try:
+            page = uds.query_notification_history(
+                user_id,
+                limit=limit,
+                cursor=request.args.get("cursor") or None,
+                types=types or None,
+                device_id=request.args.get("device") or None,
+                read_state=read_state,
+            )
+        except ValueError as ve:
+            return jsonify({"error": "Bad Request", "message": str(ve)}), 400
+        return jsonify(page)
     except Exception as e:
         log.exception(f"Error getting notification history for user '{user_id}'")
         return (
@@ -1293,6 +1449,48 @@ def get_notification_history():
         )
 
 
+@bp.route("/notifications/unread_count", methods=["GET"])
+@login_required
+def get_unread_notification_count():
+    user_id = current_user.id
+    uds = UserDataService(current_app.config)
+    try:
+        return jsonify({"unread_count": uds.get_unread_notification_count(user_id)})
+    except Exception as e:
+        log.exception(f"Error getting unread notification count for user '{user_id}'")
+        return (
+            jsonify(
+                {
+                    "error": "Server Error",
+                    "message": "Failed to load unread count.",
+                }
+            ),
+            500,
+        )
+
+
+@bp.route("/notifications/history/read_all", methods=["PUT"])
+@login_required
+def mark_all_notifications_read():
+    user_id = current_user.id
+    uds = UserDataService(current_app.config)
+    log.info(f"API PUT /notifications/history/read_all by '{user_id}'")
+    try:
+        changed = uds.mark_all_notifications_read(user_id)
+        return jsonify({"message": "All notifications marked as read.", "updated": changed}), 200
+    except Exception as e:
+        log.exception(f"Error marking all notifications read for user '{user_id}'")
+        return (
+            jsonify(
+                {
+                    "error": "Server Error",
+                    "message": "Failed to update notification status.",
+                }
+            ),
+            500,
+        )
+
+
 @bp.route("/notifications/history/<string:notification_id>/read", methods=["PUT"])
 @login_required
 def mark_notification_read(notification_id):
@@ -1522,13 +1720,8 @@ def force_user_refresh():
 
         # Proceed with spawning the thread using the decrypted password
         log.info(f"Spawning immediate fetch task for user '{user_id}' via API request.")
-        immediate_fetch_thread = threading.Thread(
-            target=run_fetch_for_user_task,
-            args=(user_id, apple_id, apple_password, current_app.config), # Pass decrypted password
-            name=f"ApiForceFetch-{user_id}",
-            daemon=True,
-        )
-        immediate_fetch_thread.start()
+        # Pass decrypted password (or hand the fetch to the fetch worker)
+        request_user_fetch(user_id, apple_id, apple_password, current_app.config, "ApiForceFetch")
 
         return jsonify({"message": "Background refresh initiated."}), 202  # Accepted
 
@@ -1792,20 +1985,12 @@ def update_share_duration(share_id):
     )
 
     try:
-        updated_share = uds.update_share_expiry(share_id, user_id, duration_hours)
+        updated_share = uds.update_share_expiry(
+            share_id, user_id, duration_hours, note=note
+        )
         if updated_share:
             if note is not None:
-                all_shares = uds.load_shares()
-                if (
-                    share_id in all_shares
-                    and all_shares[share_id].get("user_id") == user_id
-                ):
-                    all_shares[share_id]["note"] = note
-                    uds.save_shares(all_shares)
-                    updated_share["note"] = note
-                    log.info(
-                        f"User '{user_id}' also updated note for share '{share_id}'."
-                    )
+                log.info(f"User '{user_id}' also updated note for share '{share_id}'.")
 
             devices_config = uds.load_devices_config(user_id)
             device_conf = devices_config.get(updated_share.get("device_id"))
@@ -2043,13 +2228,9 @@ def submit_2fa_code():
             # Trigger background fetch
             log.info(f"User '{user_id}': Triggering immediate fetch after successful 2FA.")
             try:
-                immediate_fetch_thread = threading.Thread(
-                    target=run_fetch_for_user_task,
-                    args=(user_id, apple_id, unencrypted_password, current_app.config), # Use unencrypted pw
-                    name=f"ImmediateFetch2FA-{user_id}",
-                    daemon=True,
+                request_user_fetch(  # Use unencrypted pw
+                    user_id, apple_id, unencrypted_password, current_app.config, "ImmediateFetch2FA"
                 )
-                immediate_fetch_thread.start()
             except Exception as fetch_trigger_err:
                 log.error(f"User '{user_id}': Failed to start immediate fetch after 2FA: {fetch_trigger_err}")
                 # Don't abort, login was successful, just warn user maybe
@@ -21,13 +21,12 @@ from findmy.reports import LoginState  # Import LoginState
 from app.utils.helpers import encrypt_password  # Import encrypt helper
 
 from flask_login import login_required, current_user
-import threading
 import traceback
 import os
 
 from . import bp
 from app.services.user_data_service import UserDataService
-from app.scheduler.tasks import run_fetch_for_user_task
+from app.scheduler.tasks import request_user_fetch
 from app.auth.forms import AppleCredentialsForm
 
 log = logging.getLogger(__name__)
@@ -107,13 +106,9 @@ def manage_apple_creds_route():
                 )
                 # (Keep existing fetch trigger logic)
                 try:
-                    immediate_fetch_thread = threading.Thread(
-                        target=run_fetch_for_user_task,
-                        args=(user_id, apple_id, apple_password, current_app.config),
-                        name=f"ImmediateFetchCredSave-{user_id}",
-                        daemon=True,
+                    request_user_fetch(
+                        user_id, apple_id, apple_password, current_app.config, "ImmediateFetchCredSave"
                     )
-                    immediate_fetch_thread.start()
                     flash("Initial background fetch initiated.", "info")
                 except Exception as e:
                     log.error(
@@ -1,7 +1,7 @@
 # app/models.py
 from werkzeug.security import check_password_hash
 from flask_login import UserMixin
-from flask import current_app
+from flask import current_app, g, has_request_context
 import logging
 
 # Import the user data service (we'll create this next)
@@ -20,7 +20,17 @@ class User(UserMixin):
 
     @staticmethod
     def get(user_id):
-        """Load user by ID using the user data service."""
+        """
+        Load user by ID using the user data service.
+
+        Lookups are memoised on flask.g for the lifetime of the request, so repeated
+        calls (user_loader, login checks, ...) hit the user directory only once.
+        """
+        memo = None
+        if has_request_context():
+            memo = g.setdefault("_user_memo", {})
+            if user_id in memo:
+                return memo[user_id]
         # This dynamic import is one way to handle dependencies during initialization
         # A better way is dependency injection but more complex setup
         try:
@@ -29,14 +39,17 @@ class User(UserMixin):
             user_data = uds.load_single_user(user_id)
             if user_data:
                 log.debug(f"User.get: Found user data for {user_id}")
-                return User(
+                user = User(
                     id=user_id,
                     email=user_data.get("email"),
                     password_hash=user_data.get("password_hash"),
                 )
             else:
                 log.debug(f"User.get: No user data found for {user_id}")
-                return None
+                user = None
+            if memo is not None:
+                memo[user_id] = user
+            return user
         except ImportError:
             log.error("User.get: Could not import UserDataService. Is the service defined?")
             return None
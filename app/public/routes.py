@@ -2,19 +2,24 @@
 
 import logging
 import os
+from typing import Optional
 from flask import (
     render_template,
     current_app,
     send_from_directory,
     abort,
     make_response,
-    jsonify
+    jsonify,
+    request,
 )
+from werkzeug.exceptions import HTTPException
+from flask_limiter.util import get_remote_address
 
 # ADD Service and Helper imports needed by the API function
 from app.services.user_data_service import UserDataService
-from app.utils.helpers import getDefaultColorForId
-from app.utils.data_formatting import _parse_battery_info
+from app.services.share_snapshot import ShareSnapshotService, ShareSnapshotUnavailable
+from app.utils.rate_limiting import get_bucket_store, retry_after_header
+from app.utils.compression import PrecompressedBody
 from datetime import datetime, timezone # <<< ADD datetime imports
 
 # Use the blueprint defined in app/public/__init__.py
@@ -22,6 +27,62 @@ from . import bp
 
 log = logging.getLogger(__name__)
 
+# --- Rate Limiting Helpers ---
+
+def _check_public_rate_limits(share_id: Optional[str] = None) -> float:
+    """
+    Takes one token from the client IP's bucket and, if given, the share's bucket.
+
+    Returns:
+        0.0 if the request may proceed, otherwise the seconds until it would be allowed.
+    """
+    cfg = current_app.config
+    if not cfg.get("PUBLIC_RATE_LIMIT_ENABLED", True):
+        return 0.0
+    try:
+        store = get_bucket_store(cfg)
+        allowed, wait = store.take(
+            f"ip:{get_remote_address()}",
+            cfg.get("PUBLIC_RATE_LIMIT_PER_IP_BURST", 20),
+            cfg.get("PUBLIC_RATE_LIMIT_PER_IP_PER_SECOND", 0.5),
+        )
+        if not allowed:
+            return wait
+        if share_id:
+            allowed, wait = store.take(
+                f"share:{share_id}",
+                cfg.get("PUBLIC_RATE_LIMIT_PER_SHARE_BURST", 120),
+                cfg.get("PUBLIC_RATE_LIMIT_PER_SHARE_PER_SECOND", 2),
+            )
+            if not allowed:
+                return wait
+    except Exception as e:
+        # Fail open: a broken limiter store must not take share links down
+        log.error(f"Public rate limit check failed: {e}")
+    return 0.0
+
+
+def _too_many_requests(retry_after: float):
+    """429 response with Retry-After (JSON body, like other public API errors)."""
+    response = jsonify(
+        {
+            "error": "Too Many Requests",
+            "description": "This shared link is receiving too many requests. Please try again shortly.",
+        }
+    )
+    response.status_code = 429
+    response.headers["Retry-After"] = retry_after_header(retry_after)
+    return response
+
+
+def _snapshot_response(body: PrecompressedBody):
+    """JSON response for a stored snapshot body (compressed variants reused by the compression hook)."""
+    response = current_app.response_class(body.data, mimetype=body.mimetype)
+    response.precompressed = body
+    response.set_etag(body.etag)
+    return response
+
+
 # --- Publicly Accessible Routes ---
 
 # --- Route for the HTML page ---
@@ -29,13 +90,27 @@ log = logging.getLogger(__name__)
 def view_shared_device(share_id):
     """Renders the public map page for a shared device."""
     log.info(f"Serving public share page for ID: {share_id}")
+    retry_after = _check_public_rate_limits()
+    if retry_after:
+        log.warning(f"Public share page for '{share_id}' rate limited (retry in {retry_after:.1f}s).")
+        return make_response(
+            "Too many requests. Please try again shortly.",
+            429,
+            {"Retry-After": retry_after_header(retry_after)},
+        )
     return render_template("share_map.html", share_id=share_id)
 
 # --- Route for the Public API Data ---
 # Changed path to match JS and removed the conflicting one from main/api.py
 @bp.route("/api/shared/<string:share_id>")
 def get_public_share_data_new(share_id):
-    """API endpoint to fetch data for a specific public share."""
+    """
+    API endpoint to fetch data for a specific public share.
+
+    Served from an in-memory snapshot of the shared device's latest report
+    (see ShareSnapshotService), with an ETag and a Cache-Control max-age that
+    runs until the owner's next scheduled fetch.
+    """
     log.debug(f"Public API request via /public/api/shared: {share_id}")
     uds = UserDataService(current_app.config)
 
@@ -49,21 +124,11 @@ def get_public_share_data_new(share_id):
         if not share_info.get("active", False):
             log.info(f"Public API: Share ID '{share_id}' is inactive.")
             abort(410, description="Share has been revoked.")
-        now_utc = datetime.now(timezone.utc)
-        expires_at_str = share_info.get("expires_at")
-        if expires_at_str:
-            try:
-                expires_at_dt = datetime.fromisoformat(
-                    expires_at_str.replace("Z", "+00:00")
-                )
-                if expires_at_dt.tzinfo is None:
-                    expires_at_dt = expires_at_dt.replace(tzinfo=timezone.utc)
-                if expires_at_dt < now_utc:
-                    log.info(f"Public API: Share ID '{share_id}' has expired.")
-                    abort(410, description="Share has expired.")
-            except ValueError:
-                log.error(f"Public API: Invalid expires_at format for share {share_id}")
-                abort(500, description="Invalid share data.") # Abort 500 for server config issue
+        # Pre-parsed by the share registry (None = never expires, unparseable = expired)
+        expires_at_ts = uds.share_registry.expiry_of(share_id)
+        if expires_at_ts is not None and expires_at_ts < datetime.now(timezone.utc).timestamp():
+            log.info(f"Public API: Share ID '{share_id}' has expired.")
+            abort(410, description="Share has expired.")
 
         owner_id = share_info.get("user_id")
         device_id = share_info.get("device_id")
@@ -71,68 +136,39 @@ def get_public_share_data_new(share_id):
             log.error(f"Public API: Share {share_id} is missing owner or device ID.")
             abort(500, description="Invalid share data.") # Abort 500
 
-        owner_cache = uds.load_cache_from_file(owner_id)
-        if (
-            not owner_cache
-            or "data" not in owner_cache
-            or not isinstance(owner_cache["data"], dict)
-        ):
-            log.warning(
-                f"Public API: Cache for owner '{owner_id}' (share '{share_id}') not available."
-            )
-            abort(503, description="Device location data is temporarily unavailable.")
-
-        device_data_from_cache = owner_cache["data"].get(device_id)
-        if not device_data_from_cache:
-            log.warning(
-                f"Public API: No data structure found for device '{device_id}' in owner '{owner_id}' cache (share '{share_id}'). Might be syncing."
-            )
-            abort(
-                503,
-                description="Device data not yet available. Please try again shortly.",
-            )
-
-        reports_list = device_data_from_cache.get("reports", [])
-        latest_report = (reports_list[0] if reports_list else None)
-
-        owner_devices_config = uds.load_devices_config(owner_id)
-        device_config = owner_devices_config.get(device_id, {})
-
-        device_name = device_config.get("name", device_id) or device_id
-        device_label = device_config.get("label", "❓") or "❓"
-        device_color_hex = device_config.get("color")
-        final_device_color = (
-            device_color_hex if device_color_hex else getDefaultColorForId(device_id)
+        snapshots = ShareSnapshotService(current_app.config, uds)
+        share_note = share_info.get("note", "")
+
+        # --- Shed load: over-limit viewers get the last snapshot in memory, or a 429 ---
+        retry_after = _check_public_rate_limits(share_id)
+        if retry_after:
+            stale_snapshot = snapshots.peek_device_snapshot(owner_id, device_id)
+            if stale_snapshot is None:
+                log.warning(f"Public API: Share '{share_id}' rate limited (retry in {retry_after:.1f}s).")
+                return _too_many_requests(retry_after)
+            log.debug(f"Public API: Share '{share_id}' rate limited; serving stale snapshot.")
+            response = _snapshot_response(snapshots.response_body(stale_snapshot, share_note))
+            response.cache_control.public = True
+            response.cache_control.max_age = int(retry_after_header(retry_after))
+            response.headers["X-Share-Snapshot"] = "stale"
+            return response.make_conditional(request)
+
+        try:
+            snapshot = snapshots.get_device_snapshot(owner_id, device_id)
+        except ShareSnapshotUnavailable as e:
+            log.warning(f"Public API: Data for share '{share_id}' unavailable: {e.description}")
+            abort(503, description=e.description)
+
+        response = _snapshot_response(snapshots.response_body(snapshot, share_note))
+        response.cache_control.public = True
+        response.cache_control.max_age = snapshots.max_age_for(snapshot, expires_at_ts)
+        response = response.make_conditional(request)
+        log.debug(
+            f"Public API (/public/api/shared): Served snapshot for share '{share_id}' (status {response.status_code})"
         )
-
-        lat = latest_report.get("lat") if latest_report else None
-        lng = latest_report.get("lon") if latest_report else None
-        timestamp_iso = latest_report.get("timestamp") if latest_report else None
-        battery_level_raw = latest_report.get("battery") if latest_report else None
-        raw_status_code = latest_report.get("status") if latest_report else None
-
-        battery_level, battery_status = _parse_battery_info(
-            battery_level_raw,
-            raw_status_code,
-            current_app.config.get("LOW_BATTERY_THRESHOLD", 15),
-        )
-
-        response = {
-            "device_name": device_name,
-            "device_label": device_label,
-            "device_color": final_device_color,
-            "lat": lat,
-            "lng": lng,
-            "timestamp": timestamp_iso,
-            "battery_level": battery_level,
-            "battery_status": battery_status,
-            "last_updated": owner_cache.get("timestamp"),
-            "share_note": share_info.get("note", ""),
-        }
-        log.info(
-            f"Public API (/public/api/shared): Served data for share '{share_id}' (Report found: {latest_report is not None})"
-        )
-        return jsonify(response)
+        return response
+    except HTTPException:
+        raise  # Let abort() responses (404/410/503...) through untouched
     except Exception as e:
         log.exception(f"Error fetching public share data for '{share_id}'")
         abort(500, description="An error occurred while retrieving shared location data.")
@@ -0,0 +1,142 @@
+# app/scheduler/leader.py
+# Runs the background scheduler in exactly one of several app processes sharing a data directory.
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+try:
+    import fcntl  # POSIX only; without it every process considers itself the leader
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+LEADER_LOCK_FILENAME = "scheduler.lock"
+
+
+class SchedulerLeader:
+    """
+    Leadership through an exclusive, non-blocking flock on a lock file.
+
+    The holder keeps the descriptor open for the life of the process; the
+    kernel drops the lock when it exits (or crashes), so a follower's next
+    try_acquire() succeeds. The leader's pid is written into the file for
+    operators.
+    """
+
+    def __init__(self, lock_path: Path):
+        self.lock_path = Path(lock_path)
+        self._fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """Takes leadership if no other process holds it. Returns True while leader."""
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            log.warning("fcntl unavailable: scheduler leader election disabled, this process leads.")
+            self._fd = -1
+            return True
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except OSError:
+            os.close(fd)
+            raise
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode("ascii"))
+        self._fd = fd
+        return True
+
+    def current_leader_pid(self) -> Optional[int]:
+        """The pid recorded by the last leader (may be stale if it died)."""
+        try:
+            return int(self.lock_path.read_text(encoding="ascii").strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
+
+
+def leader_lock_path(config: Dict[str, Any]) -> Path:
+    lock_dir = config.get("LOCK_DIRECTORY") or Path(config["DATA_DIRECTORY"]) / ".locks"
+    return Path(lock_dir) / LEADER_LOCK_FILENAME
+
+
+def _follow(leader: SchedulerLeader, scheduler, retry_seconds: float, stop: threading.Event):
+    """Retries leadership until it is won, then starts the scheduler."""
+    while not stop.wait(retry_seconds):
+        try:
+            if not leader.try_acquire():
+                continue
+        except OSError as e:
+            log.error(f"Scheduler leader election failed ({leader.lock_path}): {e}")
+            continue
+        log.warning(f"Process {os.getpid()} took over as scheduler leader. Starting scheduler.")
+        try:
+            scheduler.start()
+        except Exception as e:
+            log.error(f"Failed to start scheduler after winning leadership: {e}", exc_info=True)
+        return
+
+
+def start_scheduler(app, scheduler, stop: Optional[threading.Event] = None) -> Optional[SchedulerLeader]:
+    """
+    Starts `scheduler` in a web process according to SCHEDULER_MODE (never
+    with FETCH_WORKER_ENABLED: the fetch worker runs it then).
+
+    "always" starts it unconditionally, "off" never does, and "leader" (the
+    default) starts it only in the process that wins the scheduler lock file.
+    A losing process keeps retrying every SCHEDULER_LEADER_RETRY_SECONDS in a
+    daemon thread and takes over once the leader exits.
+
+    Returns:
+        The SchedulerLeader in "leader" mode (leader or follower), else None.
+    """
+    mode = str(app.config.get("SCHEDULER_MODE", "leader")).lower()
+    if app.config.get("FETCH_WORKER_ENABLED"):
+        log.info("FETCH_WORKER_ENABLED: scheduled jobs run in the fetch worker (python -m app.worker).")
+        return None
+    if mode == "off":
+        log.info("SCHEDULER_MODE=off: background scheduler not started in this process.")
+        return None
+    if mode != "leader":
+        if mode != "always":
+            log.warning(f"Unknown SCHEDULER_MODE '{mode}'. Starting scheduler unconditionally.")
+        scheduler.start()
+        return None
+
+    leader = SchedulerLeader(leader_lock_path(app.config))
+    if leader.try_acquire():
+        log.info(f"Process {os.getpid()} is the scheduler leader ({leader.lock_path}). Starting scheduler.")
+        scheduler.start()
+        return leader
+
+    retry_seconds = max(1, int(app.config.get("SCHEDULER_LEADER_RETRY_SECONDS", 30)))
+    log.info(
+        f"Scheduler leader is process {leader.current_leader_pid() or '?'}; "
+        f"this process ({os.getpid()}) will retry every {retry_seconds}s."
+    )
+    threading.Thread(
+        target=_follow,
+        args=(leader, scheduler, retry_seconds, stop or threading.Event()),
+        name="SchedulerLeaderElection",
+        daemon=True,
+    ).start()
+    return leader
@@ -10,6 +10,12 @@ from typing import Dict, Any, Optional, Set, List
 from app.services.user_data_service import UserDataService
 from app.services.apple_data_service import AppleDataService
 from app.services.notification_service import NotificationService
+from app.services.share_snapshot import ShareSnapshotService
+from app.services.timeline_service import TimelineService
+from app.utils.metrics import FETCH_DURATION, FETCH_TASKS_RUNNING
+from app.utils import change_feed, slow_log
+from app.utils.slow_log import slow_job
+from app.utils.tracing import start_span, start_trace
 
 from findmy.reports import AppleAccount, LoginState # Add LoginState
 from findmy.errors import UnauthorizedError # Import error for re
@@ -31,6 +37,49 @@ def run_fetch_for_user_task(
     Performs the background data fetch and processing for a single user.
     Handles potential re-authentication requirements during fetch.
     """
+    start = time.perf_counter()
+    outcome = "error"
+    slow_activity = slow_log.begin("job", "fetch_user", user=user_id)
+    with start_trace("fetch_user", config_obj, user=user_id) as root_span:
+        FETCH_TASKS_RUNNING.inc()  # Scheduled, manual and worker fetches alike
+        try:
+            outcome = _run_fetch_for_user(user_id, apple_id, apple_password, config_obj)
+        finally:
+            FETCH_TASKS_RUNNING.dec()
+            FETCH_DURATION.observe(time.perf_counter() - start, outcome=outcome)
+            root_span.set_attribute("outcome", outcome)
+            slow_log.finish(slow_activity, outcome=outcome)
+            if config_obj.get("FETCH_WORKER_ENABLED"):
+                # Lets web processes rebuild share snapshots and drop stale bodies right away
+                change_feed.publish(config_obj, change_feed.FETCH_COMPLETED, user=user_id, outcome=outcome)
+
+
+def request_user_fetch(
+    user_id: str, apple_id: str, apple_password: str, config_obj: Dict[str, Any], reason: str
+):
+    """
+    Starts an immediate fetch for one user (after a refresh click, credential
+    save, upload...). Runs it in a daemon thread named "<reason>-<user_id>", or,
+    with FETCH_WORKER_ENABLED, asks the fetch worker to run it; the worker reads
+    the credentials from the data store, so they never go through the feed.
+    """
+    if config_obj.get("FETCH_WORKER_ENABLED"):
+        if not change_feed.publish(config_obj, change_feed.FETCH_REQUESTED, user=user_id, reason=reason):
+            raise RuntimeError("Could not reach the fetch worker (change feed not writable)")
+        log.info(f"User '{user_id}': Fetch requested from the fetch worker ({reason}).")
+        return
+    threading.Thread(
+        target=run_fetch_for_user_task,
+        args=(user_id, apple_id, apple_password, config_obj),
+        name=f"{reason}-{user_id}",
+        daemon=True,
+    ).start()
+
+
+def _run_fetch_for_user(
+    user_id: str, apple_id: str, apple_password: str, config_obj: Dict[str, Any]
+) -> str:
+    """Body of run_fetch_for_user_task. Returns the outcome label for metrics."""
     log.info(f"Starting background fetch task for user '{user_id}'...")
     task_start_time = time.monotonic()
     uds = UserDataService(config_obj)
@@ -42,7 +91,8 @@ def run_fetch_for_user_task(
     # 1. Load Credentials AND State
     try:
         # --- Use the NEW method ---
-        loaded_apple_id, loaded_password, loaded_state = uds.load_apple_credentials_and_state(user_id)
+        with start_span("credentials.load"):
+            loaded_apple_id, loaded_password, loaded_state = uds.load_apple_credentials_and_state(user_id)
         # --- -------------------- ---
 
         # Basic validation - ensure we have at least ID and password from the file
@@ -54,13 +104,15 @@ def run_fetch_for_user_task(
                 "timestamp": datetime.now(timezone.utc).isoformat(),
                 "error": "Credentials not configured."
             })
-            return
+            return "no_credentials"
 
         # Restore or Login
         # Pass the loaded state to perform_account_login
-        account, state, login_error = apple_service.perform_account_login(
-            loaded_apple_id, loaded_password, loaded_state # Pass loaded state
-        )
+        with start_span("account.login", restored_state=bool(loaded_state)) as login_span:
+            account, state, login_error = apple_service.perform_account_login(
+                loaded_apple_id, loaded_password, loaded_state # Pass loaded state
+            )
+            login_span.set_attribute("state", str(state))
 
         if state != LoginState.LOGGED_IN:
             # This handles cases where restoration failed, initial login failed,
@@ -76,7 +128,7 @@ def run_fetch_for_user_task(
                 "timestamp": datetime.now(timezone.utc).isoformat(),
                 "error": cache_error_msg
             })
-            return # Exit task
+            return "login_failed" # Exit task
 
         # If we reach here, account is in LOGGED_IN state
         log.info(f"User '{user_id}': Account ready for data fetch.")
@@ -87,13 +139,19 @@ def run_fetch_for_user_task(
             "data": None, "timestamp": datetime.now(timezone.utc).isoformat(),
             "error": f"Internal error loading credentials: {e}"
         })
-        return # Exit task
+        return "error" # Exit task
 
     # 2. Fetch Accessory Data (account is guaranteed to be LOGGED_IN here)
     fetched_data_dict, fetch_errors, found_device_ids = None, None, set()
     try:
         # --- fetch_accessory_data now requires the account object ---
-        fetched_data_dict, fetch_errors, found_device_ids = apple_service.fetch_accessory_data(user_id, account)
+        with start_span("fetch") as fetch_span:
+            fetched_data_dict, fetch_errors, found_device_ids = apple_service.fetch_accessory_data(user_id, account)
+            fetch_span.set_attributes(
+                devices=len(fetched_data_dict or {}),
+                reports=sum(len(d.get("reports", [])) for d in (fetched_data_dict or {}).values()),
+                errors=bool(fetch_errors),
+            )
         # --- ----------------------------------------------------- ---
 
     except UnauthorizedError as auth_err:
@@ -120,11 +178,30 @@ def run_fetch_for_user_task(
              "timestamp": timestamp_now_iso,
              "error": fetch_errors, # Store non-fatal fetch errors
          }
-         uds.save_cache_to_file(user_id, user_cache_data)
+         with start_span("cache.save", devices=len(fetched_data_dict)) as save_span:
+             uds.save_cache_to_file(user_id, user_cache_data)
+             cache_path = uds._get_user_file_path(user_id, config_obj["USER_CACHE_FILENAME"])
+             if cache_path and cache_path.exists():
+                 save_span.set_attribute("bytes", cache_path.stat().st_size)
          log.info(f"User '{user_id}': Cache updated with {len(fetched_data_dict)} devices.")
+         # ... Rebuild public share snapshots from the data just saved ...
+         try:
+             with start_span("share_snapshots.refresh"):
+                 ShareSnapshotService(config_obj, uds).refresh_owner(user_id, user_cache_data)
+         except Exception as e:
+             log.error(f"User '{user_id}': Error refreshing share snapshots: {e}", exc_info=True)
+         # ... Extend trip/stay timelines with the new reports ...
+         try:
+             with start_span("timeline.update"):
+                 TimelineService(config_obj, uds).update_from_fetch(user_id, fetched_data_dict)
+         except Exception as e:
+             log.error(f"User '{user_id}': Error updating timelines: {e}", exc_info=True)
          # ... Notification checks ...
          log.info(f"User '{user_id}': Starting notification checks...")
+         notify_span = start_span("notifications.check", devices=len(fetched_data_dict))
          check_start_time = time.monotonic()
+         notifier.begin_digest() # Coalesce this cycle's events into one push
+         notifier.begin_state_batch(user_id) # Load geofence/battery/cooldown state once
          try:
              user_devices_config_for_notify = uds.load_devices_config(user_id) # Load fresh config
              for device_id, device_data in fetched_data_dict.items():
@@ -139,15 +216,28 @@ def run_fetch_for_user_task(
              log.info(f"User '{user_id}': Notification checks finished in {time.monotonic() - check_start_time:.2f}s.")
          except Exception as e:
              log.error(f"User '{user_id}': Error during notification check phase: {e}", exc_info=True)
+             notify_span.record_error(e)
+         notify_span.end()
 
          # ... Cleanup ...
          cleanup_start_time = time.monotonic()
          try:
-             uds.cleanup_user_data_files(user_id, found_device_ids)
+             # Flush batched state once (dropping stale devices); fall back to a standalone cleanup
+             with start_span("state.cleanup"):
+                 if not notifier.flush_state_batch(user_id, valid_device_ids=found_device_ids):
+                     uds.cleanup_user_data_files(user_id, found_device_ids)
              log.debug(f"User '{user_id}': Stale state cleanup finished in {time.monotonic() - cleanup_start_time:.2f}s.")
          except Exception as e:
              log.error(f"User '{user_id}': Error during state cleanup: {e}")
 
+         # ... Deliver queued pushes now (outbox job retries anything left over) ...
+         try:
+             with start_span("notifications.deliver") as deliver_span:
+                 notifier.flush_digest(user_id)
+                 deliver_span.set_attributes(**notifier.deliver_outbox(user_id))
+         except Exception as e:
+             log.error(f"User '{user_id}': Error draining notification outbox: {e}", exc_info=True)
+
     else: # Handle fetch failure (including UnauthorizedError caught above)
         log.error(f"User '{user_id}': Background fetch failed or requires re-authentication.")
         # Update cache with the specific fetch error
@@ -162,7 +252,8 @@ def run_fetch_for_user_task(
     if account and account.login_state == LoginState.LOGGED_IN and fetch_errors != login_required_message:
         try:
             # Save the potentially updated state back (using original credentials)
-            uds.save_apple_credentials_and_state(user_id, loaded_apple_id, loaded_password, account.export())
+            with start_span("account.state_save"):
+                uds.save_apple_credentials_and_state(user_id, loaded_apple_id, loaded_password, account.export())
             log.debug(f"User '{user_id}': Saved potentially updated account state after fetch.")
         except Exception as e:
             log.error(f"User '{user_id}': Failed to save updated account state after fetch: {e}")
@@ -170,9 +261,13 @@ def run_fetch_for_user_task(
 
     # 5. Log Task Completion
     log.info(f"Finished background fetch task for user '{user_id}' in {time.monotonic() - task_start_time:.2f}s.")
+    if fetched_data_dict is not None:
+        return "ok"
+    return "login_required" if fetch_errors == login_required_message else "fetch_failed"
 
 
 # --- Master Scheduler Job ---
+@slow_job("master_fetch")
 def master_fetch_scheduler_job(config_obj: Dict[str, Any]):
     """
     Scheduler job that iterates through registered users and triggers
@@ -261,6 +356,7 @@ def master_fetch_scheduler_job(config_obj: Dict[str, Any]):
 
 
 # --- Notification History Pruning Job ---
+@slow_job("prune_notification_history")
 def prune_all_notification_histories_job(config_obj: Dict[str, Any]):
     """
     Scheduler job that iterates through users and prunes old notification history entries.
@@ -317,24 +413,66 @@ def prune_all_notification_histories_job(config_obj: Dict[str, Any]):
 
 
 # --- NEW: Share Pruning Job ---
+@slow_job("prune_shares")
 def prune_shares_job(config_obj: Dict[str, Any]):
-    """Scheduler job that triggers pruning of expired/inactive shares."""
-    log.info("########## PERIODIC 'prune_shares_job' EXECUTION STARTING ##########")
+    """
+    Scheduler job that removes expired shares.
+
+    Runs every SHARE_PRUNE_INTERVAL_SECONDS; the share registry pops due entries
+    off its expiry heap, so a run with nothing due is just a heap peek.
+    """
     job_start_time = time.monotonic()
     uds = UserDataService(config_obj)
 
+    removed_count = 0
     try:
-        uds.prune_expired_shares()
+        removed_count = uds.prune_expired_shares()
     except Exception as e:
         log.exception("Error occurred during prune_expired_shares execution.")
 
-    log.info(
-        f"Finished share pruning job in {time.monotonic() - job_start_time:.2f}s."
-    )
-    log.info(
-        "########## PERIODIC 'prune_shares_job' EXECUTION FINISHED ##########"
-    )
+    if removed_count:
+        log.info(
+            f"Share pruning job removed {removed_count} expired shares in "
+            f"{time.monotonic() - job_start_time:.2f}s."
+        )
+
+
+# --- Notification Outbox Delivery Job ---
+@slow_job("deliver_notification_outbox")
+def deliver_notification_outbox_job(config_obj: Dict[str, Any]):
+    """
+    Scheduler job that drains every user's notification outbox, retrying
+    transient push failures according to their backoff schedule.
+
+    Args:
+        config_obj: The application configuration dictionary.
+    """
+    uds = UserDataService(config_obj)
+    notifier = NotificationService(config_obj, uds)
+    if not notifier.vapid_enabled:
+        return
 
+    try:
+        users = uds.load_users()
+    except Exception as e:
+        log.error(f"Outbox job: Failed to load users file ({uds.users_file}): {e}")
+        return
+
+    delivered_total = 0
+    for user_id in users:
+        if not notifier.outbox.has_outbox(user_id):
+            continue
+        try:
+            notifier.flush_due_digest(user_id)
+            summary = notifier.deliver_outbox(user_id)
+            delivered_total += summary.get("delivered", 0)
+        except Exception as e:
+            log.error(
+                f"Outbox job: Error delivering notifications for user '{user_id}': {e}",
+                exc_info=True,
+            )
+    if delivered_total:
+        log.info(f"Outbox job: Delivered {delivered_total} queued push notifications.")
 
 
 # --- Job Scheduling Function ---
@@ -423,28 +561,57 @@ def schedule_jobs(app, scheduler_instance: BackgroundScheduler):
 
     # --- Schedule Share Pruning Job ---
     share_pruning_job_id = "prune_shares"
-    share_pruning_interval_hours = 1 # e.g., Run hourly
+    share_pruning_interval_seconds = config_obj.get("SHARE_PRUNE_INTERVAL_SECONDS", 60)
 
     if scheduler_instance.get_job(share_pruning_job_id):
         log.info(f"Scheduler job '{share_pruning_job_id}' already exists. Skipping add.")
     else:
-        log.info(f"Attempting to schedule job '{share_pruning_job_id}' every {share_pruning_interval_hours} hours.")
+        log.info(f"Attempting to schedule job '{share_pruning_job_id}' every {share_pruning_interval_seconds} seconds.")
         try:
             scheduler_instance.add_job(
                 prune_shares_job,
                 trigger=IntervalTrigger(
-                    hours=share_pruning_interval_hours,
-                    jitter=120 # Add 2 min jitter
+                    seconds=share_pruning_interval_seconds,
+                    jitter=5
                 ),
                 args=[config_obj],
                 id=share_pruning_job_id,
                 name="Prune Expired Shares",
                 replace_existing=True,
-                misfire_grace_time=600, # Allow 10 min grace time
-                next_run_time=datetime.now(timezone.utc) + timedelta(minutes=10), # Start slightly offset
+                misfire_grace_time=max(30, share_pruning_interval_seconds),
+                next_run_time=datetime.now(timezone.utc) + timedelta(minutes=1), # Start slightly offset
             )
             log.info(f"Job '{share_pruning_job_id}' added successfully.")
         except ConflictingIdError:
             log.warning(f"Scheduler job '{share_pruning_job_id}' conflict error on add.")
         except Exception as e:
             log.error(f"Failed to add scheduler job '{share_pruning_job_id}': {e}", exc_info=True)
+
+    # --- Schedule Notification Outbox Delivery Job ---
+    outbox_job_id = "deliver_notification_outbox"
+    outbox_interval_seconds = config_obj.get("NOTIFICATION_OUTBOX_INTERVAL_SECONDS", 15)
+
+    if outbox_interval_seconds <= 0:
+        log.error(
+            f"Invalid NOTIFICATION_OUTBOX_INTERVAL_SECONDS ({outbox_interval_seconds}). Outbox job not scheduled."
+        )
+    elif scheduler_instance.get_job(outbox_job_id):
+        log.info(f"Scheduler job '{outbox_job_id}' already exists. Skipping add.")
+    else:
+        log.info(f"Attempting to schedule job '{outbox_job_id}' every {outbox_interval_seconds} seconds.")
+        try:
+            scheduler_instance.add_job(
+                deliver_notification_outbox_job,
+                trigger=IntervalTrigger(seconds=outbox_interval_seconds),
+                args=[config_obj],
+                id=outbox_job_id,
+                name="Deliver Notification Outbox",
+                replace_existing=True,
+                misfire_grace_time=outbox_interval_seconds,
+                next_run_time=datetime.now(timezone.utc) + timedelta(seconds=20),
+            )
+            log.info(f"Job '{outbox_job_id}' added successfully.")
+        except ConflictingIdError:
+            log.warning(f"Scheduler job '{outbox_job_id}' conflict error on add.")
+        except Exception as e:
+            log.error(f"Failed to add scheduler job '{outbox_job_id}': {e}", exc_info=True)
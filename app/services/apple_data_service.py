@@ -25,6 +25,10 @@ from findmy.errors import (
 # Import necessary services and utilities
 from .user_data_service import UserDataService
 from app.utils.helpers import get_available_anisette_server
+from app.utils.report_pipeline import process_devices, report_values
+from app.utils.trajectory import build_detail_levels
+from app.utils.metrics import FETCH_REPORTS_COUNT, FETCH_REPORTS_LATENCY
+from app.utils.tracing import start_span
 
 log = logging.getLogger(__name__)
 
@@ -194,103 +198,6 @@ class AppleDataService:
             log.warning(f"No valid 'private key:' lines found in {keys_file_path.name}")
         return private_keys
 
-    def _create_report_dict(self, report: Any) -> Dict[str, Any]:
-        """Converts a FindMy report object/dict to a standardized dictionary with UTC timestamps."""
-
-        def make_utc_aware(dt_input):
-            if not dt_input:
-                return None
-            try:
-                if isinstance(dt_input, datetime):
-                    # If already timezone-aware, convert to UTC. If naive, assume UTC.
-                    return (
-                        dt_input.astimezone(timezone.utc)
-                        if dt_input.tzinfo
-                        else dt_input.replace(tzinfo=timezone.utc)
-                    )
-                elif isinstance(dt_input, str):
-                    dt_str = dt_input.replace("Z", "+00:00")  # Handle Z for UTC
-                    # Handle potential microseconds (up to 6 digits) before +/- timezone offset
-                    if "." in dt_str:
-                        parts = dt_str.split(".")
-                        # Find timezone offset start (+ or -)
-                        offset_char_index = -1
-                        if "+" in parts[1]:
-                            offset_char_index = parts[1].find("+")
-                        elif "-" in parts[1]:
-                            offset_char_index = parts[1].find("-")
-
-                        if offset_char_index != -1:
-                            micros = parts[1][:offset_char_index][
-                                :6
-                            ]  # Take up to 6 digits before offset
-                            timezone_part = parts[1][offset_char_index:]
-                            dt_str = parts[0] + "." + micros + timezone_part
-                        else:  # No offset found after microseconds
-                            micros = parts[1][:6]
-                            dt_str = parts[0] + "." + micros
-
-                    dt = datetime.fromisoformat(dt_str)
-                    # If still naive after parsing, assume UTC
-                    return (
-                        dt.astimezone(timezone.utc)
-                        if dt.tzinfo
-                        else dt.replace(tzinfo=timezone.utc)
-                    )
-            except (ValueError, TypeError) as ve:
-                log.warning(f"Could not parse/convert timestamp '{dt_input}': {ve}")
-            return None
-
-        ts_aware = make_utc_aware(
-            getattr(
-                report,
-                "timestamp",
-                report.get("timestamp") if isinstance(report, dict) else None,
-            )
-        )
-        pub_aware = make_utc_aware(
-            getattr(
-                report,
-                "published_at",
-                report.get("published_at") if isinstance(report, dict) else None,
-            )
-        )
-
-        def get_attr_safe(obj, attr, default=None):
-            if isinstance(obj, dict):
-                return obj.get(attr, default)
-            return getattr(obj, attr, default)
-
-        lat = get_attr_safe(report, "latitude", get_attr_safe(report, "lat"))
-        lon = get_attr_safe(report, "longitude", get_attr_safe(report, "lon"))
-        h_acc = get_attr_safe(
-            report, "horizontal_accuracy", get_attr_safe(report, "horizontalAccuracy")
-        )
-        alt = get_attr_safe(report, "altitude")
-        v_acc = get_attr_safe(
-            report, "vertical_accuracy", get_attr_safe(report, "verticalAccuracy")
-        )
-        batt = get_attr_safe(report, "battery")
-        status = get_attr_safe(report, "status")
-        desc = get_attr_safe(report, "description")
-        conf = get_attr_safe(report, "confidence")
-        floor = get_attr_safe(report, "floor")
-
-        return {
-            "timestamp": ts_aware.isoformat() if ts_aware else None,
-            "published_at": pub_aware.isoformat() if pub_aware else None,
-            "lat": float(lat) if lat is not None else None,
-            "lon": float(lon) if lon is not None else None,
-            "horizontalAccuracy": float(h_acc) if h_acc is not None else None,
-            "altitude": float(alt) if alt is not None else None,
-            "verticalAccuracy": float(v_acc) if v_acc is not None else None,
-            "battery": batt,
-            "status": status,
-            "description": desc,
-            "confidence": conf,
-            "floor": floor,
-        }
-
     def fetch_accessory_data(
         self, user_id: str, account: AppleAccount # Now requires a logged-in account object
     ) -> Tuple[Optional[Dict[str, Any]], Optional[str], Set[str]]:
@@ -309,6 +216,7 @@ class AppleDataService:
         processed_data: Dict[str, Dict[str, Any]] = {}
         error_messages: List[str] = []
         processed_ids: Set[str] = set()
+        raw_values: Dict[str, List[tuple]] = {}  # device_id -> report_values() tuples
         
         user_data_dir = self.uds._get_user_data_dir(user_id)
         if not user_data_dir:
@@ -354,36 +262,20 @@ class AppleDataService:
                 )
                 with plist_file.open("rb") as f:
                     accessory = FindMyAccessory.from_plist(f)
-                reports_raw: list[Any] = account.fetch_reports(
-                    date_from=start_date, date_to=end_date, keys=accessory
-                )
+                with start_span("device.fetch", device=device_id, source="plist") as device_span, \
+                        FETCH_REPORTS_LATENCY.time(source="plist"):
+                    reports_raw: list[Any] = account.fetch_reports(
+                        date_from=start_date, date_to=end_date, keys=accessory
+                    )
+                    device_span.set_attribute("raw_reports", len(reports_raw or []))
+                FETCH_REPORTS_COUNT.observe(len(reports_raw or []), source="plist")
                 log.debug(
                     f"User '{user_id}': Found {len(reports_raw)} raw reports for {device_id} (plist)"
                 )
 
                 if reports_raw:
-                    # Convert, sort, and deduplicate reports
-                    processed_reports = [
-                        self._create_report_dict(r) for r in reports_raw
-                    ]
-                    # Deduplicate based on timestamp, keeping the latest occurrence if duplicates exist
-                    # This assumes timestamps are precise enough, might need adjustment if not
-                    unique_reports_map = {
-                        r["timestamp"]: r
-                        for r in processed_reports
-                        if r.get("timestamp")
-                    }
-                    # Sort by timestamp (newest first)
-                    sorted_reports = sorted(
-                        list(unique_reports_map.values()),
-                        key=lambda r: r["timestamp"],
-                        reverse=True,
-                    )
-                    # *** Store the FULL sorted list ***
-                    processed_data[device_id]["reports"] = sorted_reports
-                    log.debug(
-                        f"User '{user_id}': Stored {len(sorted_reports)} unique reports for {device_id} (plist)"
-                    )
+                    # Plain values only; conversion, dedupe and sorting happen in the pipeline below
+                    raw_values[device_id] = [report_values(r) for r in reports_raw]
 
             except Exception as e:
                 # Handle other fetch errors as before
@@ -395,6 +287,7 @@ class AppleDataService:
                 if device_id not in processed_data: # Initialize if first error for device
                     processed_data[device_id] = {"config": devices_config.get(device_id,{}), "reports": []}
                 processed_data[device_id]["reports"] = [] # Ensure 
+                raw_values.pop(device_id, None)
 
         # --- Process .keys files ---
         for keys_file in user_data_dir.glob("*.keys"):
@@ -423,43 +316,34 @@ class AppleDataService:
                     )
                     continue
 
-                for key_b64 in private_keys_b64:
+                device_span = start_span("device.fetch", device=device_id, source="keys", keys=len(private_keys_b64))
+                for key_index, key_b64 in enumerate(private_keys_b64):
+                    key_span = start_span("key_batch.fetch", key_index=key_index)
                     try:
                         key_pair = KeyPair.from_b64(key_b64)
-                        reports_for_key: list[Any] = account.fetch_reports(
-                            date_from=start_date, date_to=end_date, keys=key_pair
-                        )
+                        with FETCH_REPORTS_LATENCY.time(source="keys"):
+                            reports_for_key: list[Any] = account.fetch_reports(
+                                date_from=start_date, date_to=end_date, keys=key_pair
+                            )
+                        FETCH_REPORTS_COUNT.observe(len(reports_for_key or []), source="keys")
+                        key_span.set_attribute("raw_reports", len(reports_for_key or []))
                         if reports_for_key:
                             all_key_reports_raw.extend(reports_for_key)
                     except Exception as key_err:
+                        key_span.record_error(key_err)
                         log.error(
                             f"User '{user_id}': Error fetching history for key {key_b64[:10]}... from {keys_file.name}: {key_err}"
                         )
+                    key_span.end()
+                device_span.set_attribute("raw_reports", len(all_key_reports_raw))
+                device_span.end()
 
                 log.debug(
                     f"User '{user_id}': Found total {len(all_key_reports_raw)} raw reports for {device_id} (keys)"
                 )
 
                 if all_key_reports_raw:
-                    # Convert, sort, and deduplicate reports
-                    processed_reports = [
-                        self._create_report_dict(r) for r in all_key_reports_raw
-                    ]
-                    unique_reports_map = {
-                        r["timestamp"]: r
-                        for r in processed_reports
-                        if r.get("timestamp")
-                    }
-                    sorted_reports = sorted(
-                        list(unique_reports_map.values()),
-                        key=lambda r: r["timestamp"],
-                        reverse=True,
-                    )
-                    # *** Store the FULL sorted list ***
-                    processed_data[device_id]["reports"] = sorted_reports
-                    log.debug(
-                        f"User '{user_id}': Stored {len(sorted_reports)} unique reports for {device_id} (keys)"
-                    )
+                    raw_values[device_id] = [report_values(r) for r in all_key_reports_raw]
 
             except Exception as e:
                 msg = f"Error processing keys file {keys_file.name}: {e}"
@@ -467,6 +351,7 @@ class AppleDataService:
                 error_messages.append(msg)
                 # Keep the device entry but with empty reports
                 processed_data[device_id]["reports"] = []
+                raw_values.pop(device_id, None)
 
         # --- Add devices from config that had no data files ---
         all_config_ids = set(devices_config.keys())
@@ -482,6 +367,30 @@ class AppleDataService:
                 }
                 processed_ids.add(device_id)
 
+        # --- Convert, dedupe, fold stays, build detail levels (optionally in the process pool) ---
+        with start_span("history.process", devices=len(raw_values)) as process_span:
+            results = process_devices(raw_values, self.config) if raw_values else {}
+            merged_total = 0
+            for device_id, result in results.items():
+                device_data = processed_data[device_id]
+                device_data["reports"] = result["reports"]
+                if result["levels"] is not None:
+                    device_data["levels"] = result["levels"]
+                merged_total += result["merged"]
+                for error in result["errors"]:
+                    log.error(f"User '{user_id}': {error} ({device_id})")
+                if result["raw"]:
+                    self.uds.report_archive.archive(user_id, device_id, result["raw"])
+                log.debug(
+                    f"User '{user_id}': Stored {len(result['reports'])} reports for {device_id} "
+                    f"({result['merged']} merged into stays)"
+                )
+            process_span.set_attribute("merged_reports", merged_total)
+            # Devices without reports still get (empty) levels
+            for device_id, device_data in processed_data.items():
+                if device_id not in results:
+                    device_data["levels"] = build_detail_levels(device_data.get("reports", []), self.config)
+
         # --- Combine errors and return ---
         combined_error_msg = "; ".join(error_messages) if error_messages else None
         log.info(f"Finished data fetch for user '{user_id}'. Processed {len(processed_ids)} devices. Errors: {combined_error_msg or 'None'}")
@@ -0,0 +1,88 @@
+# app/services/device_payload_cache.py
+# Per-user cache of the serialized (and precompressed) /api/devices body.
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+
+from app.utils.compression import PrecompressedBody
+
+log = logging.getLogger(__name__)
+
+# Cached bodies are shared across (short-lived) service instances:
+# (user_id, variant) -> (key, body)
+_bodies: Dict[Tuple[str, str], Tuple[Tuple, PrecompressedBody]] = {}
+_bodies_lock = threading.Lock()
+
+
+class DevicePayloadCache:
+    """
+    Reuses the /api/devices response body while its inputs are unchanged.
+
+    The cache key is built from cheap checks only: stat() signatures of the
+    user's cache/devices/geofences files and data directory (new .plist/.keys
+    files), the set of actively shared devices, the low-battery threshold and
+    the current wall-clock minute (the body embeds "N min ago" strings).
+    """
+
+    def __init__(self, config: Dict[str, Any], user_data_service):
+        """
+        Initializes the cache.
+
+        Args:
+            config: The Flask app config dictionary.
+            user_data_service: An instance of UserDataService.
+        """
+        self.config = config
+        self.uds = user_data_service
+
+    def _stat_signature(self, path: Optional[Path]) -> Optional[Tuple[int, int]]:
+        if not path:
+            return None
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def cache_key(self, user_id: str, variant: str = "json") -> Tuple:
+        """
+        Computes the validity key for a user's /api/devices body.
+
+        Args:
+            user_id: The user whose body is cached.
+            variant: Response encoding variant (e.g. "json" or "compact").
+        """
+        signatures = tuple(
+            self._stat_signature(self.uds._get_user_file_path(user_id, self.config[name]))
+            for name in ("USER_CACHE_FILENAME", "USER_DEVICES_FILENAME", "USER_GEOFENCES_FILENAME")
+        )
+        return (
+            variant,
+            signatures,
+            self._stat_signature(self.uds._get_user_data_dir(user_id)),
+            frozenset(self.uds.get_active_shared_device_ids_for_user(user_id)),
+            self.config.get("LOW_BATTERY_THRESHOLD"),
+            int(time.time() // 60),
+        )
+
+    def get(self, user_id: str, key: Tuple) -> Optional[PrecompressedBody]:
+        """Returns the cached body if it was stored under the same key."""
+        entry = _bodies.get((user_id, key[0]))
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        return None
+
+    def put(self, user_id: str, key: Tuple, body: PrecompressedBody):
+        """Stores the body for a user and variant (replacing any older one)."""
+        with _bodies_lock:
+            _bodies[(user_id, key[0])] = (key, body)
+
+    def invalidate(self, user_id: str):
+        """Drops a user's cached bodies (all variants)."""
+        with _bodies_lock:
+            for storage_key in [k for k in _bodies if k[0] == user_id]:
+                del _bodies[storage_key]
@@ -0,0 +1,558 @@
+# app/services/notification_history_log.py
+# Append-only notification history: daily JSONL segments + in-memory index.
+
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Set
+
+from app.utils.json_utils import dumps_bytes, loads
+
+log = logging.getLogger(__name__)
+
+# --- Record Ops ---
+OP_CREATE = "create"
+OP_READ = "read"
+OP_UNREAD = "unread"
+OP_DELETE = "delete"
+OP_READ_ALL = "read_all"
+OP_MARK = "mark"  # Delta-sync floor (written after compaction / clear)
+
+SEGMENT_SUFFIX = ".jsonl"
+REQUIRED_ENTRY_KEYS = {"id", "timestamp", "title", "body", "is_read"}
+# Compact once mutation records outnumber live entries (and at least this many exist)
+COMPACT_MIN_OP_RECORDS = 200
+
+
+class _HistoryIndex:
+    """In-memory state rebuilt from a user's segments."""
+
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}  # id -> entry, oldest first
+        self.segment_of: Dict[str, str] = {}  # id -> segment file name
+        self.order: List[str] = []  # Creation order (deleted ids stay as holes)
+        self.position: Dict[str, int] = {}  # id -> slot in self.order (cursors)
+        self.changed_at: Dict[str, float] = {}  # id -> epoch of last create/mutation
+        self.deleted_at: Dict[str, float] = {}  # Tombstones for delta sync
+        self.unread_count = 0
+        self.delta_floor = 0.0  # Deltas older than this need a full resync
+        self.op_records = 0  # Non-create records (compaction pressure)
+        self.signature: Tuple[Tuple[str, int], ...] = ()
+
+
+# Indexes are shared across (short-lived) service instances, keyed by log directory
+_indexes: Dict[str, _HistoryIndex] = {}
+
+
+def _parse_ts(ts_str: str) -> Optional[datetime]:
+    try:
+        if "+" not in ts_str and "Z" not in ts_str:
+            ts_str += "+00:00"  # Assume UTC if no offset
+        else:
+            ts_str = ts_str.replace("Z", "+00:00")
+        return datetime.fromisoformat(ts_str)
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+class NotificationHistoryLog:
+    """
+    Stores notification history as append-only daily segments
+    (notifications_log/YYYY-MM-DD.jsonl) with one record per line:
+
+        {"op": "create", "entry": {...}}
+        {"op": "read" | "unread" | "delete", "id": "..."}
+
+    An in-memory index (by notification id) makes read/unread/delete O(1) appends.
+    Retention pruning drops whole segments; compaction folds mutation records
+    back into the create records.
+    """
+
+    def __init__(self, config: Dict[str, Any], user_data_service):
+        """
+        Initializes the log.
+
+        Args:
+            config: The Flask app config dictionary.
+            user_data_service: An instance of UserDataService (used for paths and locks).
+        """
+        self.config = config
+        self.uds = user_data_service
+        self.legacy_filename = config["USER_NOTIFICATIONS_HISTORY_FILENAME"]
+        self.dirname = config.get("USER_NOTIFICATIONS_LOG_DIRNAME", "notifications_log")
+        self.retention_days = config.get("NOTIFICATION_HISTORY_DAYS", 30)
+        # Shares the history lock (one lock per file type, like other user files)
+        self.lock = self.uds.file_locks.get(self.legacy_filename)
+
+    # --- Path / Segment Helpers ---
+    def _get_log_dir(self, user_id: str) -> Optional[Path]:
+        user_dir = self.uds._get_user_data_dir(user_id)
+        return (user_dir / self.dirname) if user_dir else None
+
+    def _segment_name(self, dt: datetime) -> str:
+        return dt.astimezone(timezone.utc).strftime("%Y-%m-%d") + SEGMENT_SUFFIX
+
+    def _list_segments(self, log_dir: Path) -> List[Tuple[str, int]]:
+        """Returns (name, size) for each segment, oldest first."""
+        if not log_dir.is_dir():
+            return []
+        segments = []
+        with os.scandir(log_dir) as it:
+            for dirent in it:
+                if dirent.is_file() and dirent.name.endswith(SEGMENT_SUFFIX):
+                    segments.append((dirent.name, dirent.stat().st_size))
+        segments.sort()
+        return segments
+
+    def _cutoff(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+
+    def _unread_within_retention(self, index: _HistoryIndex) -> int:
+        """
+        index.unread_count without the unread entries past retention that sit in
+        segments not pruned yet (list_entries/query do not show those either).
+        """
+        cutoff = self._cutoff()
+        expired_unread = 0
+        for entry in index.entries.values():  # Oldest first
+            entry_ts = _parse_ts(entry.get("timestamp", ""))
+            if entry_ts is None:
+                continue
+            if entry_ts >= cutoff:
+                break
+            if not entry.get("is_read"):
+                expired_unread += 1
+        return index.unread_count - expired_unread
+
+    # --- Index Maintenance (caller holds self.lock) ---
+    def _apply_record(self, index: _HistoryIndex, record: Dict[str, Any], segment: str):
+        op = record.get("op")
+        record_ts = record.get("ts")
+        if op == OP_CREATE:
+            entry = record.get("entry")
+            if not isinstance(entry, dict) or not REQUIRED_ENTRY_KEYS.issubset(entry.keys()):
+                log.warning(f"Skipping invalid history create record in {segment}.")
+                return
+            entry_id = entry["id"]
+            if entry_id in index.entries:
+                return  # Duplicate create (should not happen); keep the first
+            if not isinstance(record_ts, (int, float)):
+                entry_ts = _parse_ts(entry.get("timestamp", ""))
+                record_ts = entry_ts.timestamp() if entry_ts else 0.0
+            index.entries[entry_id] = entry
+            index.segment_of[entry_id] = segment
+            index.position[entry_id] = len(index.order)
+            index.order.append(entry_id)
+            index.changed_at[entry_id] = record_ts
+            if not entry.get("is_read"):
+                index.unread_count += 1
+            return
+
+        index.op_records += 1
+        if not isinstance(record_ts, (int, float)):
+            record_ts = 0.0
+        if op == OP_MARK:
+            index.delta_floor = max(index.delta_floor, record_ts)
+            return
+        if op == OP_READ_ALL:
+            for entry_id, entry in index.entries.items():
+                if not entry.get("is_read"):
+                    entry["is_read"] = True
+                    index.changed_at[entry_id] = record_ts
+            index.unread_count = 0
+            return
+
+        entry_id = record.get("id")
+        entry = index.entries.get(entry_id)
+        if entry is None:
+            return  # Entry pruned/deleted already
+        if op in (OP_READ, OP_UNREAD):
+            new_state = op == OP_READ
+            if bool(entry.get("is_read")) != new_state:
+                index.unread_count += -1 if new_state else 1
+            entry["is_read"] = new_state
+            index.changed_at[entry_id] = record_ts
+        elif op == OP_DELETE:
+            if not entry.get("is_read"):
+                index.unread_count -= 1
+            del index.entries[entry_id]
+            index.segment_of.pop(entry_id, None)
+            index.changed_at.pop(entry_id, None)
+            index.deleted_at[entry_id] = record_ts
+
+    def _replay(self, log_dir: Path, segments: List[Tuple[str, int]]) -> _HistoryIndex:
+        index = _HistoryIndex()
+        for name, _ in segments:
+            try:
+                with open(log_dir / name, "r", encoding="utf-8") as f:
+                    for line_no, line in enumerate(f, 1):
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            record = loads(line)
+                        except json.JSONDecodeError:
+                            # Torn trailing write after a crash; skip it
+                            log.warning(f"Skipping corrupt history record {name}:{line_no}")
+                            continue
+                        if isinstance(record, dict):
+                            self._apply_record(index, record, name)
+            except (IOError, OSError) as e:
+                log.error(f"Failed to read history segment {log_dir / name}: {e}")
+        index.signature = tuple(segments)
+        return index
+
+    def _migrate_legacy(self, user_id: str, log_dir: Path):
+        """Imports a legacy notifications_history.json list into segments (once)."""
+        legacy_file = self.uds._get_user_file_path(user_id, self.legacy_filename)
+        if not legacy_file or not legacy_file.exists():
+            return
+        try:
+            with open(legacy_file, "r", encoding="utf-8") as f:
+                legacy = json.load(f) if legacy_file.stat().st_size > 0 else []
+        except Exception as e:
+            log.error(f"Failed to read legacy history {legacy_file} for migration: {e}")
+            return
+        if not isinstance(legacy, list):
+            legacy = []
+
+        by_segment: Dict[str, List[Tuple[datetime, Dict[str, Any]]]] = {}
+        for item in legacy:
+            if not isinstance(item, dict) or not REQUIRED_ENTRY_KEYS.issubset(item.keys()):
+                continue
+            item_ts = _parse_ts(item.get("timestamp", ""))
+            if item_ts is None:
+                continue
+            by_segment.setdefault(self._segment_name(item_ts), []).append(
+                (item_ts, item)
+            )
+        log_dir.mkdir(parents=True, exist_ok=True)
+        for name, items in by_segment.items():
+            items.sort(key=lambda x: x[0])  # Oldest first within a segment
+            self._write_segment(log_dir / name, [i for _, i in items])
+        legacy_file.rename(legacy_file.with_name(legacy_file.name + ".migrated"))
+        log.info(
+            f"User '{user_id}': Migrated {sum(len(v) for v in by_segment.values())} notification history entries to append-only log."
+        )
+
+    def _write_segment(
+        self,
+        segment_path: Path,
+        entries: List[Dict[str, Any]],
+        changed_at: Optional[Dict[str, float]] = None,
+    ):
+        """Atomically (re)writes a segment containing only create records."""
+        temp_path = segment_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                record = {"op": OP_CREATE, "entry": entry}
+                if changed_at and entry["id"] in changed_at:
+                    record["ts"] = changed_at[entry["id"]]
+                f.write(self._encode(record))
+        os.replace(temp_path, segment_path)
+
+    def _encode(self, record: Dict[str, Any]) -> str:
+        return dumps_bytes(record).decode("utf-8") + "\n"
+
+    def _sync(self, user_id: str) -> Tuple[Optional[Path], Optional[_HistoryIndex]]:
+        """Returns an up-to-date index, replaying segments if they changed on disk."""
+        log_dir = self._get_log_dir(user_id)
+        if not log_dir:
+            return None, None
+        if not log_dir.exists():
+            self._migrate_legacy(user_id, log_dir)
+        key = str(log_dir)
+        segments = self._list_segments(log_dir)
+        index = _indexes.get(key)
+        if index is None or index.signature != tuple(segments):
+            index = self._replay(log_dir, segments)
+            _indexes[key] = index
+            log.debug(
+                f"User '{user_id}': Rebuilt notification history index ({len(index.entries)} entries, {len(segments)} segments)."
+            )
+        return log_dir, index
+
+    def _append(self, log_dir: Path, index: _HistoryIndex, record: Dict[str, Any]) -> str:
+        """Appends a record to today's segment and updates the index signature."""
+        record.setdefault("ts", time.time())
+        log_dir.mkdir(parents=True, exist_ok=True)
+        name = self._segment_name(datetime.now(timezone.utc))
+        with open(log_dir / name, "a", encoding="utf-8") as f:
+            f.write(self._encode(record))
+            new_size = f.tell()
+        signature = dict(index.signature)
+        signature[name] = new_size
+        index.signature = tuple(sorted(signature.items()))
+        self._apply_record(index, record, name)
+        return name
+
+    # --- Public API ---
+    def list_entries(self, user_id: str) -> List[Dict[str, Any]]:
+        """Returns copies of all entries within retention, newest first."""
+        if not self.lock:
+            log.error(f"Lock for '{self.legacy_filename}' not found.")
+            return []
+        cutoff = self._cutoff()
+        with self.lock:
+            _, index = self._sync(user_id)
+            if index is None:
+                return []
+            result = []
+            for entry in reversed(index.entries.values()):
+                entry_ts = _parse_ts(entry.get("timestamp", ""))
+                if entry_ts is None:
+                    continue
+                if entry_ts < cutoff:
+                    break  # Oldest-first order: everything further is older
+                result.append(dict(entry))
+        return result
+
+    def append_entry(self, user_id: str, entry: Dict[str, Any]):
+        """Appends a create record."""
+        if not self.lock:
+            raise RuntimeError(f"Lock for '{self.legacy_filename}' not found.")
+        with self.lock:
+            log_dir, index = self._sync(user_id)
+            if index is None:
+                raise IOError(f"Could not get notification log dir for user '{user_id}'.")
+            self._append(log_dir, index, {"op": OP_CREATE, "entry": entry})
+
+    def set_read(self, user_id: str, notification_id: str, is_read: bool) -> bool:
+        """Appends a read/unread record. Returns False if the id is unknown."""
+        if not self.lock:
+            return False
+        with self.lock:
+            log_dir, index = self._sync(user_id)
+            if index is None or notification_id not in index.entries:
+                return False
+            if index.entries[notification_id].get("is_read") == bool(is_read):
+                return True  # Already in the requested state
+            self._append(
+                log_dir,
+                index,
+                {"op": OP_READ if is_read else OP_UNREAD, "id": notification_id},
+            )
+        return True
+
+    def delete_entry(self, user_id: str, notification_id: str) -> bool:
+        """Appends a delete record. Returns False if the id is unknown."""
+        if not self.lock:
+            return False
+        with self.lock:
+            log_dir, index = self._sync(user_id)
+            if index is None or notification_id not in index.entries:
+                return False
+            self._append(log_dir, index, {"op": OP_DELETE, "id": notification_id})
+        return True
+
+    def clear(self, user_id: str) -> bool:
+        """Drops every segment."""
+        if not self.lock:
+            return False
+        with self.lock:
+            log_dir, index = self._sync(user_id)
+            if index is None:
+                return False
+            for name, _ in self._list_segments(log_dir):
+                try:
+                    os.remove(log_dir / name)
+                except OSError as e:
+                    log.error(f"Failed to remove history segment {log_dir / name}: {e}")
+            index = _HistoryIndex()
+            _indexes[str(log_dir)] = index
+            self._append(log_dir, index, {"op": OP_MARK})  # Clients must resync
+        return True
+
+    def prune(self, user_id: str) -> int:
+        """Drops whole segments older than the retention period. Returns segments dropped."""
+        if not self.lock:
+            return 0
+        cutoff_name = self._segment_name(self._cutoff())
+        dropped = 0
+        with self.lock:
+            log_dir, index = self._sync(user_id)
+            if index is None:
+                return 0
+            for name, _ in self._list_segments(log_dir):
+                if name >= cutoff_name:
+                    break  # Sorted oldest first
+                try:
+                    os.remove(log_dir / name)
+                    dropped += 1
+                except OSError as e:
+                    log.error(f"Failed to drop history segment {log_dir / name}: {e}")
+            # Next access replays (signature changed)
+        return dropped
+
+    def compact(self, user_id: str, force: bool = False) -> bool:
+        """
+        Rewrites segments so they contain only create records for live entries
+        (with read state folded in). Runs when mutation records dominate.
+
+        Returns:
+            True if compaction ran.
+        """
+        if not self.lock:
+            return False
+        with self.lock:
+            log_dir, index = self._sync(user_id)
+            if index is None:
+                return False
+            if not force and (
+                index.op_records < COMPACT_MIN_OP_RECORDS
+                or index.op_records < len(index.entries)
+            ):
+                return False
+            live_by_segment: Dict[str, List[Tuple[datetime, Dict[str, Any]]]] = {}
+            for entry_id, entry in index.entries.items():
+                live_by_segment.setdefault(index.segment_of[entry_id], []).append(entry)
+            try:
+                for name, _ in self._list_segments(log_dir):
+                    live = live_by_segment.get(name)
+                    if live:
+                        self._write_segment(log_dir / name, live, index.changed_at)
+                    else:
+                        os.remove(log_dir / name)
+            except (IOError, OSError) as e:
+                log.error(f"User '{user_id}': History compaction failed: {e}")
+                _indexes.pop(str(log_dir), None)  # Force a replay next time
+                return False
+            log.info(
+                f"User '{user_id}': Compacted notification history ({index.op_records} mutation records folded)."
+            )
+            _indexes.pop(str(log_dir), None)
+            # Tombstones are gone, so older delta cursors must resync
+            log_dir, index = self._sync(user_id)
+            self._append(log_dir, index, {"op": OP_MARK})
+        return True
+
+    # --- Queries (pagination, filters, delta sync) ---
+    def _matches(
+        self,
+        entry: Dict[str, Any],
+        types: Optional[Set[str]],
+        device_id: Optional[str],
+        read_state: Optional[bool],
+    ) -> bool:
+        data = entry.get("data") or {}
+        if types and data.get("type") not in types:
+            return False
+        if device_id and data.get("deviceId") != device_id:
+            return False
+        if read_state is not None and bool(entry.get("is_read")) != read_state:
+            return False
+        return True
+
+    def query(
+        self,
+        user_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        types: Optional[Set[str]] = None,
+        device_id: Optional[str] = None,
+        read_state: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """
+        Returns one page of entries (newest first) starting after `cursor`.
+
+        Args:
+            user_id: The user ID.
+            limit: Maximum entries to return.
+            cursor: Opaque cursor from a previous page (the last entry's id).
+            types: Only include entries whose data.type is in this set.
+            device_id: Only include entries for this device.
+            read_state: True for read only, False for unread only, None for all.
+
+        Returns:
+            {"items": [...], "next_cursor": str|None, "unread_count": int, "server_time": float}
+        """
+        cutoff = self._cutoff()
+        items: List[Dict[str, Any]] = []
+        next_cursor = None
+        with self.lock:
+            _, index = self._sync(user_id)
+            if index is None:
+                return {
+                    "items": [],
+                    "next_cursor": None,
+                    "unread_count": 0,
+                    "server_time": time.time(),
+                }
+            start = len(index.order) - 1
+            if cursor:
+                if cursor not in index.position:
+                    raise ValueError("Invalid or expired cursor.")
+                start = index.position[cursor] - 1
+            for slot in range(start, -1, -1):
+                entry = index.entries.get(index.order[slot])
+                if entry is None:
+                    continue  # Deleted
+                entry_ts = _parse_ts(entry.get("timestamp", ""))
+                if entry_ts is not None and entry_ts < cutoff:
+                    break  # Everything further back is past retention
+                if not self._matches(entry, types, device_id, read_state):
+                    continue
+                if len(items) >= limit:
+                    next_cursor = items[-1]["id"]
+                    break
+                items.append(dict(entry))
+            unread_count = self._unread_within_retention(index)
+        return {
+            "items": items,
+            "next_cursor": next_cursor,
+            "unread_count": unread_count,
+            "server_time": time.time(),
+        }
+
+    def changes_since(self, user_id: str, since_ts: float) -> Dict[str, Any]:
+        """
+        Returns entries created/changed and ids deleted after `since_ts` (epoch seconds).
+        `full_sync` is True when the log was compacted or cleared since then.
+        """
+        with self.lock:
+            _, index = self._sync(user_id)
+            if index is None:
+                return {
+                    "items": [],
+                    "deleted": [],
+                    "full_sync": False,
+                    "unread_count": 0,
+                    "server_time": time.time(),
+                }
+            full_sync = since_ts < index.delta_floor
+            items = [
+                dict(index.entries[entry_id])
+                for entry_id, changed in index.changed_at.items()
+                if changed > since_ts and entry_id in index.entries
+            ]
+            deleted = [
+                entry_id for entry_id, ts in index.deleted_at.items() if ts > since_ts
+            ]
+            unread_count = self._unread_within_retention(index)
+        items.sort(key=lambda e: e.get("timestamp", ""), reverse=True)
+        return {
+            "items": items,
+            "deleted": deleted,
+            "full_sync": full_sync,
+            "unread_count": unread_count,
+            "server_time": time.time(),
+        }
+
+    def unread_count(self, user_id: str) -> int:
+        """Returns the number of unread entries within retention (from the index)."""
+        with self.lock:
+            _, index = self._sync(user_id)
+            return self._unread_within_retention(index) if index else 0
+
+    def mark_all_read(self, user_id: str) -> int:
+        """Appends a single read_all record. Returns how many entries changed."""
+        with self.lock:
+            log_dir, index = self._sync(user_id)
+            if index is None or index.unread_count == 0:
+                return 0
+            changed = self._unread_within_retention(index)
+            self._append(log_dir, index, {"op": OP_READ_ALL})  # Also marks entries past retention
+        return changed
@@ -0,0 +1,402 @@
+# app/services/notification_outbox.py
+# Durable per-user outbox for web push delivery (retries, backoff, circuit breaking).
+
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from app.utils.json_utils import load_json_file, save_json_atomic
+
+log = logging.getLogger(__name__)
+
+# --- Entry Statuses ---
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_DELIVERED = "delivered"
+STATUS_FAILED = "failed"  # Permanent failure (subscription gone/invalid)
+STATUS_EXPIRED = "expired"  # Gave up after max attempts
+STATUS_CANCELLED = "cancelled"  # Subscription removed before delivery
+FINAL_STATUSES = {STATUS_DELIVERED, STATUS_FAILED, STATUS_EXPIRED, STATUS_CANCELLED}
+
+# --- Delivery Outcomes (reported back by the delivery worker) ---
+OUTCOME_DELIVERED = "delivered"
+OUTCOME_RETRY = "retry"
+OUTCOME_PERMANENT = "permanent"
+OUTCOME_CANCELLED = "cancelled"
+OUTCOME_DEFERRED = "deferred"  # Not the endpoint's fault (e.g. VAPID claims missing)
+
+# Entries left in 'sending' longer than this are assumed orphaned (process died mid-send)
+SENDING_LEASE_SECONDS = 300
+
+# --- In-process drain guards (one drainer per user at a time) ---
+_drain_locks: Dict[str, threading.Lock] = {}
+_drain_locks_guard = threading.Lock()
+
+
+def _get_drain_lock(user_id: str) -> threading.Lock:
+    with _drain_locks_guard:
+        lock = _drain_locks.get(user_id)
+        if lock is None:
+            lock = threading.Lock()
+            _drain_locks[user_id] = lock
+        return lock
+
+
+class NotificationOutbox:
+    """
+    Persists outgoing push notifications per user so delivery survives transient
+    push-service errors and process restarts.
+
+    File layout (notification_outbox.json):
+        {
+            "entries": [...],
+            "circuits": {endpoint: {"failures": int, "open_until": float}},
+            "digest": {"opened_at": float, "events": [...]},  # Held digest events
+        }
+    """
+
+    def __init__(self, config: Dict[str, Any], user_data_service):
+        """
+        Initializes the outbox.
+
+        Args:
+            config: The Flask app config dictionary.
+            user_data_service: An instance of UserDataService (used for path resolution).
+        """
+        self.config = config
+        self.uds = user_data_service
+        self.filename = config.get(
+            "USER_NOTIFICATION_OUTBOX_FILENAME", "notification_outbox.json"
+        )
+        self.max_attempts = config.get("NOTIFICATION_OUTBOX_MAX_ATTEMPTS", 8)
+        self.backoff_base = config.get("NOTIFICATION_OUTBOX_BACKOFF_BASE_SECONDS", 30)
+        self.backoff_max = config.get("NOTIFICATION_OUTBOX_BACKOFF_MAX_SECONDS", 3600)
+        self.retention_seconds = (
+            config.get("NOTIFICATION_OUTBOX_RETENTION_HOURS", 24) * 3600
+        )
+        self.circuit_threshold = config.get("PUSH_CIRCUIT_FAILURE_THRESHOLD", 3)
+        self.circuit_open_seconds = config.get("PUSH_CIRCUIT_OPEN_SECONDS", 600)
+
+    # --- File Helpers ---
+    def _get_lock(self) -> Optional[threading.Lock]:
+        lock = self.uds.file_locks.get(self.filename)
+        if not lock:
+            log.error(f"Lock for '{self.filename}' not found.")
+        return lock
+
+    def _get_path(self, user_id: str, create_dir: bool = True) -> Optional[Path]:
+        if not create_dir:
+            if not user_id or "/" in user_id or ".." in user_id:
+                return None
+            path = self.uds.data_dir / user_id / self.filename
+            return path if path.exists() else None
+        return self.uds._get_user_file_path(user_id, self.filename)
+
+    def _load_unlocked(self, path: Path) -> Dict[str, Any]:
+        """Loads the outbox document. Caller must hold the outbox lock."""
+        data = load_json_file(path, threading.Lock())  # Dummy lock inside outer lock
+        if data is None:
+            data = {}
+        entries = data.get("entries")
+        circuits = data.get("circuits")
+        digest = data.get("digest")
+        if not isinstance(digest, dict) or not isinstance(digest.get("events"), list):
+            digest = {"opened_at": None, "events": []}
+        return {
+            "entries": entries if isinstance(entries, list) else [],
+            "circuits": circuits if isinstance(circuits, dict) else {},
+            "digest": digest,
+        }
+
+    def _save_unlocked(self, path: Path, data: Dict[str, Any]):
+        """
+        Saves the outbox document. Caller must hold the outbox lock.
+
+        An idle outbox (no entries, no held digest, no open circuit) is deleted
+        instead, so has_outbox() lets the delivery job skip the user again.
+        """
+        now = time.time()
+        if (
+            not data.get("entries")
+            and not (data.get("digest") or {}).get("events")
+            and not any(c.get("open_until", 0) > now for c in (data.get("circuits") or {}).values())
+        ):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            return
+        save_json_atomic(path, data, threading.Lock(), indent=None)  # Dummy lock
+
+    def _backoff_seconds(self, attempts: int) -> float:
+        """Exponential backoff with +/-20% jitter, capped at the configured max."""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    # --- Public API ---
+    def has_outbox(self, user_id: str) -> bool:
+        """Cheap check (no parse) used by the delivery job to skip idle users."""
+        return self._get_path(user_id, create_dir=False) is not None
+
+    def enqueue(
+        self,
+        user_id: str,
+        endpoints: List[str],
+        payload_json: str,
+        tag: Optional[str] = None,
+        notification_type: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Writes one outbox entry per subscription endpoint.
+
+        Args:
+            user_id: Owner of the subscriptions.
+            endpoints: Push endpoints to deliver to.
+            payload_json: Serialized push payload (sent as-is).
+            tag: Notification tag (for logging/status only).
+            notification_type: Notification type (for logging/status only).
+
+        Returns:
+            The list of created entry IDs (empty on failure).
+        """
+        if not user_id or not endpoints:
+            return []
+        path = self._get_path(user_id)
+        lock = self._get_lock()
+        if not path or not lock:
+            return []
+
+        now = time.time()
+        created_at = datetime.now(timezone.utc).isoformat()
+        new_entries = [
+            {
+                "id": str(uuid.uuid4()),
+                "created_at": created_at,
+                "endpoint": endpoint,
+                "payload": payload_json,
+                "tag": tag,
+                "notification_type": notification_type,
+                "status": STATUS_PENDING,
+                "attempts": 0,
+                "next_attempt_at": now,
+                "last_attempt_at": None,
+                "last_status_code": None,
+                "last_error": None,
+                "finished_at": None,
+            }
+            for endpoint in endpoints
+        ]
+        try:
+            with lock:
+                outbox = self._load_unlocked(path)
+                outbox["entries"].extend(new_entries)
+                self._save_unlocked(path, outbox)
+        except Exception as e:
+            log.error(f"User '{user_id}': Failed to enqueue push notifications: {e}")
+            return []
+        log.info(
+            f"User '{user_id}': Queued {len(new_entries)} push deliveries (Tag: {tag})."
+        )
+        return [e["id"] for e in new_entries]
+
+    def claim_due(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        Marks due entries as 'sending' and returns copies of them.
+
+        Entries for endpoints with an open circuit are pushed back to the circuit's
+        re-open time. Once the open period has elapsed, a single probe entry per
+        endpoint is released (half-open). Finished entries past retention are dropped.
+        """
+        path = self._get_path(user_id, create_dir=False)
+        lock = self._get_lock()
+        if not path or not lock:
+            return []
+
+        now = time.time()
+        claimed: List[Dict[str, Any]] = []
+        with lock:
+            outbox = self._load_unlocked(path)
+            circuits = outbox["circuits"]
+            probing: set = set()
+            kept_entries = []
+            changed = False
+
+            for entry in outbox["entries"]:
+                status = entry.get("status")
+                if status in FINAL_STATUSES:
+                    if now - (entry.get("finished_at") or now) > self.retention_seconds:
+                        changed = True
+                        continue  # Drop old finished entry
+                    kept_entries.append(entry)
+                    continue
+
+                if status == STATUS_SENDING and now - (
+                    entry.get("last_attempt_at") or 0
+                ) > SENDING_LEASE_SECONDS:
+                    log.warning(
+                        f"User '{user_id}': Recovering orphaned outbox entry {entry.get('id')}."
+                    )
+                    entry["status"] = STATUS_PENDING
+                    changed = True
+
+                if entry.get("status") != STATUS_PENDING or (
+                    entry.get("next_attempt_at") or 0
+                ) > now:
+                    kept_entries.append(entry)
+                    continue
+
+                endpoint = entry.get("endpoint")
+                circuit = circuits.get(endpoint)
+                if circuit and circuit.get("failures", 0) >= self.circuit_threshold:
+                    open_until = circuit.get("open_until", 0)
+                    if open_until > now or endpoint in probing:
+                        # Circuit open (or probe already in flight): defer
+                        entry["next_attempt_at"] = max(open_until, now + 1)
+                        kept_entries.append(entry)
+                        changed = True
+                        continue
+                    probing.add(endpoint)  # Half-open: allow one probe
+
+                entry["status"] = STATUS_SENDING
+                entry["attempts"] = entry.get("attempts", 0) + 1
+                entry["last_attempt_at"] = now
+                kept_entries.append(entry)
+                claimed.append(dict(entry))
+                changed = True
+
+            if changed:
+                outbox["entries"] = kept_entries
+                try:
+                    self._save_unlocked(path, outbox)
+                except Exception as e:
+                    log.error(f"User '{user_id}': Failed to save outbox claims: {e}")
+                    return []
+        return claimed
+
+    def record_results(self, user_id: str, results: Dict[str, Dict[str, Any]]):
+        """
+        Applies delivery outcomes to claimed entries and updates endpoint circuits.
+
+        Args:
+            user_id: The user ID.
+            results: Map of entry_id -> {"outcome": str, "status_code": Any, "error": str}.
+        """
+        if not results:
+            return
+        path = self._get_path(user_id, create_dir=False)
+        lock = self._get_lock()
+        if not path or not lock:
+            return
+
+        now = time.time()
+        with lock:
+            outbox = self._load_unlocked(path)
+            circuits = outbox["circuits"]
+            for entry in outbox["entries"]:
+                result = results.get(entry.get("id"))
+                if not result:
+                    continue
+                outcome = result.get("outcome")
+                endpoint = entry.get("endpoint")
+                entry["last_status_code"] = result.get("status_code")
+                entry["last_error"] = result.get("error")
+
+                if outcome == OUTCOME_DELIVERED:
+                    entry["status"] = STATUS_DELIVERED
+                    entry["finished_at"] = now
+                    circuits.pop(endpoint, None)
+                elif outcome == OUTCOME_PERMANENT:
+                    entry["status"] = STATUS_FAILED
+                    entry["finished_at"] = now
+                    circuits.pop(endpoint, None)
+                elif outcome == OUTCOME_CANCELLED:
+                    entry["status"] = STATUS_CANCELLED
+                    entry["finished_at"] = now
+                elif outcome == OUTCOME_DEFERRED:
+                    entry["status"] = STATUS_PENDING
+                    entry["attempts"] = max(0, entry.get("attempts", 1) - 1)
+                    entry["next_attempt_at"] = now + self.backoff_base
+                else:  # OUTCOME_RETRY
+                    circuit = circuits.setdefault(
+                        endpoint, {"failures": 0, "open_until": 0}
+                    )
+                    circuit["failures"] = circuit.get("failures", 0) + 1
+                    if circuit["failures"] >= self.circuit_threshold:
+                        circuit["open_until"] = now + self.circuit_open_seconds
+                        log.warning(
+                            f"User '{user_id}': Circuit opened for {endpoint[:50]}... after {circuit['failures']} failures."
+                        )
+                    if entry.get("attempts", 0) >= self.max_attempts:
+                        entry["status"] = STATUS_EXPIRED
+                        entry["finished_at"] = now
+                        log.warning(
+                            f"User '{user_id}': Giving up on outbox entry {entry.get('id')} after {entry.get('attempts')} attempts."
+                        )
+                    else:
+                        entry["status"] = STATUS_PENDING
+                        entry["next_attempt_at"] = now + self._backoff_seconds(
+                            entry.get("attempts", 1)
+                        )
+            try:
+                self._save_unlocked(path, outbox)
+            except Exception as e:
+                log.error(f"User '{user_id}': Failed to save outbox results: {e}")
+
+    # --- Digest Holding (NOTIFICATION_DIGEST_WINDOW_SECONDS > 0) ---
+    def hold_digest_events(self, user_id: str, events: List[Dict[str, Any]]):
+        """Appends events to the user's held digest, opening the window if needed."""
+        if not user_id or not events:
+            return
+        path = self._get_path(user_id)
+        lock = self._get_lock()
+        if not path or not lock:
+            return
+        try:
+            with lock:
+                outbox = self._load_unlocked(path)
+                digest = outbox["digest"]
+                if not digest["events"]:
+                    digest["opened_at"] = time.time()
+                digest["events"].extend(events)
+                self._save_unlocked(path, outbox)
+            log.info(f"User '{user_id}': Held {len(events)} events for digest.")
+        except Exception as e:
+            log.error(f"User '{user_id}': Failed to hold digest events: {e}")
+
+    def take_due_digest(
+        self, user_id: str, window_seconds: int, force: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Removes and returns held digest events once the window has elapsed."""
+        path = self._get_path(user_id, create_dir=False)
+        lock = self._get_lock()
+        if not path or not lock:
+            return []
+        with lock:
+            outbox = self._load_unlocked(path)
+            digest = outbox["digest"]
+            if not digest["events"]:
+                return []
+            opened_at = digest.get("opened_at") or 0
+            if not force and time.time() - opened_at < window_seconds:
+                return []
+            events = digest["events"]
+            outbox["digest"] = {"opened_at": None, "events": []}
+            try:
+                self._save_unlocked(path, outbox)
+            except Exception as e:
+                log.error(f"User '{user_id}': Failed to clear held digest: {e}")
+                return []
+        return events
+
+    def try_begin_drain(self, user_id: str) -> Optional[threading.Lock]:
+        """Returns the acquired per-user drain lock, or None if a drain is already running."""
+        drain_lock = _get_drain_lock(user_id)
+        if drain_lock.acquire(blocking=False):
+            return drain_lock
+        log.debug(f"User '{user_id}': Outbox drain already in progress. Skipping.")
+        return None
@@ -12,15 +12,41 @@ from pywebpush import webpush, WebPushException
 from flask import url_for, current_app
 
 from .user_data_service import UserDataService
+from .notification_outbox import (
+    NotificationOutbox,
+    OUTCOME_DELIVERED,
+    OUTCOME_RETRY,
+    OUTCOME_PERMANENT,
+    OUTCOME_CANCELLED,
+    OUTCOME_DEFERRED,
+)
 from app.utils.helpers import (
     haversine,
     getDefaultColorForId,
 )
 from app.utils.data_formatting import _parse_battery_info
+from app.utils.metrics import PUSH_LATENCY, PUSH_RESULTS
 
 log = logging.getLogger(__name__)
 
 
+def _push_status_code(ex: WebPushException) -> Optional[int]:
+    # A requests.Response is falsy for any 4xx/5xx, so test for None explicitly
+    return getattr(ex.response, "status_code", None)
+
+
+class _NotificationStateBatch:
+    """Per-fetch unit of work: state documents loaded once, flushed once."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.geofences: Dict[str, Dict[str, Any]] = {}
+        self.geofence_state: Dict[Tuple[str, str], str] = {}
+        self.battery_state: Dict[str, str] = {}
+        self.notification_times: Dict[Tuple[str, str], float] = {}
+        self.dirty: Set[str] = set()  # Names of documents needing a save
+
+
 class NotificationService:
     """Handles notification logic (geofence, battery) and sending web push notifications."""
 
@@ -40,6 +66,11 @@ class NotificationService:
         self.vapid_claims_email_config = config.get("VAPID_CLAIMS_EMAIL")
         self.low_battery_threshold = config.get("LOW_BATTERY_THRESHOLD", 15)
         self.notification_cooldown = config.get("NOTIFICATION_COOLDOWN_SECONDS", 300)
+        self.outbox = NotificationOutbox(config, user_data_service)
+        self.digest_enabled = config.get("NOTIFICATION_DIGEST_ENABLED", True)
+        self.digest_window_seconds = config.get("NOTIFICATION_DIGEST_WINDOW_SECONDS", 0)
+        self._digest_events: Optional[List[Dict[str, Any]]] = None  # Set by begin_digest()
+        self._state_batch: Optional[_NotificationStateBatch] = None  # Set by begin_state_batch()
 
         # Store paths for generating URLs later
         self.default_icon_path = config.get(
@@ -186,7 +217,7 @@ class NotificationService:
         if not user_id:
             return False
         try:
-            last_notification_times = self.uds.load_notification_times(user_id)
+            last_notification_times = self._get_notification_times(user_id)
             last_time = last_notification_times.get((device_id, event_key))
             now = time.time()
             if last_time and (now - last_time < self.notification_cooldown):
@@ -209,10 +240,14 @@ class NotificationService:
         if not user_id:
             return
         try:
-            last_notification_times = self.uds.load_notification_times(user_id)
+            batch = self._get_state_batch(user_id)
+            last_notification_times = self._get_notification_times(user_id)
             now = time.time()
             last_notification_times[(device_id, event_key)] = now
-            self.uds.save_notification_times(user_id, last_notification_times)
+            if batch:
+                batch.dirty.add("notification_times")  # Flushed once by flush_state_batch()
+            else:
+                self.uds.save_notification_times(user_id, last_notification_times)
             log.info(
                 f"User '{user_id}': Recorded notification time for {device_id}/{event_key} at {now:.0f}"
             )
@@ -221,6 +256,98 @@ class NotificationService:
                 f"User '{user_id}': Error recording notification time for {device_id}/{event_key}: {e}"
             )
 
+    # --- Per-Fetch State Batch ---
+    def begin_state_batch(self, user_id: str) -> bool:
+        """
+        Loads geofences, geofence/battery state and notification times once so
+        that every device check in a fetch works on the same in-memory copies.
+
+        Returns:
+            True if the batch is active (False if loading failed; checks then
+            fall back to per-call loads/saves).
+        """
+        batch = _NotificationStateBatch(user_id)
+        try:
+            batch.geofences = self.uds.load_geofences_config(user_id)
+            batch.geofence_state = self.uds.load_geofence_state(user_id)
+            batch.battery_state = self.uds.load_battery_state(user_id)
+            batch.notification_times = self.uds.load_notification_times(user_id)
+        except Exception as e:
+            log.error(f"User '{user_id}': Failed to load state batch, using per-device I/O: {e}")
+            self._state_batch = None
+            return False
+        self._state_batch = batch
+        return True
+
+    def flush_state_batch(
+        self, user_id: str, valid_device_ids: Optional[Set[str]] = None
+    ) -> bool:
+        """
+        Ends the batch, optionally dropping entries for devices not in
+        valid_device_ids, and saves each changed document exactly once.
+
+        Returns:
+            True if a batch was active for this user (and has been flushed).
+        """
+        batch = self._get_state_batch(user_id)
+        self._state_batch = None
+        if not batch:
+            return False
+
+        if valid_device_ids is not None:  # Same rules as UserDataService.cleanup_user_data_files
+            stale_gf = [k for k in batch.geofence_state if k[0] not in valid_device_ids]
+            for k in stale_gf:
+                del batch.geofence_state[k]
+            stale_batt = [k for k in batch.battery_state if k not in valid_device_ids]
+            for k in stale_batt:
+                del batch.battery_state[k]
+            stale_times = [
+                k
+                for k in batch.notification_times
+                if isinstance(k, tuple) and len(k) > 0 and k[0] not in valid_device_ids
+            ]
+            for k in stale_times:
+                del batch.notification_times[k]
+            if stale_gf:
+                batch.dirty.add("geofence_state")
+            if stale_batt:
+                batch.dirty.add("battery_state")
+            if stale_times:
+                batch.dirty.add("notification_times")
+            if stale_gf or stale_batt or stale_times:
+                log.info(
+                    f"User '{user_id}': Dropped stale state entries (geofence: {len(stale_gf)}, battery: {len(stale_batt)}, times: {len(stale_times)})."
+                )
+
+        savers = {
+            "geofence_state": (self.uds.save_geofence_state, batch.geofence_state),
+            "battery_state": (self.uds.save_battery_state, batch.battery_state),
+            "notification_times": (
+                self.uds.save_notification_times,
+                batch.notification_times,
+            ),
+        }
+        for name in sorted(batch.dirty):
+            save_func, document = savers[name]
+            try:
+                save_func(user_id, document)
+            except Exception as e:
+                log.error(f"User '{user_id}': Failed to flush {name}: {e}")
+        log.debug(
+            f"User '{user_id}': State batch flushed ({', '.join(sorted(batch.dirty)) or 'no changes'})."
+        )
+        return True
+
+    def _get_state_batch(self, user_id: str) -> Optional[_NotificationStateBatch]:
+        batch = self._state_batch
+        return batch if batch and batch.user_id == user_id else None
+
+    def _get_notification_times(self, user_id: str) -> Dict[Tuple[str, str], float]:
+        batch = self._get_state_batch(user_id)
+        if batch:
+            return batch.notification_times
+        return self.uds.load_notification_times(user_id)
+
     # --- Notification Checks (Geofence & Battery) ---
     def check_device_notifications(
         self,
@@ -234,10 +361,16 @@ class NotificationService:
                 f"User '{user_id}', Device '{device_id}': Skipping notification checks, no latest report."
             )
             return
+        batch = self._get_state_batch(user_id)
         try:
-            all_user_geofences = self.uds.load_geofences_config(user_id)
-            current_geofence_state = self.uds.load_geofence_state(user_id)
-            current_battery_state = self.uds.load_battery_state(user_id)
+            if batch:
+                all_user_geofences = batch.geofences
+                current_geofence_state = batch.geofence_state
+                current_battery_state = batch.battery_state
+            else:
+                all_user_geofences = self.uds.load_geofences_config(user_id)
+                current_geofence_state = self.uds.load_geofence_state(user_id)
+                current_battery_state = self.uds.load_battery_state(user_id)
         except Exception as e:
             log.error(
                 f"User '{user_id}', Device '{device_id}': Failed to load state/config for checks: {e}"
@@ -275,6 +408,15 @@ class NotificationService:
                 f"User '{user_id}', Device '{device_id}': Error during battery check: {e}"
             )
 
+        if batch:  # Defer saves to flush_state_batch()
+            if geofence_state_changed:
+                batch.geofence_state = current_geofence_state
+                batch.dirty.add("geofence_state")
+            if battery_state_changed:
+                batch.battery_state = current_battery_state
+                batch.dirty.add("battery_state")
+            return
+
         try:  # Save states if changed
             if geofence_state_changed:
                 self.uds.save_geofence_state(user_id, current_geofence_state)
@@ -591,13 +733,52 @@ class NotificationService:
     ):
         self._save_notification_to_history(user_id, title, body, data_payload)
 
+        if self._digest_events is not None:
+            # Collecting for a digest: history already has the full detail
+            self._digest_events.append(
+                {
+                    "title": title,
+                    "body": body,
+                    "tag": tag,
+                    "data_payload": data_payload,
+                    "device_label": device_label,
+                    "device_color": device_color,
+                    "notification_type": notification_type,
+                }
+            )
+            log.debug(f"User '{user_id}': Added '{title}' to pending digest.")
+            return
+
+        self._queue_push(
+            user_id,
+            title,
+            body,
+            tag=tag,
+            data_payload=data_payload,
+            device_label=device_label,
+            device_color=device_color,
+            notification_type=notification_type,
+        )
+
+    def _queue_push(
+        self,
+        user_id: str,
+        title: str,
+        body: str,
+        tag: Optional[str] = None,
+        data_payload: Optional[Dict] = None,
+        device_label: Optional[str] = None,
+        device_color: Optional[str] = None,
+        notification_type: Optional[str] = None,
+    ):
+        """Builds the push payload and writes it to the outbox for every subscription."""
         if not self.vapid_enabled or not self.vapid_private_key_str:
             log.warning(
                 f"User '{user_id}': VAPID disabled/key missing. Skip push: {title}"
             )
             return
         if not user_id:
-            log.error("send_user_notifications called without user_id.")
+            log.error("_queue_push called without user_id.")
             return
         vapid_claims = self._get_vapid_claims(user_id)
         if not vapid_claims:
@@ -693,46 +874,190 @@ class NotificationService:
             log.error(f"User '{user_id}': Failed payload serialize: {json_err}.")
             return
 
+        queued_ids = self.outbox.enqueue(
+            user_id,
+            list(user_subscriptions.keys()),
+            payload_json,
+            tag=unique_tag,
+            notification_type=notification_type,
+        )
+        log.info(
+            f"User '{user_id}': Queued push (Tag: {unique_tag}, Type: {notification_type or 'general'}) for {len(queued_ids)}/{len(user_subscriptions)} subscribers."
+        )
+
+    # --- Digest / Coalescing ---
+    def begin_digest(self):
+        """Starts collecting push events instead of queueing them one by one."""
+        if self.digest_enabled:
+            self._digest_events = []
+
+    def flush_digest(self, user_id: str):
+        """
+        Ends collection and queues the collected events as a single push
+        (or holds them in the outbox while a digest window is configured).
+        """
+        events = self._digest_events
+        self._digest_events = None
+        if events and self.digest_window_seconds > 0:
+            self.outbox.hold_digest_events(user_id, events)
+            events = self.outbox.take_due_digest(user_id, self.digest_window_seconds)
+        if events:
+            self._queue_digest(user_id, events)
+
+    def flush_due_digest(self, user_id: str, force: bool = False):
+        """Queues held digest events whose window has elapsed."""
+        if self.digest_window_seconds <= 0 and not force:
+            return
+        events = self.outbox.take_due_digest(
+            user_id, self.digest_window_seconds, force=force
+        )
+        if events:
+            self._queue_digest(user_id, events)
+
+    def _queue_digest(self, user_id: str, events: List[Dict[str, Any]]):
+        """Queues one push summarising the given events."""
+        if len(events) == 1:
+            self._queue_push(user_id, **events[0])
+            return
+
+        device_ids = {
+            (e.get("data_payload") or {}).get("deviceId")
+            for e in events
+            if (e.get("data_payload") or {}).get("deviceId")
+        }
+        max_lines = 5
+        lines = [
+            f"{e.get('device_label') or '•'} {e.get('title', '')}"
+            for e in events[:max_lines]
+        ]
+        if len(events) > max_lines:
+            lines.append(f"...and {len(events) - max_lines} more")
+        data_payload = {
+            "type": "digest",
+            "count": len(events),
+            "eventTypes": sorted(
+                {e.get("notification_type") or "general" for e in events}
+            ),
+        }
+        if len(device_ids) == 1:
+            data_payload["deviceId"] = next(iter(device_ids))  # Click focuses the device
         log.info(
-            f"User '{user_id}': Sending push (Tag: {unique_tag}, Type: {notification_type or 'general'}) to {len(user_subscriptions)} subscribers."
+            f"User '{user_id}': Coalescing {len(events)} events into one digest push."
         )
-        failed_endpoints = []
-        success_count = 0
-        current_subs_items = list(user_subscriptions.items())
-        for endpoint, sub_info in current_subs_items:
+        self._queue_push(
+            user_id,
+            title=f"{len(events)} new alerts",
+            body="\n".join(lines),
+            tag=f"digest-{int(time.time() / 60)}",
+            data_payload=data_payload,
+            notification_type="digest",
+        )
+
+    # --- Outbox Delivery ---
+    def _is_permanent_push_failure(self, ex: WebPushException) -> bool:
+        """True if the push service says the subscription is gone/invalid."""
+        if _push_status_code(ex) in [400, 404, 410, 403]:
+            return True
+        ex_text = str(ex)
+        return (
+            "unsubscribe" in ex_text.lower()
+            or "expired" in ex_text.lower()
+            or "InvalidToken" in ex_text
+            or "push service error" in ex_text.lower()
+            or "invalid registration" in ex_text.lower()
+        )
+
+    def deliver_outbox(self, user_id: str) -> Dict[str, int]:
+        """
+        Drains due entries from the user's notification outbox.
+
+        Transient failures are rescheduled with exponential backoff; permanent
+        failures remove the subscription. Safe to call concurrently (only one
+        drain per user runs at a time).
+
+        Returns:
+            A count of delivery outcomes for this run.
+        """
+        summary: Dict[str, int] = {}
+        if not self.vapid_enabled or not self.vapid_private_key_str or not user_id:
+            return summary
+        drain_lock = self.outbox.try_begin_drain(user_id)
+        if not drain_lock:
+            return summary
+        try:
+            due_entries = self.outbox.claim_due(user_id)
+            if not due_entries:
+                return summary
+
+            results: Dict[str, Dict[str, Any]] = {}
+            vapid_claims = self._get_vapid_claims(user_id)
             try:
-                webpush(
-                    subscription_info=sub_info,
-                    data=payload_json,
-                    vapid_private_key=self.vapid_private_key_str,
-                    vapid_claims=vapid_claims,
-                )
-                log.debug(f"User '{user_id}': Sent to {endpoint[:50]}...")
-                success_count += 1
-            except WebPushException as ex:
-                status_code = ex.response.status_code if ex.response else "N/A"
-                log.error(
-                    f"User '{user_id}': WebPush Error {endpoint[:50]}... Status: {status_code}, Msg: {ex}"
-                )
-                if ex.response and status_code in [400, 404, 410, 403]:
-                    failed_endpoints.append(endpoint)
-                elif (
-                    "unsubscribe" in str(ex).lower()
-                    or "expired" in str(ex).lower()
-                    or "InvalidToken" in str(ex)
-                    or "push service error" in str(ex).lower()
-                    or "invalid registration" in str(ex).lower()
-                ):
-                    failed_endpoints.append(endpoint)
+                user_subscriptions = self.uds.load_subscriptions(user_id)
             except Exception as e:
-                log.exception(
-                    f"User '{user_id}': Unexpected error sending to {endpoint[:50]}...: {e}"
+                log.error(f"User '{user_id}': Failed subscription load for outbox: {e}")
+                user_subscriptions = None
+
+            failed_endpoints = []
+            for entry in due_entries:
+                entry_id = entry["id"]
+                endpoint = entry.get("endpoint", "")
+                if not vapid_claims or user_subscriptions is None:
+                    results[entry_id] = {
+                        "outcome": OUTCOME_DEFERRED,
+                        "error": "VAPID claims or subscriptions unavailable",
+                    }
+                    continue
+                sub_info = user_subscriptions.get(endpoint)
+                if not sub_info:
+                    results[entry_id] = {
+                        "outcome": OUTCOME_CANCELLED,
+                        "error": "Subscription no longer exists",
+                    }
+                    continue
+                push_start = time.perf_counter()
+                try:
+                    webpush(
+                        subscription_info=sub_info,
+                        data=entry.get("payload"),
+                        vapid_private_key=self.vapid_private_key_str,
+                        vapid_claims=vapid_claims,
+                    )
+                    log.debug(f"User '{user_id}': Sent to {endpoint[:50]}...")
+                    results[entry_id] = {"outcome": OUTCOME_DELIVERED}
+                except WebPushException as ex:
+                    status_code = _push_status_code(ex)
+                    log.error(
+                        f"User '{user_id}': WebPush Error {endpoint[:50]}... Status: {status_code or 'N/A'}, Attempt: {entry.get('attempts')}, Msg: {ex}"
+                    )
+                    if self._is_permanent_push_failure(ex):
+                        failed_endpoints.append(endpoint)
+                        outcome = OUTCOME_PERMANENT
+                    else:
+                        outcome = OUTCOME_RETRY
+                    results[entry_id] = {
+                        "outcome": outcome,
+                        "status_code": status_code,
+                        "error": str(ex)[:300],
+                    }
+                except Exception as e:
+                    log.exception(
+                        f"User '{user_id}': Unexpected error sending to {endpoint[:50]}...: {e}"
+                    )
+                    results[entry_id] = {"outcome": OUTCOME_RETRY, "error": str(e)[:300]}
+                PUSH_LATENCY.observe(
+                    time.perf_counter() - push_start, outcome=results[entry_id]["outcome"]
                 )
-        log.info(
-            f"User '{user_id}': Push complete. Success: {success_count}/{len(current_subs_items)}. Failures removed: {len(failed_endpoints)}."
-        )
-        if failed_endpoints:
-            self._remove_failed_subscriptions(user_id, failed_endpoints)
+
+            self.outbox.record_results(user_id, results)
+            for result in results.values():
+                summary[result["outcome"]] = summary.get(result["outcome"], 0) + 1
+                PUSH_RESULTS.inc(outcome=result["outcome"])
+            log.info(f"User '{user_id}': Outbox drain complete. Outcomes: {summary}.")
+            if failed_endpoints:
+                self._remove_failed_subscriptions(user_id, failed_endpoints)
+            return summary
+        finally:
+            drain_lock.release()
 
     def send_single_notification(
         self,
@@ -794,6 +1119,8 @@ class NotificationService:
         }
         payload["notification"].update(data_payload.get("notification_options", {}))
         endpoint = subscription_info.get("endpoint", "N/A")
+        push_start = time.perf_counter()
+        push_outcome = "error"
         try:
             payload_json = json.dumps(payload)
             webpush(
@@ -802,31 +1129,27 @@ class NotificationService:
                 vapid_private_key=self.vapid_private_key_str,
                 vapid_claims=vapid_claims,
             )
+            push_outcome = OUTCOME_DELIVERED
             log.info(
                 f"User '{user_id}': Sent single '{title}' (Type: {notification_type}) to {endpoint[:50]}..."
             )
         except WebPushException as ex:
-            status_code = ex.response.status_code if ex.response else "N/A"
+            status_code = _push_status_code(ex)
             log.error(
-                f"User '{user_id}': WebPush Error single {endpoint[:50]}... Status: {status_code}, Msg: {ex}"
+                f"User '{user_id}': WebPush Error single {endpoint[:50]}... Status: {status_code or 'N/A'}, Msg: {ex}"
             )
-            if ex.response and status_code in [400, 404, 410, 403]:
-                self._remove_failed_subscription(user_id, endpoint)
-            elif (
-                "unsubscribe" in str(ex).lower()
-                or "expired" in str(ex).lower()
-                or "InvalidToken" in str(ex)
-                or "push service error" in str(ex).lower()
-                or "invalid registration" in str(ex).lower()
-            ):
+            if self._is_permanent_push_failure(ex):
                 log.warning(
-                    f"User '{user_id}': Sub {endpoint[:50]}... invalid (text) during single send. Removing."
+                    f"User '{user_id}': Sub {endpoint[:50]}... invalid during single send. Removing."
                 )
                 self._remove_failed_subscription(user_id, endpoint)
         except Exception as e:
             log.exception(
                 f"User '{user_id}': Unexpected error sending single notification: {e}"
             )
+        finally:
+            PUSH_LATENCY.observe(time.perf_counter() - push_start, outcome=push_outcome)
+            PUSH_RESULTS.inc(outcome=push_outcome)
 
     def send_welcome_notification(self, user_id: str, subscription_info: Dict):
         log.info(f"User '{user_id}': Sending welcome notification...")
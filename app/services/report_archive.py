@@ -0,0 +1,176 @@
+# app/services/report_archive.py
+# Optional cold storage for raw reports folded into stay records.
+
+import gzip
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Set
+
+from app.utils.json_utils import dumps_bytes, loads
+
+log = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+# Timestamps already archived per segment: path -> ((mtime_ns, size), {timestamp, ...})
+_seen: Dict[str, Tuple[Tuple[int, int], Set[str]]] = {}
+_archive_lock = threading.Lock()  # Fallback when FILE_LOCKS has no history_archive entry
+
+
+class ReportArchive:
+    """
+    Keeps every raw report (before stay compaction) in gzip'd daily JSONL
+    segments: history_archive/<device_id>/YYYY-MM-DD.jsonl.gz.
+
+    Each fetch re-downloads the whole history window, so only reports whose
+    timestamp is not yet in the segment are appended (as a new gzip member).
+    Segments older than HISTORY_ARCHIVE_RETENTION_DAYS (0 = keep forever) are
+    deleted.
+    """
+
+    def __init__(self, config: Dict[str, Any], user_data_service):
+        """
+        Initializes the archive.
+
+        Args:
+            config: The Flask app config dictionary.
+            user_data_service: An instance of UserDataService (used for paths).
+        """
+        self.config = config
+        self.uds = user_data_service
+        self.enabled = bool(config.get("HISTORY_ARCHIVE_ENABLED", False))
+        self.dirname = config.get("USER_HISTORY_ARCHIVE_DIRNAME", "history_archive")
+        self.retention_days = int(config.get("HISTORY_ARCHIVE_RETENTION_DAYS", 90))
+        self.lock = self.uds.file_locks.get(self.dirname) or _archive_lock
+
+    def _get_device_dir(self, user_id: str, device_id: str) -> Optional[Path]:
+        user_dir = self.uds._get_user_data_dir(user_id)
+        if not user_dir or not device_id or "/" in device_id or device_id.startswith("."):
+            return None
+        return user_dir / self.dirname / device_id
+
+    def _segment_timestamps(self, path: Path) -> Set[str]:
+        """Returns the timestamps stored in a segment. Caller holds self.lock."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return set()
+        signature = (st.st_mtime_ns, st.st_size)
+        cached = _seen.get(str(path))
+        if cached and cached[0] == signature:
+            return cached[1]
+        timestamps: Set[str] = set()
+        try:
+            with gzip.open(path, "rb") as f:
+                for line in f:
+                    try:
+                        ts = loads(line).get("timestamp")
+                    except ValueError:
+                        continue
+                    if ts:
+                        timestamps.add(ts)
+        except (OSError, EOFError) as e:
+            # A torn final member (crash mid-append) leaves earlier members readable
+            log.warning(f"Archive segment {path} is partially unreadable: {e}")
+        _seen[str(path)] = (signature, timestamps)
+        return timestamps
+
+    def archive(self, user_id: str, device_id: str, reports: List[Dict[str, Any]]) -> int:
+        """
+        Appends raw reports not yet archived for a device.
+
+        Returns:
+            The number of reports written.
+        """
+        if not self.enabled or not reports:
+            return 0
+        device_dir = self._get_device_dir(user_id, device_id)
+        if not device_dir:
+            return 0
+
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        for report in reports:
+            ts = report.get("timestamp")
+            if ts:
+                by_day.setdefault(ts[:10], []).append(report)
+
+        written = 0
+        with self.lock:
+            device_dir.mkdir(parents=True, exist_ok=True)
+            for day, day_reports in sorted(by_day.items()):
+                path = device_dir / f"{day}{SEGMENT_SUFFIX}"
+                known = self._segment_timestamps(path)
+                new_reports = sorted(
+                    (r for r in day_reports if r["timestamp"] not in known),
+                    key=lambda r: r["timestamp"],
+                )
+                if not new_reports:
+                    continue
+                try:
+                    with gzip.open(path, "ab") as f:
+                        f.write(b"".join(dumps_bytes(r) + b"\n" for r in new_reports))
+                except OSError as e:
+                    log.error(f"User '{user_id}': Failed to archive reports for {device_id} ({path.name}): {e}")
+                    _seen.pop(str(path), None)
+                    continue
+                known.update(r["timestamp"] for r in new_reports)
+                st = os.stat(path)
+                _seen[str(path)] = ((st.st_mtime_ns, st.st_size), known)
+                written += len(new_reports)
+            self._prune_locked(device_dir)
+        if written:
+            log.debug(f"User '{user_id}': Archived {written} raw reports for {device_id}.")
+        return written
+
+    def _prune_locked(self, device_dir: Path):
+        if self.retention_days <= 0:
+            return
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        for path in device_dir.glob(f"*{SEGMENT_SUFFIX}"):
+            if path.name[:10] < cutoff:
+                try:
+                    path.unlink()
+                    _seen.pop(str(path), None)
+                except OSError as e:
+                    log.warning(f"Could not delete expired archive segment {path}: {e}")
+
+    def load(self, user_id: str, device_id: str, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Returns archived raw reports for a device (newest first), optionally since a time."""
+        device_dir = self._get_device_dir(user_id, device_id)
+        if not device_dir or not device_dir.is_dir():
+            return []
+        since_day = since.astimezone(timezone.utc).strftime("%Y-%m-%d") if since else ""
+        since_iso = since.astimezone(timezone.utc).isoformat() if since else ""
+        reports: Dict[str, Dict[str, Any]] = {}
+        for path in sorted(device_dir.glob(f"*{SEGMENT_SUFFIX}")):
+            if path.name[:10] < since_day:
+                continue
+            try:
+                with gzip.open(path, "rb") as f:
+                    for line in f:
+                        try:
+                            report = loads(line)
+                        except ValueError:
+                            continue
+                        ts = report.get("timestamp")
+                        if ts and ts >= since_iso:
+                            reports[ts] = report
+            except (OSError, EOFError) as e:
+                log.warning(f"Archive segment {path} is partially unreadable: {e}")
+        return sorted(reports.values(), key=lambda r: r["timestamp"], reverse=True)
+
+    def delete_device(self, user_id: str, device_id: str):
+        """Removes a device's archived reports."""
+        device_dir = self._get_device_dir(user_id, device_id)
+        if not device_dir or not device_dir.exists():
+            return
+        with self.lock:
+            for path in list(_seen):
+                if path.startswith(str(device_dir) + os.sep):
+                    del _seen[path]
+            shutil.rmtree(device_dir, ignore_errors=True)
+        log.info(f"User '{user_id}': Deleted history archive for device '{device_id}'.")
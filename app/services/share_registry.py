@@ -0,0 +1,367 @@
+# app/services/share_registry.py
+# In-memory share registry (by share_id / by owner) backed write-through by shares.json.
+
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Set
+
+from app.utils.json_utils import save_json_atomic, load_json_file
+
+log = logging.getLogger(__name__)
+
+# Rebuild the expiry heap once stale (superseded/removed) entries dominate it
+# (heap size > 2 * live shares + this)
+HEAP_REBUILD_MIN_STALE = 64
+
+
+def _parse_expiry(expires_at_str: Optional[str]) -> Optional[float]:
+    """
+    Parses a share's ISO expiry into an epoch timestamp.
+
+    Returns None for shares that never expire. Unparseable values map to 0.0
+    so they are treated as expired (matching the previous scan-based checks).
+    """
+    if not expires_at_str:
+        return None
+    try:
+        expires_at_dt = datetime.fromisoformat(str(expires_at_str).replace("Z", "+00:00"))
+        if expires_at_dt.tzinfo is None:
+            expires_at_dt = expires_at_dt.replace(tzinfo=timezone.utc)
+        return expires_at_dt.timestamp()
+    except (ValueError, TypeError):
+        log.warning(f"Invalid share expiry format '{expires_at_str}'. Treating as expired.")
+        return 0.0
+
+
+class _ShareIndex:
+    """In-memory state mirrored from shares.json."""
+
+    def __init__(self):
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_owner: Dict[str, Set[str]] = {}
+        self.expiry: Dict[str, Optional[float]] = {}  # share_id -> epoch (None = never)
+        self.heap: List[Tuple[float, str]] = []  # (expiry epoch, share_id), lazily invalidated
+        self.signature: Optional[Tuple[int, int]] = None  # (mtime_ns, size) of shares.json
+        self.lock = threading.Lock()  # Guards reloads of this index
+
+
+# Registries are shared across (short-lived) service instances, keyed by shares file path
+_indexes: Dict[str, _ShareIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+class ShareRegistry:
+    """
+    Keeps every share in memory, indexed by share_id and by owner, with expiries
+    pre-parsed into a min-heap. Mutations update the indexes incrementally and are
+    persisted write-through to shares.json (same file format as before).
+
+    The on-disk file stays the source of truth: if its (mtime, size) signature no
+    longer matches what the registry last read or wrote, the index is rebuilt.
+    """
+
+    def __init__(self, config: Dict[str, Any], user_data_service):
+        """
+        Initializes the registry.
+
+        Args:
+            config: The Flask app config dictionary.
+            user_data_service: An instance of UserDataService (used for paths and locks).
+        """
+        self.config = config
+        self.uds = user_data_service
+        self.file_lock = user_data_service.file_locks.get("shares")
+        self.path: Path = user_data_service.data_dir / Path(config["SHARES_FILE"]).name
+        key = str(self.path)
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = _ShareIndex()
+                _indexes[key] = index
+        self._index = index
+
+    # --- Internal: Loading / Persistence ---
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            log.error(f"Could not stat shares file {self.path}: {e}")
+            return None
+
+    def _rebuild(self, shares_data: Dict[str, Dict[str, Any]]):
+        """
+        Replaces the index contents. Caller holds the index lock.
+
+        The new tables are built aside and swapped in at the end: readers do not
+        take the index lock, so they must never see half-filled dicts.
+        """
+        fresh = _ShareIndex()
+        for share_id, share_data in shares_data.items():
+            if isinstance(share_data, dict):
+                self._index_share(share_id, share_data, fresh)
+        heapq.heapify(fresh.heap)
+        index = self._index
+        index.by_id, index.by_owner, index.expiry, index.heap = (
+            fresh.by_id,
+            fresh.by_owner,
+            fresh.expiry,
+            fresh.heap,
+        )
+
+    def _index_share(self, share_id: str, share_data: Dict[str, Any], index: Optional[_ShareIndex] = None):
+        """Adds/replaces one share in all indexes (default: the live ones). Caller holds the index lock."""
+        index = index or self._index
+        previous = index.by_id.get(share_id)
+        if previous is not None:
+            old_owner = previous.get("user_id")
+            if old_owner != share_data.get("user_id"):
+                owned = index.by_owner.get(old_owner)
+                if owned is not None:
+                    owned.discard(share_id)
+                    if not owned:
+                        del index.by_owner[old_owner]
+        index.by_id[share_id] = share_data
+        index.by_owner.setdefault(share_data.get("user_id"), set()).add(share_id)
+        expires_ts = _parse_expiry(share_data.get("expires_at"))
+        if index.expiry.get(share_id, -1) != expires_ts:
+            index.expiry[share_id] = expires_ts
+            if expires_ts is not None:
+                heapq.heappush(index.heap, (expires_ts, share_id))
+
+    def _unindex_share(self, share_id: str) -> Optional[Dict[str, Any]]:
+        """Removes one share from the indexes (heap entries go stale). Caller holds the lock."""
+        index = self._index
+        share_data = index.by_id.pop(share_id, None)
+        if share_data is None:
+            return None
+        index.expiry.pop(share_id, None)
+        owner = share_data.get("user_id")
+        owned = index.by_owner.get(owner)
+        if owned is not None:
+            owned.discard(share_id)
+            if not owned:
+                del index.by_owner[owner]
+        return share_data
+
+    def _load_locked(self):
+        """Re-reads shares.json if it changed on disk. Caller holds the index + file locks."""
+        signature = self._file_signature()
+        if signature is not None and signature == self._index.signature:
+            return
+        if signature is None:
+            # Same behaviour as the old load_shares: create an empty file on first use
+            log.warning(f"Shares file {self.path} not found. Creating empty file.")
+            self._rebuild({})
+            self._persist_locked()
+            return
+        shares_data = load_json_file(self.path, threading.Lock())  # File lock already held
+        if not isinstance(shares_data, dict):
+            log.error("shares.json missing or format invalid. Using empty share registry.")
+            shares_data = {}
+        self._rebuild(shares_data)
+        self._index.signature = signature
+        log.debug(f"Share registry loaded {len(self._index.by_id)} shares from {self.path.name}.")
+
+    def _persist_locked(self):
+        """Writes the registry back to shares.json. Caller holds the index + file locks."""
+        index = self._index
+        try:
+            save_json_atomic(self.path, index.by_id, threading.Lock(), indent=None)
+        except Exception as e:
+            # Memory may now differ from disk; force a reload on next access
+            index.signature = None
+            log.error(f"Failed to save shares data: {e}")
+            raise
+        index.signature = self._file_signature()
+        log.info(f"Saved {len(index.by_id)} shares to {self.path.name}")
+
+    def _ensure_loaded(self):
+        """Cheap freshness check for readers: one stat(), reload only on change."""
+        signature = self._file_signature()
+        if signature is not None and signature == self._index.signature:
+            return
+        if not self.file_lock:
+            log.error("Lock for 'shares.json' not found.")
+            return
+        with self._index.lock, self.file_lock:
+            self._load_locked()
+
+    def _mutate(self):
+        """Context manager for write-through mutations (index + file lock, fresh index)."""
+        return _MutationContext(self)
+
+    # --- Reads ---
+
+    def get(self, share_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a copy of one share record, or None."""
+        self._ensure_loaded()
+        share_data = self._index.by_id.get(share_id)
+        return dict(share_data) if share_data is not None else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Returns a copy of every share keyed by share_id (old load_shares shape)."""
+        self._ensure_loaded()
+        with self._index.lock:
+            return {sid: dict(sdata) for sid, sdata in self._index.by_id.items()}
+
+    def owner_shares(self, user_id: str) -> List[Tuple[Dict[str, Any], Optional[float]]]:
+        """Returns (share copy, expiry epoch) pairs for one owner."""
+        self._ensure_loaded()
+        with self._index.lock:
+            index = self._index
+            return [
+                (dict(index.by_id[sid], share_id=sid), index.expiry.get(sid))
+                for sid in index.by_owner.get(user_id, ())
+                if sid in index.by_id
+            ]
+
+    def expiry_of(self, share_id: str) -> Optional[float]:
+        """Returns the pre-parsed expiry epoch of a share (None = never expires)."""
+        self._ensure_loaded()
+        return self._index.expiry.get(share_id)
+
+    def is_live(self, share_id: str, now_ts: Optional[float] = None) -> bool:
+        """True if the share exists, is active and has not expired."""
+        self._ensure_loaded()
+        share_data = self._index.by_id.get(share_id)
+        if not share_data or not share_data.get("active", False):
+            return False
+        expires_ts = self._index.expiry.get(share_id)
+        if now_ts is None:
+            now_ts = datetime.now(timezone.utc).timestamp()
+        return expires_ts is None or expires_ts >= now_ts
+
+    # --- Writes (write-through) ---
+
+    def put(self, share_data: Dict[str, Any]):
+        """Adds or replaces a share record."""
+        share_id = share_data["share_id"]
+        with self._mutate():
+            self._index_share(share_id, dict(share_data))
+            self._persist_locked()
+
+    def update(
+        self, share_id: str, changes: Dict[str, Any], owner_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Applies field changes to a share.
+
+        Args:
+            share_id: The share to update.
+            changes: Fields to set on the record.
+            owner_id: If given, the update only happens when the share belongs to this user.
+
+        Returns:
+            A copy of the updated record, or None if not found / not owned.
+        """
+        with self._mutate():
+            current = self._index.by_id.get(share_id)
+            if current is None:
+                return None
+            if owner_id is not None and current.get("user_id") != owner_id:
+                return None
+            updated = dict(current)
+            updated.update(changes)
+            if updated != current:
+                self._index_share(share_id, updated)
+                self._persist_locked()
+            return dict(updated)
+
+    def remove(self, share_id: str, owner_id: Optional[str] = None) -> bool:
+        """Deletes a share (optionally only if owned by owner_id). Returns True if removed."""
+        with self._mutate():
+            current = self._index.by_id.get(share_id)
+            if current is None:
+                return False
+            if owner_id is not None and current.get("user_id") != owner_id:
+                return False
+            self._unindex_share(share_id)
+            self._persist_locked()
+            return True
+
+    def remove_owner(self, user_id: str) -> int:
+        """Deletes every share owned by user_id. Returns the number removed."""
+        with self._mutate():
+            share_ids = list(self._index.by_owner.get(user_id, ()))
+            for share_id in share_ids:
+                self._unindex_share(share_id)
+            if share_ids:
+                self._persist_locked()
+            return len(share_ids)
+
+    def replace_all(self, shares_data: Dict[str, Dict[str, Any]]):
+        """Replaces the whole registry (old save_shares semantics)."""
+        with self._mutate():
+            self._rebuild({sid: dict(sdata) for sid, sdata in shares_data.items()})
+            self._persist_locked()
+
+    def prune_expired(self, now_ts: Optional[float] = None) -> List[str]:
+        """
+        Removes shares whose expiry has passed by popping the expiry heap.
+
+        Only shares that are actually due are touched; when nothing is due this
+        is a single heap peek (plus the freshness stat()).
+
+        Returns:
+            The list of removed share IDs.
+        """
+        if now_ts is None:
+            now_ts = datetime.now(timezone.utc).timestamp()
+        self._ensure_loaded()
+        heap = self._index.heap
+        if not heap or heap[0][0] >= now_ts:
+            return []
+        removed: List[str] = []
+        with self._mutate():
+            index = self._index
+            heap = index.heap
+            while heap and heap[0][0] < now_ts:
+                expires_ts, share_id = heapq.heappop(heap)
+                if index.expiry.get(share_id) != expires_ts:
+                    continue  # Stale heap entry (expiry changed or share removed)
+                log.debug(f"Pruning expired share '{share_id}'")
+                self._unindex_share(share_id)
+                removed.append(share_id)
+            if len(heap) > 2 * len(index.by_id) + HEAP_REBUILD_MIN_STALE:
+                fresh_heap = [(v, sid) for sid, v in index.expiry.items() if v is not None]
+                heapq.heapify(fresh_heap)
+                index.heap = fresh_heap
+            if removed:
+                self._persist_locked()
+        return removed
+
+
+class _MutationContext:
+    """Holds the index + shares file lock and makes sure the index is fresh."""
+
+    def __init__(self, registry: ShareRegistry):
+        self.registry = registry
+
+    def __enter__(self):
+        if not self.registry.file_lock:
+            raise RuntimeError("Share lock missing.")
+        self.registry._index.lock.acquire()
+        try:
+            self.registry.file_lock.acquire()
+        except BaseException:
+            self.registry._index.lock.release()
+            raise
+        try:
+            self.registry._load_locked()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self.registry
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.file_lock.release()
+        self.registry._index.lock.release()
+        return False
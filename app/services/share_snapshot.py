@@ -0,0 +1,261 @@
+# app/services/share_snapshot.py
+# Precomputed latest-position snapshots for public share links.
+
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+
+from app.utils.helpers import getDefaultColorForId
+from app.utils.data_formatting import _parse_battery_info
+from app.utils.json_utils import dumps_bytes
+from app.utils.compression import PrecompressedBody
+
+log = logging.getLogger(__name__)
+
+# Distinct share notes for one device are few; bound the per-snapshot body cache anyway
+MAX_BODIES_PER_SNAPSHOT = 16
+
+# (mtime_ns, size) of the owner's cache.json and devices.json the snapshot was built from
+_Signature = Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]]]
+
+
+class ShareSnapshotUnavailable(Exception):
+    """Raised when a shared device has no servable location data yet (maps to 503)."""
+
+    def __init__(self, description: str):
+        super().__init__(description)
+        self.description = description
+
+
+class _DeviceSnapshot:
+    """Public payload for one shared device, minus the per-share note."""
+
+    def __init__(
+        self,
+        payload: Optional[Dict[str, Any]],
+        signature: _Signature,
+        last_updated: Optional[str] = None,
+        unavailable: Optional[str] = None,
+    ):
+        self.payload = payload
+        self.signature = signature
+        self.last_updated = last_updated
+        self.unavailable = unavailable  # Cached 503 description (negative entry)
+        self.bodies: Dict[str, PrecompressedBody] = {}  # share note -> serialized response
+
+
+# Snapshots are shared across (short-lived) service instances, keyed by (owner_id, device_id)
+_snapshots: Dict[Tuple[str, str], _DeviceSnapshot] = {}
+_snapshots_lock = threading.Lock()
+# One rebuild at a time per owner, so a burst of viewers doesn't parse cache.json N times
+_rebuild_locks: Dict[str, threading.Lock] = {}
+
+
+class ShareSnapshotService:
+    """
+    Serves public share data from an in-memory snapshot of the shared device's
+    latest report, instead of parsing the owner's full cache.json per hit.
+
+    Snapshots are rebuilt when the owner's fetch completes (refresh_owner) and,
+    as a fallback, whenever cache.json or devices.json changed on disk since the
+    snapshot was built (one stat() each per hit).
+    """
+
+    def __init__(self, config: Dict[str, Any], user_data_service):
+        """
+        Initializes the service.
+
+        Args:
+            config: The Flask app config dictionary.
+            user_data_service: An instance of UserDataService.
+        """
+        self.config = config
+        self.uds = user_data_service
+
+    # --- Internal Helpers ---
+
+    def _stat_signature(self, path: Optional[Path]) -> Optional[Tuple[int, int]]:
+        if not path:
+            return None
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _current_signature(self, owner_id: str) -> _Signature:
+        cache_file = self.uds._get_user_file_path(owner_id, self.config["USER_CACHE_FILENAME"])
+        devices_file = self.uds._get_user_file_path(owner_id, self.config["USER_DEVICES_FILENAME"])
+        return (self._stat_signature(cache_file), self._stat_signature(devices_file))
+
+    def _build(
+        self,
+        owner_id: str,
+        device_id: str,
+        owner_cache: Optional[Dict[str, Any]],
+        owner_devices_config: Dict[str, Dict[str, Any]],
+        signature: _Signature,
+    ) -> _DeviceSnapshot:
+        """Builds the public payload for one device from already-loaded owner data."""
+        if (
+            not owner_cache
+            or "data" not in owner_cache
+            or not isinstance(owner_cache["data"], dict)
+        ):
+            log.warning(f"Share snapshot: Cache for owner '{owner_id}' not available.")
+            return _DeviceSnapshot(
+                None, signature,
+                unavailable="Device location data is temporarily unavailable.",
+            )
+
+        device_data_from_cache = owner_cache["data"].get(device_id)
+        if not device_data_from_cache:
+            log.warning(
+                f"Share snapshot: No data structure found for device '{device_id}' in owner '{owner_id}' cache. Might be syncing."
+            )
+            return _DeviceSnapshot(
+                None, signature,
+                unavailable="Device data not yet available. Please try again shortly.",
+            )
+
+        reports_list = device_data_from_cache.get("reports", [])
+        latest_report = reports_list[0] if reports_list else None
+
+        device_config = owner_devices_config.get(device_id, {})
+        device_name = device_config.get("name", device_id) or device_id
+        device_label = device_config.get("label", "❓") or "❓"
+        device_color_hex = device_config.get("color")
+        final_device_color = (
+            device_color_hex if device_color_hex else getDefaultColorForId(device_id)
+        )
+
+        battery_level, battery_status = _parse_battery_info(
+            latest_report.get("battery") if latest_report else None,
+            latest_report.get("status") if latest_report else None,
+            self.config.get("LOW_BATTERY_THRESHOLD", 15),
+        )
+
+        payload = {
+            "device_name": device_name,
+            "device_label": device_label,
+            "device_color": final_device_color,
+            "lat": latest_report.get("lat") if latest_report else None,
+            "lng": latest_report.get("lon") if latest_report else None,
+            "timestamp": latest_report.get("timestamp") if latest_report else None,
+            "battery_level": battery_level,
+            "battery_status": battery_status,
+            "last_updated": owner_cache.get("timestamp"),
+        }
+        return _DeviceSnapshot(payload, signature, last_updated=owner_cache.get("timestamp"))
+
+    # --- Public API ---
+
+    def get_device_snapshot(self, owner_id: str, device_id: str) -> _DeviceSnapshot:
+        """
+        Returns the snapshot for a shared device, rebuilding it from disk only if
+        the owner's cache/devices files changed since it was built.
+
+        Raises:
+            ShareSnapshotUnavailable: If no location data can be served yet.
+        """
+        key = (owner_id, device_id)
+        signature = self._current_signature(owner_id)
+        snapshot = _snapshots.get(key)
+        if snapshot is None or snapshot.signature != signature:
+            with _snapshots_lock:
+                rebuild_lock = _rebuild_locks.setdefault(owner_id, threading.Lock())
+            with rebuild_lock:
+                snapshot = _snapshots.get(key)  # Another viewer may have rebuilt it meanwhile
+                if snapshot is None or snapshot.signature != signature:
+                    log.debug(f"Share snapshot miss for owner '{owner_id}', device '{device_id}'. Rebuilding.")
+                    snapshot = self._build(
+                        owner_id,
+                        device_id,
+                        self.uds.load_cache_from_file(owner_id),
+                        self.uds.load_devices_config(owner_id),
+                        signature,
+                    )
+                    with _snapshots_lock:
+                        _snapshots[key] = snapshot
+        if snapshot.unavailable:
+            raise ShareSnapshotUnavailable(snapshot.unavailable)
+        return snapshot
+
+    def peek_device_snapshot(self, owner_id: str, device_id: str) -> Optional[_DeviceSnapshot]:
+        """
+        Returns the in-memory snapshot as-is (possibly stale), without touching disk.
+        Used to shed load when a share is over its rate limit.
+        """
+        snapshot = _snapshots.get((owner_id, device_id))
+        if snapshot is None or snapshot.unavailable:
+            return None
+        return snapshot
+
+    def refresh_owner(self, owner_id: str, owner_cache: Optional[Dict[str, Any]] = None):
+        """
+        Rebuilds snapshots for every device the owner currently shares. Called when
+        the owner's fetch completes, so public viewers never pay for the parse.
+
+        Args:
+            owner_id: The owner whose cache was just written.
+            owner_cache: The cache data just saved (avoids re-reading cache.json).
+        """
+        shared_device_ids = self.uds.get_active_shared_device_ids_for_user(owner_id)
+        with _snapshots_lock:
+            for key in [k for k in _snapshots if k[0] == owner_id and k[1] not in shared_device_ids]:
+                del _snapshots[key]  # Drop snapshots of devices no longer shared
+        if not shared_device_ids:
+            return
+        signature = self._current_signature(owner_id)
+        if owner_cache is None:
+            owner_cache = self.uds.load_cache_from_file(owner_id)
+        owner_devices_config = self.uds.load_devices_config(owner_id)
+        built = {
+            (owner_id, device_id): self._build(
+                owner_id, device_id, owner_cache, owner_devices_config, signature
+            )
+            for device_id in shared_device_ids
+        }
+        with _snapshots_lock:
+            _snapshots.update(built)
+        log.debug(f"Refreshed {len(built)} share snapshot(s) for owner '{owner_id}'.")
+
+    def response_body(self, snapshot: _DeviceSnapshot, share_note: str) -> PrecompressedBody:
+        """
+        Returns the serialized public response (device snapshot + share note).
+        Bodies are kept on the snapshot, so JSON encoding and gzip/br compression
+        happen once per snapshot rather than once per viewer.
+        """
+        body = snapshot.bodies.get(share_note)
+        if body is None:
+            payload = {**snapshot.payload, "share_note": share_note}
+            body = PrecompressedBody(dumps_bytes(payload, sort_keys=True) + b"\n")
+            if len(snapshot.bodies) >= MAX_BODIES_PER_SNAPSHOT:
+                snapshot.bodies.clear()
+            snapshot.bodies[share_note] = body
+        return body
+
+    def max_age_for(self, snapshot: _DeviceSnapshot, expires_at_ts: Optional[float]) -> int:
+        """
+        Seconds clients may reuse the response: until the owner's next scheduled
+        fetch, never past the share's expiry.
+        """
+        interval_seconds = max(60, int(self.config.get("FETCH_INTERVAL_MINUTES", 15)) * 60)
+        floor_seconds = int(self.config.get("PUBLIC_SHARE_MIN_MAX_AGE_SECONDS", 15))
+        now_ts = datetime.now(timezone.utc).timestamp()
+        max_age = floor_seconds
+        if snapshot.last_updated:
+            try:
+                last_dt = datetime.fromisoformat(str(snapshot.last_updated).replace("Z", "+00:00"))
+                if last_dt.tzinfo is None:
+                    last_dt = last_dt.replace(tzinfo=timezone.utc)
+                next_fetch_ts = last_dt.timestamp() + interval_seconds
+                max_age = int(min(interval_seconds, max(floor_seconds, next_fetch_ts - now_ts)))
+            except ValueError:
+                pass
+        if expires_at_ts is not None:
+            max_age = min(max_age, max(0, int(expires_at_ts - now_ts)))
+        return max_age
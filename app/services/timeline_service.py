@@ -0,0 +1,294 @@
+# app/services/timeline_service.py
+# Per-device trip/stay timelines, updated incrementally after each fetch.
+
+import logging
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+
+from app.utils.json_utils import load_json_file, save_json_atomic
+from app.utils.trajectory import haversine_m
+
+log = logging.getLogger(__name__)
+
+TIMELINE_VERSION = 1
+
+
+def _parse_ts(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    except (ValueError, TypeError):
+        return None
+
+
+class _Point:
+    """A located report (or stay record) on the time axis."""
+
+    __slots__ = ("start", "end", "lat", "lon", "count")
+
+    def __init__(self, start: datetime, end: datetime, lat: float, lon: float, count: int = 1):
+        self.start = start
+        self.end = end
+        self.lat = lat
+        self.lon = lon
+        self.count = count  # Reports represented (stay records stand for several)
+
+
+class TimelineService:
+    """
+    Turns each device's report stream into alternating stays and trips.
+
+    Timelines are stored in the user's timeline.json as
+    {device_id: {"v", "segments": [...], "places": [...], "updated_at"}}.
+    Every segment but the last is final; an update re-segments only from the
+    start of the last (open) segment, so a fetch costs work proportional to
+    the new reports. Segments outlive the fetched history window and are kept
+    for TIMELINE_RETENTION_DAYS.
+
+    Segment shapes:
+        stay: {type, start, end, duration_s, lat, lon, count}
+        trip: {type, start, end, duration_s, distance_m, max_speed_mps,
+               avg_speed_mps, from: {lat, lon}, to: {lat, lon}, count}
+    """
+
+    def __init__(self, config: Dict[str, Any], user_data_service):
+        """
+        Initializes the service.
+
+        Args:
+            config: The Flask app config dictionary.
+            user_data_service: An instance of UserDataService.
+        """
+        self.config = config
+        self.uds = user_data_service
+        self.filename = config.get("USER_TIMELINE_FILENAME", "timeline.json")
+        self.lock = self.uds.file_locks.get(self.filename)
+        self.stay_radius_m = float(config.get("TIMELINE_STAY_RADIUS_M", 75))
+        self.min_stay = timedelta(minutes=int(config.get("TIMELINE_MIN_STAY_MINUTES", 10)))
+        self.min_trip_distance_m = float(config.get("TIMELINE_MIN_TRIP_DISTANCE_M", 200))
+        self.place_radius_m = float(config.get("TIMELINE_PLACE_RADIUS_M", 150))
+        self.retention_days = int(config.get("TIMELINE_RETENTION_DAYS", 30))
+
+    # --- Segmentation ---
+
+    def _points_from_reports(self, reports: List[Dict[str, Any]]) -> List[_Point]:
+        """Chronological points from newest-first reports (stay records span first/last seen)."""
+        points: List[_Point] = []
+        for report in reversed(reports):
+            if report.get("lat") is None or report.get("lon") is None:
+                continue
+            end = _parse_ts(report.get("timestamp"))
+            if end is None:
+                continue
+            stay = report.get("stay") if isinstance(report.get("stay"), dict) else None
+            start = (_parse_ts(stay.get("first_seen")) if stay else None) or end
+            count = int(stay.get("count", 1)) if stay else 1
+            # Stays are placed at their centroid (the record itself carries the newest fix)
+            lat = stay.get("lat", report["lat"]) if stay else report["lat"]
+            lon = stay.get("lon", report["lon"]) if stay else report["lon"]
+            points.append(_Point(start, end, float(lat), float(lon), count))
+        points.sort(key=lambda p: p.end)
+        return points
+
+    def _stay_segment(self, run: List[_Point]) -> Dict[str, Any]:
+        start, end = run[0].start, run[-1].end
+        return {
+            "type": "stay",
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "duration_s": int((end - start).total_seconds()),
+            "lat": round(sum(p.lat for p in run) / len(run), 6),
+            "lon": round(sum(p.lon for p in run) / len(run), 6),
+            "count": sum(p.count for p in run),
+        }
+
+    def _trip_segment(self, path: List[_Point]) -> Dict[str, Any]:
+        distance = 0.0
+        max_speed = 0.0
+        for a, b in zip(path, path[1:]):
+            leg = haversine_m(a.lat, a.lon, b.lat, b.lon)
+            distance += leg
+            seconds = (b.start - a.end).total_seconds()
+            if seconds >= 60:  # Shorter gaps turn position noise into absurd speeds
+                max_speed = max(max_speed, leg / seconds)
+        start, end = path[0].end, path[-1].start
+        duration = max(0.0, (end - start).total_seconds())
+        return {
+            "type": "trip",
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "duration_s": int(duration),
+            "distance_m": round(distance, 1),
+            "max_speed_mps": round(max_speed, 2),
+            "avg_speed_mps": round(distance / duration, 2) if duration > 0 else 0.0,
+            "from": {"lat": round(path[0].lat, 6), "lon": round(path[0].lon, 6)},
+            "to": {"lat": round(path[-1].lat, 6), "lon": round(path[-1].lon, 6)},
+            "count": len(path),  # Points, including the anchoring stay ends
+        }
+
+    def segment_points(self, points: List[_Point]) -> List[Dict[str, Any]]:
+        """
+        Splits chronological points into stays and trips.
+
+        A stay is a run of points within TIMELINE_STAY_RADIUS_M of its first point
+        lasting at least TIMELINE_MIN_STAY_MINUTES. Movement between stays becomes
+        a trip if it covers TIMELINE_MIN_TRIP_DISTANCE_M; shorter wandering is
+        folded into the surrounding stays.
+        """
+        segments: List[Dict[str, Any]] = []
+        stays: List[Tuple[int, int]] = []  # Inclusive point ranges
+        i = 0
+        while i < len(points):
+            anchor = points[i]
+            j = i
+            while j + 1 < len(points) and haversine_m(anchor.lat, anchor.lon, points[j + 1].lat, points[j + 1].lon) <= self.stay_radius_m:
+                j += 1
+            if points[j].end - anchor.start >= self.min_stay:
+                stays.append((i, j))
+                i = j + 1
+            else:
+                i += 1
+
+        previous_end = -1  # Index of the last point of the previous stay
+        for first, last in stays:
+            if previous_end >= 0:
+                path = points[previous_end:first + 1]  # Boundary points anchor the trip ends
+                trip = self._trip_segment(path)
+                if trip["distance_m"] >= self.min_trip_distance_m:
+                    segments.append(trip)
+                elif segments and segments[-1]["type"] == "stay":
+                    # Short wander: merge with the previous stay
+                    merged = points[self._stay_first_index(segments[-1], points):last + 1]
+                    segments[-1] = self._stay_segment(merged)
+                    previous_end = last
+                    continue
+            segments.append(self._stay_segment(points[first:last + 1]))
+            previous_end = last
+
+        if previous_end >= 0 and previous_end < len(points) - 1:
+            trip = self._trip_segment(points[previous_end:])
+            if trip["distance_m"] >= self.min_trip_distance_m:
+                segments.append(trip)  # Still moving (open trip)
+        elif previous_end < 0 and len(points) > 1:
+            trip = self._trip_segment(points)
+            if trip["distance_m"] >= self.min_trip_distance_m:
+                segments.append(trip)
+        return segments
+
+    def _stay_first_index(self, stay: Dict[str, Any], points: List[_Point]) -> int:
+        start = _parse_ts(stay["start"])
+        for index, point in enumerate(points):
+            if point.start >= start:
+                return index
+        return 0
+
+    def _places(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Groups stays at the same location into dwell places (most total dwell first)."""
+        places: List[Dict[str, Any]] = []
+        for segment in segments:
+            if segment["type"] != "stay":
+                continue
+            for place in places:
+                if haversine_m(place["lat"], place["lon"], segment["lat"], segment["lon"]) <= self.place_radius_m:
+                    place["visits"] += 1
+                    place["total_dwell_s"] += segment["duration_s"]
+                    place["last_visit"] = max(place["last_visit"], segment["end"])
+                    break
+            else:
+                places.append({
+                    "lat": segment["lat"],
+                    "lon": segment["lon"],
+                    "visits": 1,
+                    "total_dwell_s": segment["duration_s"],
+                    "last_visit": segment["end"],
+                })
+        places.sort(key=lambda p: p["total_dwell_s"], reverse=True)
+        return places
+
+    # --- Incremental Update ---
+
+    def _update_device(self, existing: Optional[Dict[str, Any]], reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+        segments = list(existing.get("segments", [])) if isinstance(existing, dict) else []
+        # Reopen the last segment, plus the stay an open trip departed from (its end anchors the trip)
+        reopened: List[Dict[str, Any]] = [segments.pop()] if segments else []
+        if reopened and reopened[0]["type"] == "trip" and segments and segments[-1]["type"] == "stay":
+            reopened.insert(0, segments.pop())
+        open_segment = reopened[0] if reopened else None
+        resume_from = _parse_ts(open_segment["start"]) if open_segment else None
+
+        points = self._points_from_reports(reports)
+        if resume_from is not None:
+            points = [p for p in points if p.end >= resume_from]
+        new_segments = self.segment_points(points)
+
+        if reopened and not new_segments:
+            new_segments = reopened  # Nothing new (device silent); keep them as they were
+        elif (
+            open_segment
+            and open_segment["type"] == "stay"
+            and new_segments[0]["type"] == "stay"
+            and open_segment["start"] < new_segments[0]["start"]
+            and haversine_m(open_segment["lat"], open_segment["lon"], new_segments[0]["lat"], new_segments[0]["lon"]) <= self.stay_radius_m
+        ):
+            # The stay began before the fetched history window; keep its original start
+            first = dict(new_segments[0])
+            first["start"] = open_segment["start"]
+            first["duration_s"] = int((_parse_ts(first["end"]) - _parse_ts(first["start"])).total_seconds())
+            first["count"] = max(first["count"], open_segment.get("count", 0))
+            new_segments[0] = first
+
+        segments.extend(new_segments)
+        if self.retention_days > 0:
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).isoformat()
+            segments = [s for s in segments if s["end"] >= cutoff]
+        return {
+            "v": TIMELINE_VERSION,
+            "segments": segments,
+            "places": self._places(segments),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def update_from_fetch(self, user_id: str, fetched_data: Dict[str, Dict[str, Any]]):
+        """
+        Extends every device's timeline with the reports of a fetch and drops
+        timelines of devices that no longer exist.
+
+        Args:
+            user_id: The user whose data was fetched.
+            fetched_data: The fetch result ({device_id: {"config", "reports", ...}}).
+        """
+        path = self.uds._get_user_file_path(user_id, self.filename)
+        if not path or not self.lock:
+            log.error(f"User '{user_id}': Path or lock not found for {self.filename}.")
+            return
+        with self.lock:
+            stored = load_json_file(path, threading.Lock())  # Outer lock held
+            stored = stored if isinstance(stored, dict) else {}
+            timelines = {}
+            for device_id, device_data in fetched_data.items():
+                existing = stored.get(device_id)
+                if isinstance(existing, dict) and existing.get("v") != TIMELINE_VERSION:
+                    existing = None
+                timelines[device_id] = self._update_device(existing, device_data.get("reports", []))
+            save_json_atomic(path, timelines, threading.Lock(), indent=None)  # Logs its own failures
+
+    # --- Reads ---
+
+    def get_device_timeline(self, user_id: str, device_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns a device's stored timeline. Devices without one yet (e.g. right
+        after an upgrade) get a timeline computed from the cached reports.
+        """
+        path = self.uds._get_user_file_path(user_id, self.filename)
+        if path and self.lock:
+            stored = load_json_file(path, self.lock)
+            if isinstance(stored, dict) and isinstance(stored.get(device_id), dict):
+                return stored[device_id]
+        user_cache = self.uds.load_cache_from_file(user_id)
+        device_data = ((user_cache or {}).get("data") or {}).get(device_id)
+        if not isinstance(device_data, dict):
+            return None
+        return self._update_device(None, device_data.get("reports", []))
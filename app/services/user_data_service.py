@@ -1,6 +1,5 @@
 # app/services/user_data_service.py
 import os
-import json
 import logging
 import threading
 import shutil
@@ -14,6 +13,10 @@ from findmy.reports import AppleAccount # Import AppleAccount
 
 
 from app.utils.json_utils import load_json_file, save_json_atomic
+from app.services.notification_history_log import NotificationHistoryLog
+from app.services.report_archive import ReportArchive
+from app.services.share_registry import ShareRegistry
+from app.services.user_directory import UserDirectory
 from app.utils.helpers import (
     encrypt_password,
     decrypt_password,
@@ -42,6 +45,10 @@ class UserDataService:
         self.data_dir = Path(config["DATA_DIRECTORY"])
         self.users_file = Path(config["USERS_FILE"])
         self.file_locks = config["FILE_LOCKS"]  # Use locks from config
+        self.history_log = NotificationHistoryLog(config, self)
+        self.report_archive = ReportArchive(config, self)
+        self.share_registry = ShareRegistry(config, self)
+        self.user_directory = UserDirectory(self.users_file, self.file_locks.get("users"))
 
         # Ensure base data directory exists
         self.data_dir.mkdir(parents=True, exist_ok=True)
@@ -87,24 +94,16 @@ class UserDataService:
     # --- Global User Management (users.json) ---
 
     def load_users(self) -> Dict[str, Dict[str, Any]]:
-        """Loads the main user database (users.json)."""
-        users_lock = self.file_locks.get("users")
-        if not users_lock:
-            log.error("Lock for 'users.json' not found in configuration.")
-            return {}
-
-        users_data = load_json_file(self.users_file, users_lock)
+        """
+        Returns a copy of the main user database (users.json).
 
-        if users_data is None:
-            return {}
-        elif not isinstance(users_data, dict):
-            log.error(
-                f"{self.users_file.name} has invalid format (not a dictionary). Returning empty."
-            )
+        Served from the in-memory user directory; single-user lookups should use
+        load_single_user / get_user_id_by_email instead.
+        """
+        if not self.file_locks.get("users"):
+            log.error("Lock for 'users.json' not found in configuration.")
             return {}
-
-        log.info(f"Loaded {len(users_data)} users from {self.users_file.name}")
-        return users_data
+        return self.user_directory.all_users()
 
     def save_users(self, users_data: Dict[str, Dict[str, Any]]):
         """Saves the main user database (users.json)."""
@@ -123,11 +122,16 @@ class UserDataService:
         except Exception as e:
             log.error(f"Failed to save users data: {e}")
             raise
+        finally:
+            self.user_directory.invalidate()
 
     def load_single_user(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """Loads data for a single user from users.json."""
-        all_users = self.load_users()
-        return all_users.get(user_id)
+        """Loads data for a single user (O(1) lookup in the user directory)."""
+        return self.user_directory.get(user_id)
+
+    def get_user_id_by_email(self, email: str) -> Optional[str]:
+        """Returns the ID of the user registered with this email, if any."""
+        return self.user_directory.get_user_id_by_email(email)
 
     # --- NEW: User Preferences ---
     def load_user_preferences(self, user_id: str) -> Dict[str, str]:
@@ -237,6 +241,7 @@ class UserDataService:
                     save_json_atomic(
                         self.users_file, all_users, threading.Lock(), indent=4
                     )  # Dummy lock as outer lock is held
+                    self.user_directory.invalidate()
                     log.info(
                         f"Saved preferences for user '{user_id}': Mode={theme_mode}, Color={theme_color}"
                     )
@@ -344,7 +349,7 @@ class UserDataService:
 
         try:
             # Use save_json_atomic (ensure it handles Path objects)
-            save_json_atomic(creds_file, data_to_save, lock, indent=2) # Use indent=2 for state file
+            save_json_atomic(creds_file, data_to_save, lock, indent=None) # Machine-owned state, no indent
             log.info(f"Saved Apple credentials and state to {creds_file} for user '{user_id}'.")
         except Exception as e:
             log.error(f"Failed to save Apple credentials and state for user '{user_id}': {e}")
@@ -809,374 +814,118 @@ class UserDataService:
             log.error(f"Failed to save subscriptions for user '{user_id}': {e}")
             raise
 
-    # --- Notification History ---
+    # --- Notification History (append-only log, see NotificationHistoryLog) ---
 
     def load_notification_history(self, user_id: str) -> List[Dict[str, Any]]:
         """Loads notification history for a user, sorted newest first."""
-        history_filename = self.config["USER_NOTIFICATIONS_HISTORY_FILENAME"]
-        history_file = self._get_user_file_path(user_id, history_filename)
-        if not history_file:
-            return []
-        lock = self.file_locks.get(history_filename)
-        if not lock:
-            log.error(f"Lock for '{history_filename}' not found.")
+        try:
+            history = self.history_log.list_entries(user_id)
+        except Exception as e:
+            log.exception(f"Unexpected error loading notification history for '{user_id}'")
             return []
-
-        # --- MODIFIED: Use load_json_file but handle LIST type ---
-        with lock:
-            if not history_file.exists():
-                log.debug(f"Notification history file not found: {history_file}")
-                return []
-            if history_file.stat().st_size == 0:
-                log.warning(f"Notification history file is empty: {history_file}")
-                return []
-
-            try:
-                with open(history_file, "r", encoding="utf-8") as f:
-                    history_data = json.load(f)
-
-                # *** CRITICAL FIX: Check if it's a LIST ***
-                if not isinstance(history_data, list):
-                    log.warning(
-                        f"Notification history file {history_file} is not a list. Resetting."
-                    )
-                    # Optionally backup/rename corrupted file here before returning empty
-                    # history_file.rename(history_file.with_suffix(".corrupted"))
-                    return []
-
-            except json.JSONDecodeError as e:
-                log.error(f"Failed to parse JSON from {history_file}: {e}")
-                return []
-            except (IOError, OSError) as e:
-                log.error(f"Failed to read file {history_file}: {e}")
-                return []
-            except Exception as e:
-                log.exception(f"Unexpected error loading JSON from {history_file}")
-                return []
-        # --- END MODIFICATION ---
-
-        # Ensure basic structure and sort (Keep this part)
-        validated_history = []
-        required_keys = {"id", "timestamp", "title", "body", "is_read"}
-        for item in history_data:
-            if isinstance(item, dict) and required_keys.issubset(item.keys()):
-                try:
-                    # Attempt to parse timestamp for sorting consistency check
-                    item_ts_str = item.get("timestamp", "")
-                    # Ensure timestamp has timezone info before parsing
-                    if "+" not in item_ts_str and "Z" not in item_ts_str:
-                        item_ts_str += "+00:00"  # Assume UTC if no offset
-                    else:
-                        item_ts_str = item_ts_str.replace("Z", "+00:00")
-
-                    item["timestamp_dt"] = datetime.fromisoformat(item_ts_str)
-                    validated_history.append(item)
-                except (ValueError, TypeError, KeyError) as e:
-                    log.warning(
-                        f"Skipping history item with invalid timestamp '{item.get('timestamp')}': {e} (ID: {item.get('id')})"
-                    )
-            else:
-                log.warning(
-                    f"Skipping invalid history item structure: {str(item)[:100]}..."
-                )
-
-        validated_history.sort(key=lambda x: x["timestamp_dt"], reverse=True)
-        # Remove temporary sort key
-        for item in validated_history:
-            del item["timestamp_dt"]
-
         log.info(
-            f"Loaded {len(validated_history)} notification history entries for user '{user_id}'"
+            f"Loaded {len(history)} notification history entries for user '{user_id}'"
         )
-        return validated_history
+        return history
 
     def save_notification_history(
         self, user_id: str, notification_entry: Dict[str, Any]
     ):
-        """Adds a new notification entry to the history file (which is a list)."""
-        history_filename = self.config["USER_NOTIFICATIONS_HISTORY_FILENAME"]
-        history_file = self._get_user_file_path(user_id, history_filename)
-        if not history_file:
-            raise IOError(
-                f"Could not get notification history file path for user '{user_id}'."
-            )
-        lock = self.file_locks.get(history_filename)
-        if not lock:
-            raise RuntimeError(f"Lock for '{history_filename}' not found.")
-
-        # --- MODIFIED: Load existing history (expecting list) and handle potential errors ---
-        with lock:
-            current_history = []  # Default to empty list
-            if history_file.exists() and history_file.stat().st_size > 0:
-                try:
-                    with open(history_file, "r", encoding="utf-8") as f:
-                        loaded_data = json.load(f)
-                    if isinstance(loaded_data, list):
-                        current_history = loaded_data
-                    else:
-                        log.warning(
-                            f"Overwriting non-list history file {history_file} during save."
-                        )
-                except Exception as load_err:
-                    log.error(
-                        f"Error loading existing history file {history_file} during save, starting fresh: {load_err}"
-                    )
-            # --- END MODIFICATION ---
-
-            # Prepend new entry
-            current_history.insert(0, notification_entry)
-
-            # Prune immediately after adding
-            max_days = self.config.get("NOTIFICATION_HISTORY_DAYS", 30)
-            cutoff_date = datetime.now(timezone.utc) - timedelta(days=max_days)
-            pruned_history = []
-            for item in current_history:
-                try:
-                    # Ensure timestamp has timezone info before parsing
-                    item_ts_str = item.get("timestamp", "")
-                    if "+" not in item_ts_str and "Z" not in item_ts_str:
-                        item_ts_str += "+00:00"
-                    else:
-                        item_ts_str = item_ts_str.replace("Z", "+00:00")
-                    item_ts = datetime.fromisoformat(item_ts_str)
-                    if item_ts >= cutoff_date:
-                        pruned_history.append(item)
-                except (ValueError, TypeError, KeyError) as e:
-                    log.warning(
-                        f"Skipping item with invalid timestamp '{item.get('timestamp')}' during history save/prune: {e} (ID: {item.get('id')})"
-                    )
-
-            try:
-                # Save the potentially pruned list back
-                save_json_atomic(
-                    history_file, pruned_history, threading.Lock(), indent=2
-                )  # Use dummy lock inside outer lock
-                log.info(
-                    f"Saved notification history for user '{user_id}' ({len(pruned_history)} entries)."
-                )
-            except Exception as e:
-                log.error(
-                    f"Failed to save notification history for user '{user_id}': {e}"
-                )
-                raise  # Re-raise the exception after logging
+        """Appends a new notification entry to the history log."""
+        try:
+            self.history_log.append_entry(user_id, notification_entry)
+            log.info(f"Appended notification history entry for user '{user_id}'.")
+        except Exception as e:
+            log.error(f"Failed to save notification history for user '{user_id}': {e}")
+            raise
 
     def update_notification_read_status(
         self, user_id: str, notification_id: str, is_read: bool
     ) -> bool:
-        """Updates the read status of a specific notification entry in the history list."""
-        history_filename = self.config["USER_NOTIFICATIONS_HISTORY_FILENAME"]
-        history_file = self._get_user_file_path(user_id, history_filename)
-        if not history_file:
-            return False
-        lock = self.file_locks.get(history_filename)
-        if not lock:
+        """Updates the read status of a specific notification entry (O(1) append)."""
+        try:
+            updated = self.history_log.set_read(user_id, notification_id, is_read)
+        except Exception as e:
+            log.error(
+                f"Failed to update read status for notification {notification_id} (user {user_id}): {e}"
+            )
             return False
-
-        with lock:
-            # --- MODIFIED: Load directly expecting a list ---
-            current_history = []
-            if history_file.exists() and history_file.stat().st_size > 0:
-                try:
-                    with open(history_file, "r", encoding="utf-8") as f:
-                        loaded_data = json.load(f)
-                    if isinstance(loaded_data, list):
-                        current_history = loaded_data
-                    else:
-                        log.warning(
-                            f"History file {history_file} is not a list. Cannot update read status."
-                        )
-                        return False
-                except Exception as load_err:
-                    log.error(
-                        f"Error loading history file {history_file} for read status update: {load_err}"
-                    )
-                    return False
-            # --- END MODIFICATION ---
-
-            updated = False
-            for item in current_history:
-                if isinstance(item, dict) and item.get("id") == notification_id:
-                    item["is_read"] = bool(is_read)
-                    updated = True
-                    break  # Found and updated
-
-            if updated:
-                try:
-                    # Save the modified list
-                    save_json_atomic(
-                        history_file, current_history, threading.Lock(), indent=2
-                    )  # Use dummy lock
-                    log.info(
-                        f"Updated read status for notification {notification_id} for user '{user_id}' to {is_read}."
-                    )
-                    return True
-                except Exception as e:
-                    log.error(
-                        f"Failed to save updated history for read status change (user {user_id}): {e}"
-                    )
-                    return False  # Save failed
-            else:
-                log.warning(
-                    f"Notification ID {notification_id} not found for user '{user_id}' during status update."
-                )
-                return False  # Indicate not found
+        if updated:
+            log.info(
+                f"Updated read status for notification {notification_id} for user '{user_id}' to {is_read}."
+            )
+        else:
+            log.warning(
+                f"Notification ID {notification_id} not found for user '{user_id}' during status update."
+            )
+        return updated
 
     def delete_notification_history(
         self, user_id: str, notification_id: Optional[str] = None
     ) -> bool:
-        """Deletes a specific notification or all history (list) for a user."""
-        history_filename = self.config["USER_NOTIFICATIONS_HISTORY_FILENAME"]
-        history_file = self._get_user_file_path(user_id, history_filename)
-        if not history_file:
-            return False
-        lock = self.file_locks.get(history_filename)
-        if not lock:
-            return False
-
-        with lock:
-            # --- MODIFIED: Load directly expecting a list ---
-            current_history = []
-            if history_file.exists() and history_file.stat().st_size > 0:
-                try:
-                    with open(history_file, "r", encoding="utf-8") as f:
-                        loaded_data = json.load(f)
-                    if isinstance(loaded_data, list):
-                        current_history = loaded_data
-                    else:
-                        log.warning(
-                            f"History file {history_file} is not a list. Cannot delete entries."
-                        )
-                        # Treat as success if clearing all, as file will be overwritten anyway
-                        return notification_id is None
-                except Exception as load_err:
-                    log.error(
-                        f"Error loading history file {history_file} for deletion: {load_err}"
-                    )
-                    return False
-            # --- END MODIFICATION ---
-
-            deleted = False
-            if notification_id:  # Delete single entry
-                original_count = len(current_history)
-                new_history = [
-                    item
-                    for item in current_history
-                    if not (
-                        isinstance(item, dict) and item.get("id") == notification_id
-                    )
-                ]
-                deleted = len(new_history) < original_count
-            else:  # Delete all entries
-                new_history = []
-                deleted = (
-                    len(current_history) > 0
-                )  # Mark as deleted if list wasn't already empty
-
-            if (
-                deleted or notification_id is None
-            ):  # Save if deleted specific OR clearing all
-                try:
-                    # Save the potentially modified list
-                    save_json_atomic(
-                        history_file, new_history, threading.Lock(), indent=2
-                    )  # Use dummy lock
-                    if notification_id:
-                        if deleted:
-                            log.info(
-                                f"Deleted notification {notification_id} for user '{user_id}'."
-                            )
-                        else:
-                            log.warning(
-                                f"Notification ID {notification_id} not found for deletion for user '{user_id}'."
-                            )
-                    else:
-                        log.info(
-                            f"Cleared all notification history for user '{user_id}'."
-                        )
-                    return True  # Return True if operation completed, even if specific ID wasn't found
-                except Exception as e:
-                    log.error(
-                        f"Failed to save history after deletion (user {user_id}): {e}"
-                    )
-                    return False  # Save failed
+        """Deletes a specific notification or all history for a user."""
+        try:
+            if notification_id is None:
+                cleared = self.history_log.clear(user_id)
+                if cleared:
+                    log.info(f"Cleared all notification history for user '{user_id}'.")
+                return cleared
+            if self.history_log.delete_entry(user_id, notification_id):
+                log.info(f"Deleted notification {notification_id} for user '{user_id}'.")
             else:
-                # This case means specific ID was requested but not found
                 log.warning(
                     f"Notification ID {notification_id} not found for deletion for user '{user_id}'."
                 )
-                return True  # Return True as operation completed without error, though nothing changed
-
-    # --- Pruning (Keep as is, it already loads/saves correctly based on the fixed methods above) ---
-    def prune_notification_history(self, user_id: str):
-        """Removes history entries older than the configured retention period."""
-        history_filename = self.config["USER_NOTIFICATIONS_HISTORY_FILENAME"]
-        history_file = self._get_user_file_path(user_id, history_filename)
-        if not history_file or not history_file.exists():
-            return  # No file to prune
-        lock = self.file_locks.get(history_filename)
-        if not lock:
-            return
+            return True  # Operation completed, even if the ID wasn't found
+        except Exception as e:
+            log.error(f"Failed to delete notification history (user {user_id}): {e}")
+            return False
 
-        with lock:
-            # --- MODIFIED: Load directly expecting a list ---
-            current_history = []
-            if history_file.exists() and history_file.stat().st_size > 0:
-                try:
-                    with open(history_file, "r", encoding="utf-8") as f:
-                        loaded_data = json.load(f)
-                    if isinstance(loaded_data, list):
-                        current_history = loaded_data
-                    else:
-                        log.warning(
-                            f"History file {history_file} is not a list during prune. Cannot prune."
-                        )
-                        return  # Cannot prune invalid file
-                except Exception as load_err:
-                    log.error(
-                        f"Error loading history file {history_file} for pruning: {load_err}"
-                    )
-                    return  # Cannot prune if load fails
-            # --- END MODIFICATION ---
+    def query_notification_history(
+        self,
+        user_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        types: Optional[Set[str]] = None,
+        device_id: Optional[str] = None,
+        read_state: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """Returns one page of notification history (see NotificationHistoryLog.query)."""
+        return self.history_log.query(
+            user_id,
+            limit=limit,
+            cursor=cursor,
+            types=types,
+            device_id=device_id,
+            read_state=read_state,
+        )
 
-            if not current_history:
-                return  # Nothing to prune
+    def get_notification_history_changes(
+        self, user_id: str, since_ts: float
+    ) -> Dict[str, Any]:
+        """Returns history entries changed/deleted after since_ts (epoch seconds)."""
+        return self.history_log.changes_since(user_id, since_ts)
 
-            max_days = self.config.get("NOTIFICATION_HISTORY_DAYS", 30)
-            cutoff_date = datetime.now(timezone.utc) - timedelta(days=max_days)
-            original_count = len(current_history)
+    def get_unread_notification_count(self, user_id: str) -> int:
+        """Returns the unread notification count from the history index."""
+        return self.history_log.unread_count(user_id)
 
-            pruned_history = []
-            for item in current_history:
-                try:
-                    item_ts_str = item.get("timestamp", "")
-                    if "+" not in item_ts_str and "Z" not in item_ts_str:
-                        item_ts_str += "+00:00"
-                    else:
-                        item_ts_str = item_ts_str.replace("Z", "+00:00")
-                    item_ts = datetime.fromisoformat(item_ts_str)
-                    if item_ts >= cutoff_date:
-                        pruned_history.append(item)
-                except (ValueError, TypeError, KeyError) as e:
-                    log.warning(
-                        f"Skipping item with invalid timestamp '{item.get('timestamp')}' during pruning: {e} (ID: {item.get('id')})"
-                    )
-                    continue  # Skip invalid items
+    def mark_all_notifications_read(self, user_id: str) -> int:
+        """Marks every notification as read with one log record. Returns entries changed."""
+        changed = self.history_log.mark_all_read(user_id)
+        log.info(f"Marked {changed} notifications as read for user '{user_id}'.")
+        return changed
 
-            if len(pruned_history) < original_count:
-                try:
-                    # Save the pruned list
-                    save_json_atomic(
-                        history_file, pruned_history, threading.Lock(), indent=2
-                    )  # Dummy lock
-                    log.info(
-                        f"Pruned {original_count - len(pruned_history)} old notification history entries for user '{user_id}'."
-                    )
-                except Exception as e:
-                    log.error(
-                        f"Failed to save pruned history for user '{user_id}': {e}"
-                    )
-            else:
-                log.debug(f"No history entries needed pruning for user '{user_id}'.")
+    def prune_notification_history(self, user_id: str):
+        """Drops history segments older than the retention period and compacts if needed."""
+        dropped = self.history_log.prune(user_id)
+        if dropped:
+            log.info(
+                f"Pruned {dropped} old notification history segment(s) for user '{user_id}'."
+            )
+        else:
+            log.debug(f"No history segments needed pruning for user '{user_id}'.")
+        self.history_log.compact(user_id)
 
     # --- State Files (Geofence, Battery, Notification Times, Cache) ---
 
@@ -1226,7 +975,7 @@ class UserDataService:
             if isinstance(k, tuple) and len(k) == 2 and isinstance(v, str)
         }
         try:
-            save_json_atomic(state_file, state_to_save, lock, indent=2)
+            save_json_atomic(state_file, state_to_save, lock, indent=None)
             log.debug(f"Geofence state saved to {state_file} for user '{user_id}'")
         except Exception as e:
             log.error(f"Failed to save geofence state for user '{user_id}': {e}")
@@ -1266,7 +1015,7 @@ class UserDataService:
             raise TypeError("Battery state data must be a dict.")
         state_to_save = {k: v for k, v in state_dict.items() if isinstance(v, str)}
         try:
-            save_json_atomic(state_file, state_to_save, lock, indent=2)
+            save_json_atomic(state_file, state_to_save, lock, indent=None)
             log.debug(f"Battery state saved to {state_file} for user '{user_id}'")
         except Exception as e:
             log.error(f"Failed to save battery state for user '{user_id}': {e}")
@@ -1324,7 +1073,7 @@ class UserDataService:
                     f"User '{user_id}': Skipping invalid notification time entry during save: Key={k}, Value={v}"
                 )
         try:
-            save_json_atomic(state_file, state_to_save, lock, indent=2)
+            save_json_atomic(state_file, state_to_save, lock, indent=None)
             log.debug(f"Notification times saved to {state_file} for user '{user_id}'")
         except Exception as e:
             log.error(f"Failed to save notification times for user '{user_id}': {e}")
@@ -1448,100 +1197,48 @@ class UserDataService:
     # --- NEW: Account Deletion ---
 
     def load_shares(self) -> Dict[str, Dict[str, Any]]:
-        """Loads the global shares database (shares.json)."""
-        shares_lock = self.file_locks.get("shares")
-        if not shares_lock:
-            log.error("Lock for 'shares.json' not found.")
-            return {}
-        # --- FIX: Use correct path joining ---
-        shares_file_path = (
-            self.data_dir / self.config["SHARES_FILE"].name
-        )  # Use name relative to data_dir
-        # --- ---------------------------- ---
-        shares_data = load_json_file(shares_file_path, shares_lock)
-        if shares_data is None:
-            # --- FIX: Create empty shares file if it doesn't exist ---
-            if not shares_file_path.exists():
-                log.warning(
-                    f"Shares file {shares_file_path} not found. Creating empty file."
-                )
-                try:
-                    self.save_shares({})  # Save an empty dict initially
-                    return {}
-                except Exception as e:
-                    log.error(f"Failed to create initial shares file: {e}")
-                    return {}  # Return empty on creation failure
-            else:
-                return {}  # Return empty if loading failed but file exists
-            # --- -------------------------------------------------- ---
-        if not isinstance(shares_data, dict):
-            log.error("shares.json format invalid.")
-            return {}
-        return shares_data
+        """
+        Returns a copy of the global shares database (shares.json), keyed by share_id.
 
-    def save_shares(self, shares_data: Dict[str, Dict[str, Any]]):
-        """Saves the global shares database (shares.json)."""
-        shares_lock = self.file_locks.get("shares")
-        if not shares_lock:
-            raise RuntimeError("Share lock missing.")
-        if not isinstance(shares_data, dict):
-            raise TypeError("shares_data must be dict.")
-        # --- FIX: Use correct path joining ---
-        shares_file_path = self.data_dir / self.config["SHARES_FILE"].name
-        # --- ---------------------------- ---
+        Served from the in-memory share registry; prefer the indexed helpers
+        (get_share, get_user_shares, ...) over scanning this dict.
+        """
         try:
-            save_json_atomic(shares_file_path, shares_data, shares_lock, indent=2)
-            log.info(f"Saved {len(shares_data)} shares to {shares_file_path.name}")
+            return self.share_registry.snapshot()
         except Exception as e:
-            log.error(f"Failed to save shares data: {e}")
-            raise
+            log.error(f"Failed to load shares data: {e}")
+            return {}
 
     def save_shares(self, shares_data: Dict[str, Dict[str, Any]]):
-        """Saves the global shares database (shares.json)."""
-        shares_lock = self.file_locks.get("shares")
-        if not shares_lock:
-            raise RuntimeError("Share lock missing.")
+        """Replaces the global shares database (registry + shares.json)."""
         if not isinstance(shares_data, dict):
             raise TypeError("shares_data must be dict.")
-        shares_file_path = self.config["DATA_DIRECTORY"] / self.config["SHARES_FILE"]
-        try:
-            save_json_atomic(shares_file_path, shares_data, shares_lock, indent=2)
-            log.info(f"Saved {len(shares_data)} shares to {shares_file_path.name}")
-        except Exception as e:
-            log.error(f"Failed to save shares data: {e}")
-            raise
+        self.share_registry.replace_all(shares_data)
+
+    def _compute_share_expiry(self, duration_hours: Optional[int]) -> Optional[datetime]:
+        """Maps a requested duration (0 = indefinite, None/invalid = default) to an expiry."""
+        now = datetime.now(timezone.utc)
+        if duration_hours is not None and duration_hours > 0:
+            return now + timedelta(hours=duration_hours)
+        if duration_hours == 0:
+            return None  # Indefinite
+        default_duration = self.config.get("DEFAULT_SHARE_DURATION_HOURS", 24)
+        if default_duration > 0:
+            return now + timedelta(hours=default_duration)
+        return None
 
     def get_active_shared_device_ids_for_user(self, user_id: str) -> Set[str]:
         """Gets a set of device IDs actively shared BY this user."""
         active_ids = set()
-        all_shares = self.load_shares()
-        now_utc = datetime.now(timezone.utc)
-        for share_id, share_data in all_shares.items():
-            # Check owner and active status
-            if share_data.get("user_id") == user_id and share_data.get("active", False):
-                expires_at_str = share_data.get("expires_at")
-                # Check expiry
-                if expires_at_str:
-                    try:
-                        expires_at_dt = datetime.fromisoformat(
-                            expires_at_str.replace("Z", "+00:00")
-                        )
-                        if expires_at_dt.tzinfo is None:
-                            expires_at_dt = expires_at_dt.replace(tzinfo=timezone.utc)
-                        # Only add if not expired
-                        if expires_at_dt >= now_utc:
-                            device_id = share_data.get("device_id")
-                            if device_id:
-                                active_ids.add(device_id)
-                    except ValueError:
-                        log.warning(
-                            f"Invalid expiry format checking active shares for user {user_id}, share {share_id}"
-                        )
-                else:
-                    # No expiry date means it's active indefinitely
-                    device_id = share_data.get("device_id")
-                    if device_id:
-                        active_ids.add(device_id)
+        now_ts = datetime.now(timezone.utc).timestamp()
+        for share_data, expires_ts in self.share_registry.owner_shares(user_id):
+            if not share_data.get("active", False):
+                continue
+            # No expiry means it's active indefinitely
+            if expires_ts is None or expires_ts >= now_ts:
+                device_id = share_data.get("device_id")
+                if device_id:
+                    active_ids.add(device_id)
         return active_ids
 
     def add_share(
@@ -1557,15 +1254,7 @@ class UserDataService:
             return None
         share_id = str(uuid.uuid4())
         now = datetime.now(timezone.utc)
-        expires_at = None
-        if duration_hours is not None and duration_hours > 0:
-            expires_at = now + timedelta(hours=duration_hours)
-        elif duration_hours == 0:
-            expires_at = None  # Indefinite
-        else:
-            default_duration = self.config.get("DEFAULT_SHARE_DURATION_HOURS", 24)
-            if default_duration > 0:
-                expires_at = now + timedelta(hours=default_duration)
+        expires_at = self._compute_share_expiry(duration_hours)
         new_share = {
             "share_id": share_id,
             "user_id": user_id,
@@ -1576,9 +1265,7 @@ class UserDataService:
             "note": (note or "").strip()[:100],
         }
         try:
-            all_shares = self.load_shares()
-            all_shares[share_id] = new_share
-            self.save_shares(all_shares)
+            self.share_registry.put(new_share)
             log.info(
                 f"User '{user_id}' created share '{share_id}' for device '{device_id}'. Expires: {new_share['expires_at']}"
             )
@@ -1590,37 +1277,21 @@ class UserDataService:
             return None
 
     def get_share(self, share_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieves a specific share record by its ID."""
-        all_shares = self.load_shares()
-        return all_shares.get(share_id)
+        """Retrieves a specific share record by its ID (O(1) registry lookup)."""
+        try:
+            return self.share_registry.get(share_id)
+        except Exception as e:
+            log.error(f"Failed to look up share '{share_id}': {e}")
+            return None
 
     def get_user_shares(self, user_id: str) -> List[Dict[str, Any]]:
-        """Retrieves all active shares created by a specific user."""
-        all_shares = self.load_shares()
+        """Retrieves all shares created by a specific user."""
         user_shares = []
-        now_utc = datetime.now(timezone.utc)
-        for share_id, share_data in all_shares.items():
-            if share_data.get("user_id") == user_id:
-                is_expired = False
-                expires_at_str = share_data.get("expires_at")
-                if expires_at_str:
-                    try:
-                        expires_at_dt = datetime.fromisoformat(
-                            expires_at_str.replace("Z", "+00:00")
-                        )
-                        if expires_at_dt.tzinfo is None:
-                            expires_at_dt = expires_at_dt.replace(tzinfo=timezone.utc)
-                        if expires_at_dt < now_utc:
-                            is_expired = True
-                    except ValueError:
-                        log.warning(f"Invalid expiry format for share {share_id}")
-                        is_expired = True
-                # Only include if active flag is True (ignore expiry here, UI can show expired ones if needed)
-                # if share_data.get("active", False): # <<< Keep this check
-                share_data_with_id = share_data.copy()
-                share_data_with_id["share_id"] = share_id
-                share_data_with_id["is_expired"] = is_expired  # Add expiry status flag
-                user_shares.append(share_data_with_id)
+        now_ts = datetime.now(timezone.utc).timestamp()
+        for share_data, expires_ts in self.share_registry.owner_shares(user_id):
+            # Active and expired shares are both returned; the UI shows the flag
+            share_data["is_expired"] = expires_ts is not None and expires_ts < now_ts
+            user_shares.append(share_data)
         user_shares.sort(key=lambda x: x.get("created_at", ""), reverse=True)
         return user_shares
 
@@ -1630,8 +1301,7 @@ class UserDataService:
     ) -> bool:
         """Sets the active status of a share if the requesting user is the owner."""
         try:
-            all_shares = self.load_shares()
-            share_data = all_shares.get(share_id)
+            share_data = self.share_registry.get(share_id)
 
             if not share_data:
                 log.warning(f"Toggle status failed: Share ID '{share_id}' not found.")
@@ -1642,15 +1312,16 @@ class UserDataService:
                 )
                 return False
 
-            current_status = share_data.get("active", False)
-            if current_status == new_status:
+            if share_data.get("active", False) == new_status:
                 log.info(
                     f"Share '{share_id}' status is already {new_status}. No change needed."
                 )
                 return True  # Treat as success if already in desired state
 
-            share_data["active"] = new_status
-            self.save_shares(all_shares)
+            if not self.share_registry.update(
+                share_id, {"active": new_status}, owner_id=requesting_user_id
+            ):
+                return False
             log.info(
                 f"User '{requesting_user_id}' set share '{share_id}' status to {new_status}."
             )
@@ -1660,12 +1331,18 @@ class UserDataService:
             return False
 
     def update_share_expiry(
-        self, share_id: str, requesting_user_id: str, new_duration_hours: Optional[int]
+        self,
+        share_id: str,
+        requesting_user_id: str,
+        new_duration_hours: Optional[int],
+        note: Optional[str] = None,
     ) -> Optional[Dict]:
-        """Updates the expiry time of a share if the requesting user is the owner."""
+        """
+        Updates the expiry time (and optionally the note) of a share if the
+        requesting user is the owner.
+        """
         try:
-            all_shares = self.load_shares()
-            share_data = all_shares.get(share_id)
+            share_data = self.share_registry.get(share_id)
 
             if not share_data:
                 log.warning(f"Update expiry failed: Share ID '{share_id}' not found.")
@@ -1676,30 +1353,20 @@ class UserDataService:
                 )
                 return None
 
-            now = datetime.now(timezone.utc)
-            new_expires_at = None
-            if new_duration_hours is not None and new_duration_hours > 0:
-                new_expires_at = now + timedelta(hours=new_duration_hours)
-            elif new_duration_hours == 0:  # Indefinite
-                new_expires_at = None
-            else:  # Use default if invalid duration provided (e.g., None or negative)
-                default_duration = self.config.get("DEFAULT_SHARE_DURATION_HOURS", 24)
-                if default_duration > 0:
-                    new_expires_at = now + timedelta(hours=default_duration)
-
-            share_data["expires_at"] = (
-                new_expires_at.isoformat() if new_expires_at else None
+            new_expires_at = self._compute_share_expiry(new_duration_hours)
+            changes = {
+                "expires_at": new_expires_at.isoformat() if new_expires_at else None,
+                # Ensure note exists even if empty
+                "note": note if note is not None else share_data.get("note", ""),
+            }
+            updated_share = self.share_registry.update(
+                share_id, changes, owner_id=requesting_user_id
             )
-            share_data["note"] = share_data.get(
-                "note", ""
-            )  # Ensure note exists even if empty
-
-            self.save_shares(all_shares)
+            if not updated_share:
+                return None
             log.info(
-                f"User '{requesting_user_id}' updated expiry for share '{share_id}' to {share_data['expires_at']}."
+                f"User '{requesting_user_id}' updated expiry for share '{share_id}' to {updated_share['expires_at']}."
             )
-            # Return the updated share data (including share_id)
-            updated_share = share_data.copy()
             updated_share["share_id"] = share_id
             return updated_share
         except Exception as e:
@@ -1713,8 +1380,7 @@ class UserDataService:
         Permanently deletes a share record from shares.json if the user is the owner.
         """
         try:
-            all_shares = self.load_shares()  # load_shares handles locking for read
-            share_data = all_shares.get(share_id)
+            share_data = self.share_registry.get(share_id)
 
             if not share_data:
                 log.warning(
@@ -1726,24 +1392,14 @@ class UserDataService:
                 log.warning(
                     f"Permanent delete failed: User '{requesting_user_id}' does not own share '{share_id}'."
                 )
-                # Consider raising PermissionError here? For now, return False
                 return False
 
-            # If checks pass, remove the entry
-            del all_shares[share_id]
-
-            # Save the modified dictionary (save_shares handles locking for write)
-            self.save_shares(all_shares)
+            if not self.share_registry.remove(share_id, owner_id=requesting_user_id):
+                return False
             log.info(
                 f"User '{requesting_user_id}' permanently deleted share '{share_id}'."
             )
             return True
-
-        except KeyError:  # Should be caught by the get() check, but safety first
-            log.warning(
-                f"Permanent delete failed: Share ID '{share_id}' key error during removal attempt."
-            )
-            return False
         except Exception as e:
             log.exception(f"Failed to permanently delete share '{share_id}'")
             return False  # Indicate failure
@@ -1756,70 +1412,30 @@ class UserDataService:
         log.info(f"Revoking share '{share_id}' by setting active=False (not deleting).")
         return self.toggle_share_status(share_id, requesting_user_id, new_status=False)
 
-    def prune_expired_shares(self):
-        # Keep existing logic, but now only needs to check expiry, not active flag
-        log.info("Running periodic share pruning...")
+    def prune_expired_shares(self) -> int:
+        """
+        Removes expired shares (regardless of active status, user manages that).
+
+        Pops due entries off the registry's expiry heap instead of scanning
+        every share, so it is cheap to run often.
+
+        Returns:
+            The number of shares removed.
+        """
         try:
-            all_shares = self.load_shares()
-            shares_to_keep = {}
-            now_utc = datetime.now(timezone.utc)
-            removed_count = 0
-            for share_id, share_data in all_shares.items():
-                is_expired = False
-                expires_at_str = share_data.get("expires_at")
-                if expires_at_str:
-                    try:
-                        expires_at_dt = datetime.fromisoformat(
-                            expires_at_str.replace("Z", "+00:00")
-                        )
-                        if expires_at_dt.tzinfo is None:
-                            expires_at_dt = expires_at_dt.replace(tzinfo=timezone.utc)
-                        if expires_at_dt < now_utc:
-                            is_expired = True
-                    except ValueError:
-                        log.warning(f"Invalid expiry format during pruning {share_id}")
-                        is_expired = True
-                # Keep shares that are NOT expired (regardless of active status, user manages that)
-                if not is_expired:
-                    shares_to_keep[share_id] = share_data
-                else:
-                    log.debug(f"Pruning expired share '{share_id}'")
-                    removed_count += 1
-            if removed_count > 0:
-                self.save_shares(shares_to_keep)
-                log.info(f"Successfully pruned {removed_count} expired shares.")
+            removed = self.share_registry.prune_expired()
+            if removed:
+                log.info(f"Successfully pruned {len(removed)} expired shares.")
             else:
-                log.info("No shares needed pruning based on expiry.")
+                log.debug("No shares needed pruning based on expiry.")
+            return len(removed)
         except Exception as e:
             log.exception("Error during share pruning")
+            return 0
 
     def is_device_shared(self, user_id: str, device_id: str) -> bool:
-        # Keep existing logic (checks active and expiry)
-        all_shares = self.load_shares()
-        now_utc = datetime.now(timezone.utc)
-        for share_id, share_data in all_shares.items():
-            if (
-                share_data.get("user_id") == user_id
-                and share_data.get("device_id") == device_id
-            ):
-                if share_data.get("active", False):
-                    expires_at_str = share_data.get("expires_at")
-                    if expires_at_str:
-                        try:
-                            expires_at_dt = datetime.fromisoformat(
-                                expires_at_str.replace("Z", "+00:00")
-                            )
-                            if expires_at_dt.tzinfo is None:
-                                expires_at_dt = expires_at_dt.replace(
-                                    tzinfo=timezone.utc
-                                )
-                            if expires_at_dt >= now_utc:
-                                return True
-                        except ValueError:
-                            continue
-                    else:
-                        return True  # Active and never expires
-        return False
+        """True if the user has an active, unexpired share for this device."""
+        return device_id in self.get_active_shared_device_ids_for_user(user_id)
 
     def delete_user_data(self, user_id: str) -> bool:
         """
@@ -1855,6 +1471,7 @@ class UserDataService:
                     log.info(f"Removing user '{user_id}' from {self.users_file.name}")
                     del all_users[user_id]
                     save_json_atomic(self.users_file, all_users, dummy_lock, indent=4)
+                    self.user_directory.invalidate()
                     user_removed_from_json = True
                     log.info(f"Successfully removed '{user_id}' from users file.")
                 else:
@@ -1874,14 +1491,7 @@ class UserDataService:
             # --- Step 2: Remove User's Shares ---
             try:
                 log.info(f"Removing shares associated with deleted user '{user_id}'.")
-                all_shares = self.load_shares()
-                shares_to_keep = {
-                    sid: sdata
-                    for sid, sdata in all_shares.items()
-                    if sdata.get("user_id") != user_id
-                }
-                if len(shares_to_keep) < len(all_shares):
-                    self.save_shares(shares_to_keep)
+                if self.share_registry.remove_owner(user_id):
                     log.info(f"Successfully removed shares for user '{user_id}'.")
                 else:
                     log.info(f"No shares found to remove for user '{user_id}'.")
@@ -2010,7 +1620,8 @@ class UserDataService:
                             json_file,
                             updated_data,
                             threading.Lock(),
-                            indent=2 if filename_key != "USER_CACHE_FILENAME" else None,
+                            # Keep devices.json human-readable; state/cache files are machine-owned
+                            indent=4 if filename_key == "USER_DEVICES_FILENAME" else None,
                         )
                         log.info(
                             f"User '{user_id}': Removed '{device_id}' related entries from {json_filename}."
@@ -2072,7 +1683,17 @@ class UserDataService:
                 k: v for k, v in data.items() if not k.startswith(f"{device_id}::")
             },
         )
-        # f) (Optional) notifications_history.json (Keep commented or implement if needed)
+        # f) timeline.json
+        cleanup_json_file(
+            "USER_TIMELINE_FILENAME",
+            lambda data: {k: v for k, v in data.items() if k != device_id},
+        )
+        # (Optional) notifications_history.json (Keep commented or implement if needed)
+        # g) Archived raw reports (cold storage)
+        try:
+            self.report_archive.delete_device(user_id, device_id)
+        except Exception as e:
+            cleanup_errors.append(f"Failed to delete history archive: {e}")
 
         if cleanup_errors:
             final_message = f"Device '{device_id}' source file ({deleted_filename}) deleted (or was missing), but errors occurred during data cleanup: {'; '.join(cleanup_errors)}"
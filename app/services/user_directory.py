@@ -0,0 +1,133 @@
+# app/services/user_directory.py
+# In-memory directory of users.json, indexed by user ID and email.
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+
+from app.utils.json_utils import load_json_file
+
+log = logging.getLogger(__name__)
+
+
+class _DirectoryIndex:
+    """In-memory state mirrored from users.json."""
+
+    def __init__(self):
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.by_email: Dict[str, str] = {}  # lower-cased email -> user_id
+        self.signature: Optional[Tuple[int, int]] = None  # (mtime_ns, size) of users.json
+        self.lock = threading.Lock()  # Guards reloads of this index
+
+
+# Directories are shared across (short-lived) service instances, keyed by users file path
+_indexes: Dict[str, _DirectoryIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+class UserDirectory:
+    """
+    Serves user lookups from memory instead of parsing users.json per call.
+
+    The index is loaded once and rebuilt only when the file's (mtime, size)
+    signature changes, so writes from anywhere (including other processes) are
+    picked up; save paths in UserDataService also invalidate it explicitly. Lookups cost one stat() and a dict access.
+    """
+
+    def __init__(self, users_file: Path, users_lock: Optional[threading.Lock]):
+        """
+        Initializes the directory.
+
+        Args:
+            users_file: Path to users.json.
+            users_lock: The global "users" file lock (held while re-reading the file).
+        """
+        self.users_file = Path(users_file)
+        self.users_lock = users_lock
+        key = str(self.users_file)
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = _DirectoryIndex()
+                _indexes[key] = index
+        self._index = index
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.users_file)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _rebuild(self, users_data: Dict[str, Dict[str, Any]], signature: Optional[Tuple[int, int]]):
+        """
+        Replaces the index contents. Caller holds the index lock.
+
+        Both maps are built aside and assigned at the end: lookups do not take
+        the index lock, so they must never see a half-filled by_email.
+        """
+        users = {uid: dict(udata) for uid, udata in users_data.items() if isinstance(udata, dict)}
+        by_email = {}
+        for uid, udata in users.items():
+            email = udata.get("email")
+            if isinstance(email, str) and email:
+                by_email[email.strip().lower()] = uid
+        index = self._index
+        index.users, index.by_email = users, by_email
+        index.signature = signature
+
+    def _ensure_loaded(self):
+        signature = self._file_signature()
+        if signature is not None and signature == self._index.signature:
+            return
+        if not self.users_lock:
+            log.error("Lock for 'users.json' not found in configuration.")
+            return
+        with self._index.lock:
+            signature = self._file_signature()  # Re-check under the lock
+            if signature is not None and signature == self._index.signature:
+                return
+            if signature is None:
+                self._rebuild({}, None)
+                return
+            users_data = load_json_file(self.users_file, self.users_lock)
+            if not isinstance(users_data, dict):
+                if users_data is not None:
+                    log.error(
+                        f"{self.users_file.name} has invalid format (not a dictionary). Returning empty."
+                    )
+                users_data = {}
+            self._rebuild(users_data, signature)
+            log.info(f"Loaded {len(self._index.users)} users from {self.users_file.name}")
+
+    # --- Lookups ---
+
+    def all_users(self) -> Dict[str, Dict[str, Any]]:
+        """Returns a copy of every user record keyed by user ID (old load_users shape)."""
+        self._ensure_loaded()
+        with self._index.lock:
+            return {uid: dict(udata) for uid, udata in self._index.users.items()}
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a copy of one user's record, or None."""
+        self._ensure_loaded()
+        user_data = self._index.users.get(user_id)
+        return dict(user_data) if user_data is not None else None
+
+    def get_user_id_by_email(self, email: str) -> Optional[str]:
+        """Returns the ID of the user registered with this email (case-insensitive)."""
+        if not email:
+            return None
+        self._ensure_loaded()
+        return self._index.by_email.get(email.strip().lower())
+
+    # --- Write Hooks ---
+
+    def invalidate(self):
+        """
+        Forces the next lookup to re-read users.json. Lock-free on purpose: callers
+        may still hold the "users" file lock, which reloads acquire after the index lock.
+        """
+        self._index.signature = None
@@ -120,7 +120,28 @@ window.AppApi = {
     },
 
     /** Fetch all devices and their latest status */
-    fetchDevices: async function () { return await this._fetch('/api/devices'); },
+    fetchDevices: async function (detail = 'full') {
+        // Histories arrive columnar (encoded polyline + delta timestamps); expand them back into report objects.
+        // `detail` ('low' | 'medium' | 'full') selects a server-side simplified history.
+        const detailParam = detail && detail !== 'full' ? `&detail=${encodeURIComponent(detail)}` : '';
+        const data = await this._fetch(`/api/devices?reports=compact${detailParam}`);
+        if (data && Array.isArray(data.devices)) {
+            data.devices.forEach(device => {
+                if (device.reports_compact) {
+                    device.reports = AppUtils.decodeCompactReports(device.reports_compact);
+                    delete device.reports_compact;
+                } else if (!Array.isArray(device.reports)) {
+                    device.reports = [];
+                }
+            });
+        }
+        return data;
+    },
+    /** Fetch a device's precomputed trips/stays (optional { since, limit }) */
+    fetchDeviceTimeline: async function (deviceId, params = {}) {
+        const query = new URLSearchParams(Object.entries(params).filter(([, v]) => v !== undefined && v !== null)).toString();
+        return await this._fetch(`/api/devices/${encodeURIComponent(deviceId)}/timeline${query ? `?${query}` : ''}`);
+    },
     /** Fetch all global geofence definitions */
     fetchGlobalGeofences: async function () { return await this._fetch('/api/geofences'); },
     /** Update device display properties (name, label, color) */
@@ -175,8 +196,16 @@ window.AppApi = {
     },
 
     // --- NEW: Notification History APIs ---
-    fetchNotificationHistory: async function () {
-        return await this._fetch('/api/notifications/history'); // Add limit/offset later if needed
+    fetchNotificationHistory: async function (params = null) {
+        // params: { limit, cursor, type, device, read, since } -> paged envelope; none -> full list
+        const query = params ? new URLSearchParams(Object.entries(params).filter(([, v]) => v !== undefined && v !== null && v !== '')).toString() : '';
+        return await this._fetch(`/api/notifications/history${query ? `?${query}` : ''}`);
+    },
+    fetchUnreadNotificationCount: async function () {
+        return await this._fetch('/api/notifications/unread_count');
+    },
+    markAllNotificationsRead: async function () {
+        return await this._fetch('/api/notifications/history/read_all', { method: 'PUT' });
     },
     markNotificationRead: async function (notificationId) {
         return await this._fetch(`/api/notifications/history/${notificationId}/read`, { method: 'PUT' });
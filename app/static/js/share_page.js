@@ -224,10 +224,11 @@ window.SharePage = {
             let errorIcon = error.icon || 'cloud_off'; // Get icon from error or use default
             if (error.status === 404 || error.status === 410) { displayError = "Link invalid, expired, or revoked."; this.stopPolling(); errorIcon = 'link_off'; }
             else if (error.status === 503) { displayError = "Location data temporarily unavailable."; errorIcon = 'sync_problem'; }
+            else if (error.status === 429) { displayError = "This link is busy right now. Retrying shortly..."; errorIcon = 'hourglass_top'; }
             else if (error.status === 500) { displayError = "Server error retrieving location."; errorIcon = 'dns'; } // Generic server error
 
             this.UI.displayMessage(displayError, true, false, errorIcon); // Show error, no spinner, pass icon
-            if (this.UI.elements.infoCard) this.UI.elements.infoCard.classList.remove('visible');
+            if (error.status !== 429 && this.UI.elements.infoCard) this.UI.elements.infoCard.classList.remove('visible'); // Keep last position while throttled
         }
     },
 
@@ -786,6 +786,8 @@ window.AppUI = {
     },
 
     // --- NEW: Notification History Rendering ---
+    NOTIFICATION_HISTORY_PAGE_SIZE: 50,
+
     renderNotificationHistory: async function () {
         const listContainer = document.getElementById('notifications-history-list');
         const loadingIndicator = document.getElementById('notifications-history-loading');
@@ -800,73 +802,18 @@ window.AppUI = {
         markAllReadButton.onclick = null; clearAllButton.onclick = null;
 
         try {
-            const history = await AppApi.fetchNotificationHistory();
-            if (!Array.isArray(history)) {
-                console.error("Received non-array data for notification history:", history);
+            const page = await AppApi.fetchNotificationHistory({ limit: this.NOTIFICATION_HISTORY_PAGE_SIZE });
+            if (!page || !Array.isArray(page.items)) {
+                console.error("Received invalid data for notification history:", page);
                 throw new Error("Invalid data format received for history.");
             }
 
-            if (history.length === 0) {
+            if (page.items.length === 0) {
                 noItemsMessage.style.display = 'block'; markAllReadButton.disabled = true; clearAllButton.disabled = true;
             } else {
-                listContainer.style.display = 'block'; let hasUnread = false;
-                history.forEach(item => {
-                    const itemElement = document.createElement('div');
-                    itemElement.classList.add('notification-item');
-                    itemElement.dataset.id = item.id;
-                    const notificationType = item.data?.type || 'unknown';
-                    itemElement.dataset.type = notificationType;
-
-                    if (!item.is_read) { itemElement.classList.add('unread'); hasUnread = true; }
-
-                    let icon = 'notifications'; // Default icon
-
-                    // --- Icon Determination Logic (Keep this) ---
-                    if (notificationType === 'geofence') {
-                        const eventType = item.data?.eventType;
-                        if (eventType === 'entry') { icon = 'input_circle'; }
-                        else if (eventType === 'exit') { icon = 'output_circle'; }
-                        else { icon = 'location_searching'; }
-                    } else {
-                        switch (notificationType) {
-                            case 'battery': icon = 'battery_alert'; break;
-                            case 'welcome': icon = 'celebration'; break;
-                            case 'test': icon = 'labs'; break;
-                            default: icon = 'notifications';
-                        }
-                    }
-                    // --- --------------------------------- ---
-
-                    const timestampISO = item.timestamp || '';
-                    const displayTimestamp = item.timestamp_formatted || (timestampISO ? AppUtils.formatTime(new Date(timestampISO)) : 'Unknown time');
-
-                    // --- START: Use material-symbols-outlined ---
-                    itemElement.innerHTML = `
-                        <div class="notification-icon">
-                            <span class="material-symbols-outlined">${icon}</span>
-                        </div>
-                        <div class="notification-content">
-                            <div class="notification-title">${item.title || 'Notification'}</div>
-                            <div class="notification-body">${item.body || '(No body)'}</div>
-                            <div class="notification-timestamp" data-timestamp="${timestampISO}">${displayTimestamp}</div>
-                        </div>
-                        <div class="notification-actions">
-                            <button class="mark-read-unread-button" title="${item.is_read ? 'Mark as Unread' : 'Mark as Read'}" data-id="${item.id}" data-current-status="${item.is_read}">
-                                <span class="material-symbols-outlined">${item.is_read ? 'mark_chat_unread' : 'mark_chat_read'}</span>
-                            </button>
-                            <button class="delete-notification-button" title="Delete Notification" data-id="${item.id}">
-                                <span class="material-symbols-outlined">delete_outline</span>
-                            </button>
-                        </div>
-                    `;
-                    // --- END: Use material-symbols-outlined ---
-
-                    // Attach listeners
-                    itemElement.querySelector('.mark-read-unread-button').addEventListener('click', (e) => { e.stopPropagation(); this.handleMarkNotificationReadUnread(item.id, !item.is_read); });
-                    itemElement.querySelector('.delete-notification-button').addEventListener('click', (e) => { e.stopPropagation(); this.handleDeleteNotification(item.id, item.title); });
-                    listContainer.appendChild(itemElement);
-                });
-                markAllReadButton.disabled = !hasUnread; clearAllButton.disabled = false;
+                listContainer.style.display = 'block';
+                this.appendNotificationHistoryPage(listContainer, page);
+                markAllReadButton.disabled = !(page.unread_count > 0); clearAllButton.disabled = false;
                 markAllReadButton.onclick = () => this.handleMarkAllRead();
                 clearAllButton.onclick = () => this.handleClearAllHistory();
             }
@@ -878,6 +825,87 @@ window.AppUI = {
         }
     },
 
+    /** Appends one page of history items plus a "Load more" button when more pages exist. */
+    appendNotificationHistoryPage: function (listContainer, page) {
+        listContainer.querySelector('.notification-load-more')?.remove();
+        page.items.forEach(item => listContainer.appendChild(this.createNotificationItemElement(item)));
+
+        if (page.next_cursor) {
+            const loadMoreButton = document.createElement('button');
+            loadMoreButton.classList.add('text-button', 'notification-load-more');
+            loadMoreButton.textContent = 'Load more';
+            loadMoreButton.addEventListener('click', async () => {
+                loadMoreButton.disabled = true;
+                try {
+                    const nextPage = await AppApi.fetchNotificationHistory({ limit: this.NOTIFICATION_HISTORY_PAGE_SIZE, cursor: page.next_cursor });
+                    this.appendNotificationHistoryPage(listContainer, nextPage);
+                } catch (error) {
+                    console.error("Error loading more notification history:", error);
+                    loadMoreButton.disabled = false;
+                    this.showErrorDialog("Load Failed", `Could not load more notifications: ${error.message}`);
+                }
+            });
+            listContainer.appendChild(loadMoreButton);
+        }
+    },
+
+    createNotificationItemElement: function (item) {
+        const itemElement = document.createElement('div');
+        itemElement.classList.add('notification-item');
+        itemElement.dataset.id = item.id;
+        const notificationType = item.data?.type || 'unknown';
+        itemElement.dataset.type = notificationType;
+
+        if (!item.is_read) { itemElement.classList.add('unread'); }
+
+        let icon = 'notifications'; // Default icon
+
+        // --- Icon Determination Logic (Keep this) ---
+        if (notificationType === 'geofence') {
+            const eventType = item.data?.eventType;
+            if (eventType === 'entry') { icon = 'input_circle'; }
+            else if (eventType === 'exit') { icon = 'output_circle'; }
+            else { icon = 'location_searching'; }
+        } else {
+            switch (notificationType) {
+                case 'battery': icon = 'battery_alert'; break;
+                case 'welcome': icon = 'celebration'; break;
+                case 'test': icon = 'labs'; break;
+                default: icon = 'notifications';
+            }
+        }
+        // --- --------------------------------- ---
+
+        const timestampISO = item.timestamp || '';
+        const displayTimestamp = item.timestamp_formatted || (timestampISO ? AppUtils.formatTime(new Date(timestampISO)) : 'Unknown time');
+
+        // --- START: Use material-symbols-outlined ---
+        itemElement.innerHTML = `
+            <div class="notification-icon">
+                <span class="material-symbols-outlined">${icon}</span>
+            </div>
+            <div class="notification-content">
+                <div class="notification-title">${item.title || 'Notification'}</div>
+                <div class="notification-body">${item.body || '(No body)'}</div>
+                <div class="notification-timestamp" data-timestamp="${timestampISO}">${displayTimestamp}</div>
+            </div>
+            <div class="notification-actions">
+                <button class="mark-read-unread-button" title="${item.is_read ? 'Mark as Unread' : 'Mark as Read'}" data-id="${item.id}" data-current-status="${item.is_read}">
+                    <span class="material-symbols-outlined">${item.is_read ? 'mark_chat_unread' : 'mark_chat_read'}</span>
+                </button>
+                <button class="delete-notification-button" title="Delete Notification" data-id="${item.id}">
+                    <span class="material-symbols-outlined">delete_outline</span>
+                </button>
+            </div>
+        `;
+        // --- END: Use material-symbols-outlined ---
+
+        // Attach listeners
+        itemElement.querySelector('.mark-read-unread-button').addEventListener('click', (e) => { e.stopPropagation(); this.handleMarkNotificationReadUnread(item.id, !item.is_read); });
+        itemElement.querySelector('.delete-notification-button').addEventListener('click', (e) => { e.stopPropagation(); this.handleDeleteNotification(item.id, item.title); });
+        return itemElement;
+    },
+
     handleMarkNotificationReadUnread: async function (notificationId, markAsRead) {
         console.log(`[UI] Marking notification ${notificationId} as ${markAsRead ? 'read' : 'unread'}`);
         const itemElement = document.querySelector(`.notification-item[data-id="${notificationId}"]`);
@@ -952,7 +980,6 @@ window.AppUI = {
     handleMarkAllRead: async function () {
         console.log("[UI] Marking all notifications as read...");
         const unreadItems = document.querySelectorAll('#notifications-history-list .notification-item.unread');
-        if (unreadItems.length === 0) return;
 
         const markAllBtn = document.getElementById('mark-all-read-button');
         markAllBtn.disabled = true;
@@ -970,11 +997,9 @@ window.AppUI = {
             if (titleEl) titleEl.style.fontWeight = 'normal';
         });
 
-        // Then send API requests (can be done concurrently)
-        const promises = Array.from(unreadItems).map(item => AppApi.markNotificationRead(item.dataset.id));
-
+        // Then send a single API request (also covers pages not loaded yet)
         try {
-            await Promise.all(promises);
+            await AppApi.markAllNotificationsRead();
             console.log("[UI] Mark all read API calls completed.");
         } catch (error) {
             console.error("Error marking all notifications read:", error);
@@ -223,5 +223,51 @@ window.AppUtils = {
         }
 
         return [mappedBatteryLevel, batteryStatusStr];
+    },
+
+    // Decodes a Google encoded polyline into [[lat, lon], ...] (precision = decimal places)
+    decodePolyline: function (encoded, precision = 6) {
+        const factor = Math.pow(10, precision);
+        const points = [];
+        let index = 0, lat = 0, lon = 0;
+        while (index < encoded.length) {
+            const deltas = [0, 0];
+            for (let k = 0; k < 2; k++) {
+                let shift = 0, result = 0, byte;
+                do {
+                    byte = encoded.charCodeAt(index++) - 63;
+                    result |= (byte & 0x1f) << shift;
+                    shift += 5;
+                } while (byte >= 0x20);
+                deltas[k] = (result & 1) ? ~(result >> 1) : (result >> 1);
+            }
+            lat += deltas[0]; lon += deltas[1];
+            points.push([lat / factor, lon / factor]);
+        }
+        return points;
+    },
+
+    // Expands a `reports_compact` document (see app/utils/report_encoding.py) into report objects
+    decodeCompactReports: function (doc) {
+        if (!doc || typeof doc !== 'object') return [];
+        const count = doc.n || 0;
+        const coords = this.decodePolyline(doc.ll || '', doc.p || 6);
+        const missing = new Set(doc.llx || []);
+        const undelta = (deltas) => { let prev = 0; return (deltas || []).map(d => { if (d === null) return null; prev += d; return prev; }); };
+        const toIso = (ms) => (ms === null || ms === undefined) ? null : new Date(ms).toISOString();
+        const timestamps = undelta(doc.t);
+        const published = undelta(doc.pt);
+        const columns = Object.entries(doc.cols || {});
+        const reports = new Array(count);
+        let coordIndex = 0;
+        for (let i = 0; i < count; i++) {
+            const point = missing.has(i) ? [null, null] : coords[coordIndex++];
+            const report = { timestamp: toIso(timestamps[i]), published_at: toIso(published[i]), lat: point[0], lon: point[1] };
+            for (const [name, column] of columns) {
+                report[name] = Array.isArray(column) ? column[i] : column.c;
+            }
+            reports[i] = report;
+        }
+        return reports;
     }
 };
\ No newline at end of file
@@ -0,0 +1,192 @@
+# app/utils/change_feed.py
+# File-based change notifications between web processes and the standalone fetch worker.
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, Iterable
+
+from .json_utils import dumps_bytes, loads
+
+try:
+    import fcntl  # POSIX only; appends are still single O_APPEND writes without it
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# Event types
+FETCH_REQUESTED = "fetch_requested"  # web -> worker: fetch this user now
+FETCH_COMPLETED = "fetch_completed"  # worker -> web: this user's data changed
+
+MAX_LINE_BYTES = 64 * 1024  # Longer (corrupt/unterminated) lines are skipped
+
+
+def feed_path(config: Dict[str, Any]) -> Path:
+    return Path(config.get("CHANGE_FEED_FILE") or Path(config["DATA_DIRECTORY"]) / "change_feed.jsonl")
+
+
+def _open_locked(path: Path) -> int:
+    """
+    Opens the current feed file for appending, holding its flock. A publisher
+    that waited on the lock while another one rotated holds the renamed file,
+    which subscribers have already left: reopen until the locked file is the
+    one at `path`.
+    """
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if not fcntl:
+            return fd
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            current_inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            current_inode = None  # Rotated away and not recreated yet
+        except OSError:
+            os.close(fd)
+            raise
+        if os.fstat(fd).st_ino == current_inode:
+            return fd
+        os.close(fd)
+
+
+def publish(config: Dict[str, Any], event_type: str, **fields) -> bool:
+    """
+    Appends one event line to the feed (rotating it to <file>.1 past
+    CHANGE_FEED_MAX_BYTES). Events are hints: the data store stays the source
+    of truth, so a failed publish is logged and otherwise ignored.
+
+    Returns:
+        True if the event was written.
+    """
+    path = feed_path(config)
+    max_bytes = int(config.get("CHANGE_FEED_MAX_BYTES", 1024 * 1024))
+    line = dumps_bytes({"type": event_type, "ts": time.time(), "pid": os.getpid(), **fields}) + b"\n"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = _open_locked(path)
+        try:
+            if max_bytes > 0 and os.fstat(fd).st_size + len(line) > max_bytes:
+                os.replace(path, path.with_name(path.name + ".1"))
+                os.close(fd)  # Unlocks the rotated file
+                fd = -1
+                fd = _open_locked(path)
+            os.write(fd, line)
+        finally:
+            if fd >= 0:
+                os.close(fd)
+        return True
+    except OSError as e:
+        log.error(f"Failed to publish '{event_type}' event to {path}: {e}")
+        return False
+
+
+class ChangeFeedSubscriber:
+    """
+    Tails the feed file in a daemon thread and calls `handler(event)` for every
+    new event of the wanted types (like `tail -F`: follows rotation, finishing
+    the old file first). Only events appended after start() are delivered.
+    """
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        handler: Callable[[Dict[str, Any]], None],
+        event_types: Optional[Iterable[str]] = None,
+        name: str = "ChangeFeed",
+    ):
+        self.path = feed_path(config)
+        self.poll_seconds = max(0.01, int(config.get("CHANGE_FEED_POLL_MS", 250)) / 1000.0)
+        self.handler = handler
+        self.event_types = set(event_types) if event_types else None
+        self.name = name
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._inode: Optional[int] = None
+        self._partial = b""
+
+    def _open(self, seek_end: bool):
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        if seek_end:
+            f.seek(0, os.SEEK_END)
+        self._file = f
+        self._inode = os.fstat(f.fileno()).st_ino
+        self._partial = b""
+
+    def _drain(self):
+        """Delivers every complete line appended since the last call."""
+        chunk = self._file.read()
+        if not chunk:
+            return
+        data = self._partial + chunk
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        if len(self._partial) > MAX_LINE_BYTES:
+            self._partial = b""
+        for line in lines:
+            if not line:
+                continue
+            try:
+                event = loads(line)
+            except ValueError:
+                log.warning(f"{self.name}: Skipping unreadable event line in {self.path}.")
+                continue
+            if not isinstance(event, dict) or (self.event_types and event.get("type") not in self.event_types):
+                continue
+            try:
+                self.handler(event)
+            except Exception:
+                log.exception(f"{self.name}: Handler failed for event {event.get('type')}")
+
+    def poll(self):
+        """One tail step (called by the thread; usable directly in tests)."""
+        if self._file is None:
+            self._open(seek_end=False)  # Created after start(): everything in it is new
+            if self._file is None:
+                return
+        self._drain()
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if st.st_ino != self._inode:  # Rotated: finish the old file, continue with the new one
+            self._drain()  # Lines appended between the drain above and the stat()
+            self._file.close()
+            self._file = None
+            self._open(seek_end=False)
+            if self._file is not None:
+                self._drain()
+        elif st.st_size < self._file.tell():  # Truncated
+            self._file.seek(0)
+            self._partial = b""
+
+    def _loop(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.poll()
+            except OSError as e:
+                log.warning(f"{self.name}: Reading {self.path} failed ({e}); retrying.")
+                if self._file is not None:
+                    self._file.close()
+                self._file = None
+
+    def start(self) -> "ChangeFeedSubscriber":
+        self._open(seek_end=True)
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+        log.info(f"{self.name}: Listening for changes on {self.path}")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_seconds * 4)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
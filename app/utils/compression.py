@@ -0,0 +1,136 @@
+# app/utils/compression.py
+# gzip / Brotli response compression with reusable precompressed bodies.
+
+import gzip
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any
+
+from flask import request
+
+try:
+    import brotli  # Optional; gzip only without it
+except ImportError:
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "image/svg+xml"}
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Parses an Accept-Encoding header into {coding: q}."""
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        piece = part.strip()
+        if not piece:
+            continue
+        coding, _, params = piece.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Picks "br" (if Brotli is installed) or "gzip" from an Accept-Encoding header."""
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def compress_bytes(data: bytes, encoding: str, config: Dict[str, Any]) -> bytes:
+    """Compresses data with the given content-coding ("gzip" or "br")."""
+    if encoding == "br":
+        return brotli.compress(data, quality=int(config.get("RESPONSE_BROTLI_QUALITY", 5)))
+    # mtime=0 keeps output deterministic for identical bodies
+    return gzip.compress(data, compresslevel=int(config.get("RESPONSE_GZIP_LEVEL", 6)), mtime=0)
+
+
+class PrecompressedBody:
+    """
+    A response body kept with its compressed variants, so a cached payload is
+    compressed once per encoding instead of once per request.
+    """
+
+    def __init__(self, data: bytes, mimetype: str = "application/json"):
+        self.data = data
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(data).hexdigest()
+        self._variants: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def variant(self, encoding: str, config: Dict[str, Any]) -> bytes:
+        """Returns the body compressed with `encoding`, computing it on first use."""
+        cached = self._variants.get(encoding)
+        if cached is not None:
+            return cached
+        with self._lock:
+            cached = self._variants.get(encoding)
+            if cached is None:
+                cached = compress_bytes(self.data, encoding, config)
+                self._variants[encoding] = cached
+        return cached
+
+
+def init_compression(app):
+    """
+    Registers an after_request hook that compresses JSON and SVG responses above
+    RESPONSE_COMPRESSION_MIN_BYTES for clients that accept gzip/br.
+
+    Views may set `response.precompressed = PrecompressedBody(...)` (whose data is
+    the response body) to reuse stored compressed variants.
+    """
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if not config.get("RESPONSE_COMPRESSION_ENABLED", True):
+            return response
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code >= 300
+            or response.status_code == 204
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        precompressed = getattr(response, "precompressed", None)
+        size = len(precompressed.data) if precompressed else response.calculate_content_length()
+        if size is None or size < int(config.get("RESPONSE_COMPRESSION_MIN_BYTES", 1024)):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+        if not encoding:
+            return response
+
+        try:
+            if precompressed:
+                body = precompressed.variant(encoding, config)
+            else:
+                body = compress_bytes(response.get_data(), encoding, config)
+        except Exception as e:
+            log.error(f"Response compression ({encoding}) failed: {e}")
+            return response
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        # The representation changed; a strong validator must not be shared with the identity body
+        etag, is_weak = response.get_etag()
+        if etag and not is_weak:
+            response.set_etag(etag, weak=True)
+        return response
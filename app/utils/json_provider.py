@@ -0,0 +1,60 @@
+# app/utils/json_provider.py
+# Flask JSON provider that encodes responses with orjson when it is installed.
+
+import logging
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+from .json_utils import orjson
+
+log = logging.getLogger(__name__)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Drop-in replacement for Flask's DefaultJSONProvider.
+
+    jsonify()/response() encode straight to bytes with orjson (no str round trip),
+    keeping Flask's behaviour: sorted keys, compact output unless debugging, and
+    the same `default` hook for dates, UUIDs, decimals and dataclasses. Without
+    orjson every call falls through to the stdlib implementation.
+    """
+
+    def _orjson_option(self, indent: bool) -> int:
+        # Datetimes go through `default` so they keep Flask's HTTP-date format
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)  # Custom json.dumps options: stdlib path
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._orjson_option(False)).decode("utf-8")
+        except TypeError:
+            # e.g. integers beyond 64 bits, which orjson refuses; stdlib handles them
+            return super().dumps(obj)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            body = orjson.dumps(
+                obj,
+                default=self.default,
+                option=self._orjson_option(indent) | orjson.OPT_APPEND_NEWLINE,
+            )
+        except TypeError:
+            return super().response(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
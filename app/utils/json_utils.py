@@ -3,11 +3,63 @@ import json
 import os
 import logging
 import threading
+import time
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
+
+try:
+    import orjson  # Optional fast path; everything falls back to stdlib json without it
+except ImportError:
+    orjson = None
+
+from .metrics import (
+    JSON_LOAD_BYTES,
+    JSON_LOAD_LATENCY,
+    JSON_SAVE_BYTES,
+    JSON_SAVE_LATENCY,
+    document_label,
+)
+from .slow_log import note_file
 
 log = logging.getLogger(__name__)
 
+JSON_BACKEND = "orjson" if orjson else "json"
+
+
+def dumps_bytes(data: Any, indent: Optional[int] = None, sort_keys: bool = False) -> bytes:
+    """
+    Serializes data to UTF-8 JSON bytes, using orjson when it is installed.
+
+    Args:
+        data: The object to serialize.
+        indent: None for compact output (machine-owned files), or an indent level.
+            orjson only supports 2; other levels use stdlib json so hand-edited
+            files keep their existing layout.
+        sort_keys: Whether to sort object keys.
+
+    Returns:
+        The encoded JSON document.
+    """
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, option=option)
+    separators = (",", ":") if indent is None else None
+    return json.dumps(
+        data, indent=indent, ensure_ascii=False, separators=separators, sort_keys=sort_keys
+    ).encode("utf-8")
+
+
+def loads(raw: Union[bytes, bytearray, str]) -> Any:
+    """Parses a JSON document (orjson when available). Raises json.JSONDecodeError on bad input."""
+    if orjson is not None:
+        return orjson.loads(raw)  # orjson.JSONDecodeError subclasses json.JSONDecodeError
+    return json.loads(raw)
+
+
 def save_json_atomic(file_path: Path, data: Dict[str, Any], lock: threading.Lock, indent: Optional[int] = 2):
     """
     Atomically saves a dictionary to a JSON file using a temporary file and a lock.
@@ -16,7 +68,8 @@ def save_json_atomic(file_path: Path, data: Dict[str, Any], lock: threading.Lock
         file_path: The final path for the JSON file.
         data: The dictionary data to save.
         lock: The threading lock specific to this file/resource.
-        indent: The indentation level for the JSON file (default: 2). Use None for no indentation.
+        indent: The indentation level for the JSON file (default: 2). Use None for no
+            indentation (preferred for machine-owned files: smaller and faster to write).
     """
     temp_file_path = None
     try:
@@ -27,16 +80,23 @@ def save_json_atomic(file_path: Path, data: Dict[str, Any], lock: threading.Lock
         # Depending on severity, you might want to raise this exception
         return # Or raise e
 
-    with lock:
+    document = document_label(file_path)
+    with lock:  # FILE_LOCKS are InstrumentedLocks; they record their own wait/hold times
         try:
+            save_start = time.perf_counter()
             # Use a unique temporary file name in the same directory
             temp_file_path = file_path.with_suffix(f".{os.getpid()}.tmp")
 
-            with open(temp_file_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=indent, ensure_ascii=False) # ensure_ascii=False for proper unicode
+            payload = dumps_bytes(data, indent=indent) # UTF-8, non-ASCII kept as-is
+            with open(temp_file_path, "wb") as f:
+                f.write(payload)
 
             # Atomic replace operation
             os.replace(temp_file_path, file_path)
+            save_seconds = time.perf_counter() - save_start
+            JSON_SAVE_LATENCY.observe(save_seconds, document=document)
+            JSON_SAVE_BYTES.observe(len(payload), document=document)
+            note_file("write", file_path, len(payload), save_seconds)
             log.debug(f"Successfully saved data to {file_path}")
 
         except (IOError, OSError, json.JSONDecodeError) as e:
@@ -71,6 +131,7 @@ def load_json_file(file_path: Path, lock: threading.Lock) -> Optional[Dict[str,
     Returns:
         The loaded dictionary, or None if the file doesn't exist, is empty, or invalid.
     """
+    document = document_label(file_path)
     with lock:
         if not file_path.exists():
             log.debug(f"JSON file not found: {file_path}")
@@ -80,8 +141,14 @@ def load_json_file(file_path: Path, lock: threading.Lock) -> Optional[Dict[str,
              return None # Treat empty file as non-existent/invalid
 
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            load_start = time.perf_counter()
+            with open(file_path, "rb") as f:
+                raw = f.read()
+            data = loads(raw)
+            load_seconds = time.perf_counter() - load_start
+            JSON_LOAD_LATENCY.observe(load_seconds, document=document)
+            JSON_LOAD_BYTES.observe(len(raw), document=document)
+            note_file("read", file_path, len(raw), load_seconds)
 
             if not isinstance(data, dict):
                 log.warning(f"Invalid format (not a dict) in {file_path}. Content: {str(data)[:100]}...")
@@ -0,0 +1,230 @@
+# app/utils/lock_stats.py
+# Drop-in threading.Lock replacement that records wait/hold times and contention.
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+try:
+    import fcntl  # POSIX only; cross-process locks degrade to process-local locking without it
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from .metrics import Counter, Histogram, LOCK_WAIT
+from .slow_log import note_lock_wait
+
+log = logging.getLogger(__name__)
+
+LOCK_HOLD = Histogram("findmy_lock_hold_seconds", "Time a lock was held.", ("lock",))
+LOCK_CONTENDED = Counter(
+    "findmy_lock_contended_total", "Acquisitions that found the lock already held.", ("lock",)
+)
+
+FLOCK_POLL_SECONDS = 0.005  # Retry interval for non-blocking/timed cross-process acquires
+
+# Every instrumented lock by name (for the debug endpoint)
+_locks: Dict[str, "InstrumentedLock"] = {}
+_locks_guard = threading.Lock()
+
+
+class InstrumentedLock:
+    """
+    A non-reentrant lock with the threading.Lock interface that tracks the
+    current holder, current waiters, acquisition/contention counts and
+    wait/hold times (also exported as findmy_lock_* metrics).
+
+    With `path`, the lock is also held across processes: after the in-process
+    lock, acquire() takes an exclusive flock on that file (one descriptor per
+    process, reopened after fork since flock belongs to the open file). Time
+    spent waiting for another process counts as contended wait.
+
+    Bookkeeping is guarded by a private lock held only for a few dict
+    operations, never while waiting on the wrapped lock.
+    """
+
+    def __init__(self, name: str, path: Optional[Path] = None):
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = threading.Lock()
+        self._holder: Optional[Tuple[int, str, float]] = None  # (ident, thread name, acquired at)
+        self._waiters: Dict[int, Tuple[str, float]] = {}  # ident -> (thread name, waiting since)
+        self.acquisitions = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_hold = 0.0
+        self.max_hold = 0.0
+        self.path: Optional[Path] = None
+        self._fd: Optional[int] = None
+        self._fd_pid: Optional[int] = None
+        if path is not None:
+            if fcntl is None:
+                log.warning(f"Lock '{name}': fcntl unavailable, lock is process-local only.")
+            else:
+                self.path = Path(path)
+        with _locks_guard:
+            _locks[name] = self
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        start = time.perf_counter()
+        contended = False
+        if not self._lock.acquire(False):  # Uncontended fast path
+            if not blocking:
+                return False
+            contended = True
+            if not self._wait(lambda: self._lock.acquire(True, timeout)):
+                return False
+
+        if self.path is not None:
+            try:
+                held = self._flock(False)
+                if not held and blocking:
+                    contended = True
+                    remaining = -1 if timeout < 0 else max(0.0, timeout - (time.perf_counter() - start))
+                    held = self._wait(lambda: self._flock(True, remaining))
+            except BaseException:
+                self._lock.release()
+                raise
+            if not held:
+                self._lock.release()
+                return False
+
+        self._acquired(time.perf_counter() - start if contended else 0.0, contended=contended)
+        return True
+
+    def _wait(self, acquire) -> bool:
+        """Runs a blocking acquire with the current thread listed as a waiter."""
+        thread = threading.current_thread()
+        with self._state:
+            self._waiters[thread.ident] = (thread.name, time.time())
+        try:
+            return acquire()
+        finally:
+            with self._state:
+                self._waiters.pop(thread.ident, None)
+
+    def _lock_file(self) -> int:
+        """This process's descriptor for the lock file. Caller holds the in-process lock."""
+        pid = os.getpid()
+        if self._fd is None or self._fd_pid != pid:
+            if self._fd is not None:
+                try:
+                    os.close(self._fd)  # Inherited across fork: shares the parent's flock
+                except OSError:
+                    pass
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._fd_pid = pid
+        return self._fd
+
+    def _flock(self, blocking: bool, timeout: float = -1) -> bool:
+        """Takes the cross-process file lock. Caller holds the in-process lock."""
+        fd = self._lock_file()
+        if blocking and timeout < 0:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return True
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if not blocking or time.monotonic() >= deadline:
+                    return False
+            time.sleep(FLOCK_POLL_SECONDS)
+
+    def _acquired(self, waited: float, contended: bool):
+        thread = threading.current_thread()
+        with self._state:
+            self._holder = (thread.ident, thread.name, time.perf_counter())
+            self.acquisitions += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            if contended:
+                self.contended += 1
+        LOCK_WAIT.observe(waited, lock=self.name)
+        if contended:
+            LOCK_CONTENDED.inc(lock=self.name)
+            note_lock_wait(self.name, waited)
+
+    def release(self):
+        with self._state:
+            holder = self._holder
+            self._holder = None
+            held = time.perf_counter() - holder[2] if holder else 0.0
+            self.total_hold += held
+            self.max_hold = max(self.max_hold, held)
+        if self.path is not None and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+        LOCK_HOLD.observe(held, lock=self.name)
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def __repr__(self):
+        return f"<InstrumentedLock {self.name!r} {'locked' if self.locked() else 'unlocked'}>"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current holder/waiters and cumulative statistics."""
+        now_perf, now = time.perf_counter(), time.time()
+        with self._state:
+            holder = self._holder
+            waiters = sorted(self._waiters.values(), key=lambda w: w[1])
+            acquisitions = self.acquisitions
+            stats = {
+                "acquisitions": acquisitions,
+                "contended": self.contended,
+                "contention_ratio": round(self.contended / acquisitions, 4) if acquisitions else 0.0,
+                "avg_wait_ms": round(self.total_wait / acquisitions * 1000, 3) if acquisitions else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "avg_hold_ms": round(self.total_hold / acquisitions * 1000, 3) if acquisitions else 0.0,
+                "max_hold_ms": round(self.max_hold * 1000, 3),
+            }
+        return {
+            "name": self.name,
+            "file": str(self.path) if self.path else None,
+            "holder": (
+                {"thread": holder[1], "held_ms": round((now_perf - holder[2]) * 1000, 3)} if holder else None
+            ),
+            "waiters": [{"thread": name, "waiting_ms": round((now - since) * 1000, 3)} for name, since in waiters],
+            **stats,
+        }
+
+
+def init_file_locks(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Makes every FILE_LOCKS entry an InstrumentedLock (entries still None or the
+    plain threading.Locks config.py creates at import). With CROSS_PROCESS_LOCKS
+    each one also locks LOCK_DIRECTORY/<name>.lock (default <DATA_DIRECTORY>/.locks).
+    Existing InstrumentedLocks are kept, so calling this twice is harmless.
+    """
+    locks = config["FILE_LOCKS"]
+    lock_dir = None
+    if config.get("CROSS_PROCESS_LOCKS"):
+        lock_dir = Path(config.get("LOCK_DIRECTORY") or Path(config["DATA_DIRECTORY"]) / ".locks")
+    for key, lock in locks.items():
+        if not isinstance(lock, InstrumentedLock):
+            locks[key] = InstrumentedLock(key, lock_dir / f"{key}.lock" if lock_dir else None)
+    if lock_dir:
+        log.info(f"File locks are cross-process (lock files in {lock_dir}).")
+    return locks
+
+
+def lock_snapshots() -> List[Dict[str, Any]]:
+    """Snapshots of all instrumented locks, most contended first."""
+    with _locks_guard:
+        locks = list(_locks.values())
+    snapshots = [lock.snapshot() for lock in locks]
+    snapshots.sort(key=lambda s: (len(s["waiters"]), s["contended"]), reverse=True)
+    return snapshots
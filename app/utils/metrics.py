@@ -0,0 +1,268 @@
+# app/utils/metrics.py
+# In-process metrics with a Prometheus text-format /metrics endpoint.
+
+import hmac
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+log = logging.getLogger(__name__)
+
+# Latency buckets (seconds) shared by the histograms below
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic counter."""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        self._values: Dict[Tuple[str, ...], float] = {}
+        super().__init__(*args, **kwargs)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Point-in-time value; either set explicitly or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+        super().__init__(*args, **kwargs)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        """Registers a callback returning {label values tuple: value}, evaluated per scrape."""
+        self._callback = callback
+
+    def samples(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                values = dict(self._callback())
+            except Exception as e:
+                log.warning(f"Metric {self.name} callback failed: {e}")
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+            for k, v in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram (Prometheus semantics)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # key -> [bucket counts..., sum, count]
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 2)
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the with-block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class _Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} registered twice")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = _Registry()
+
+# --- Fetch ---
+FETCH_DURATION = Histogram(
+    "findmy_user_fetch_duration_seconds", "Duration of one user's background fetch task.", ("outcome",)
+)
+FETCH_REPORTS_LATENCY = Histogram(
+    "findmy_fetch_reports_duration_seconds", "Latency of account.fetch_reports calls.", ("source",)
+)
+FETCH_REPORTS_COUNT = Histogram(
+    "findmy_fetch_reports_count", "Reports returned per fetch_reports call.", ("source",), buckets=COUNT_BUCKETS
+)
+# --- Storage ---
+JSON_LOAD_LATENCY = Histogram("findmy_json_load_duration_seconds", "JSON file load latency.", ("document",))
+JSON_SAVE_LATENCY = Histogram("findmy_json_save_duration_seconds", "JSON file save latency.", ("document",))
+JSON_LOAD_BYTES = Histogram("findmy_json_load_bytes", "Size of loaded JSON files.", ("document",), buckets=SIZE_BUCKETS)
+JSON_SAVE_BYTES = Histogram("findmy_json_save_bytes", "Size of saved JSON files.", ("document",), buckets=SIZE_BUCKETS)
+LOCK_WAIT = Histogram("findmy_lock_wait_seconds", "Time spent waiting to acquire a lock.", ("lock",))  # See lock_stats
+# --- Push ---
+PUSH_LATENCY = Histogram("findmy_push_delivery_duration_seconds", "Web push request latency.", ("outcome",))
+PUSH_RESULTS = Counter("findmy_push_deliveries_total", "Web push delivery outcomes.", ("outcome",))
+# --- Scheduler ---
+SCHEDULER_JOBS = Gauge("findmy_scheduler_jobs", "Jobs registered with the background scheduler.")
+FETCH_TASKS_RUNNING = Gauge("findmy_fetch_tasks_running", "Per-user fetch tasks currently running.")
+FETCH_TASKS_RUNNING.set(0)  # Exported before the first fetch (inc/dec in run_fetch_for_user_task)
+# --- HTTP ---
+REQUEST_LATENCY = Histogram(
+    "findmy_http_request_duration_seconds", "HTTP request latency by endpoint.", ("endpoint", "method", "status")
+)
+
+
+def document_label(file_path) -> str:
+    """Bounded label for a JSON file: its name (per-user files share names across users)."""
+    return getattr(file_path, "name", None) or str(file_path).rsplit("/", 1)[-1]
+
+
+def init_metrics(app, scheduler=None):
+    """
+    Registers request timing hooks and, when METRICS_TOKEN is set, the /metrics
+    endpoint (Prometheus text format, `Authorization: Bearer <METRICS_TOKEN>`).
+
+    Args:
+        app: The Flask app.
+        scheduler: The background scheduler (for the job count gauge).
+    """
+    from flask import Response, abort, g, request  # Keeps the metric objects importable without Flask
+
+    if scheduler is not None:
+        SCHEDULER_JOBS.set_function(lambda: {(): len(scheduler.get_jobs())})
+
+    @app.before_request
+    def start_request_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_latency(response):
+        start = getattr(g, "_metrics_start", None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                endpoint=endpoint,
+                method=request.method,
+                status=response.status_code,
+            )
+        return response
+
+    token = app.config.get("METRICS_TOKEN")
+    if not token:
+        log.info("METRICS_TOKEN not set; /metrics endpoint disabled.")
+        return
+
+    def metrics_view():
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied.encode("utf-8"), f"Bearer {token}".encode("utf-8")):
+            abort(401)
+        return Response(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+    app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
+    log.info("Metrics endpoint enabled at /metrics.")
@@ -0,0 +1,180 @@
+# app/utils/rate_limiting.py
+# Token-bucket rate limiting with an in-memory or shared-file bucket store.
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+
+try:
+    import fcntl  # POSIX only; the file store degrades to process-local locking without it
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# Sweep idle (refilled-to-full) buckets once a store holds more than this many keys
+MAX_BUCKETS_BEFORE_SWEEP = 10000
+
+
+def _refill(
+    state: Optional[Tuple[float, float]], capacity: float, refill_per_second: float, now: float
+) -> float:
+    """Returns the token count for a bucket at `now` (new buckets start full)."""
+    if state is None:
+        return capacity
+    tokens, updated_at = state
+    elapsed = max(0.0, now - updated_at)
+    return min(capacity, tokens + elapsed * refill_per_second)
+
+
+def _take_from(
+    buckets: Dict[str, Any],
+    key: str,
+    capacity: float,
+    refill_per_second: float,
+    cost: float,
+    now: float,
+) -> Tuple[bool, float]:
+    """
+    Applies one token-bucket take to a {key: [tokens, updated_at]} mapping in place.
+
+    Returns:
+        (allowed, retry_after_seconds). retry_after is 0.0 when allowed.
+    """
+    state = buckets.get(key)
+    tokens = _refill(tuple(state) if state else None, capacity, refill_per_second, now)
+    if tokens >= cost:
+        buckets[key] = [tokens - cost, now]
+        return True, 0.0
+    buckets[key] = [tokens, now]
+    if refill_per_second <= 0:
+        return False, float("inf")
+    return False, (cost - tokens) / refill_per_second
+
+
+def _sweep(buckets: Dict[str, Any], refill_times: Dict[str, float], now: float):
+    """Drops buckets that have been idle long enough to be full again."""
+    for key in list(buckets.keys()):
+        tokens, updated_at = buckets[key]
+        if now - updated_at >= refill_times.get(key, 0.0):
+            del buckets[key]
+
+
+class MemoryBucketStore:
+    """Process-local bucket store (the default)."""
+
+    def __init__(self):
+        self._buckets: Dict[str, Any] = {}
+        self._full_after: Dict[str, float] = {}  # key -> seconds for an empty bucket to refill
+        self._lock = threading.Lock()
+
+    def take(
+        self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0
+    ) -> Tuple[bool, float]:
+        now = time.time()
+        with self._lock:
+            if len(self._buckets) > MAX_BUCKETS_BEFORE_SWEEP:
+                _sweep(self._buckets, self._full_after, now)
+                self._full_after = {k: v for k, v in self._full_after.items() if k in self._buckets}
+            if refill_per_second > 0:
+                self._full_after[key] = capacity / refill_per_second
+            return _take_from(self._buckets, key, capacity, refill_per_second, cost, now)
+
+
+class FileBucketStore:
+    """
+    Bucket store shared between processes through one JSON file.
+
+    Every take is a locked read-modify-write (fcntl.flock on a sidecar .lock
+    file plus an in-process lock), so it costs disk I/O per request. Only use it
+    when several app processes must enforce a common limit.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            log.warning(f"Rate limit store {self.path} unreadable ({e}). Starting empty.")
+            return {}
+
+    def _write(self, buckets: Dict[str, Any]):
+        temp_path = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(buckets, f, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+    def take(
+        self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0
+    ) -> Tuple[bool, float]:
+        now = time.time()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.lock_path, "a+") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                document = self._read()
+                buckets = document.get("buckets", {})
+                full_after = document.get("full_after", {})
+                if len(buckets) > MAX_BUCKETS_BEFORE_SWEEP:
+                    _sweep(buckets, full_after, now)
+                    full_after = {k: v for k, v in full_after.items() if k in buckets}
+                if refill_per_second > 0:
+                    full_after[key] = capacity / refill_per_second
+                result = _take_from(buckets, key, capacity, refill_per_second, cost, now)
+                self._write({"buckets": buckets, "full_after": full_after})
+                return result
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+# One store per (backend, path) for the life of the process
+_stores: Dict[str, Any] = {}
+_stores_lock = threading.Lock()
+
+
+def get_bucket_store(config: Dict[str, Any]):
+    """
+    Returns the process-wide bucket store selected by PUBLIC_RATE_LIMIT_STORE
+    ("memory" or "file"; the file store uses PUBLIC_RATE_LIMIT_STORE_FILE).
+    """
+    backend = str(config.get("PUBLIC_RATE_LIMIT_STORE", "memory")).lower()
+    if backend == "file":
+        path = Path(
+            config.get("PUBLIC_RATE_LIMIT_STORE_FILE")
+            or Path(config["DATA_DIRECTORY"]) / "rate_limits.json"
+        )
+        store_key = f"file:{path}"
+    else:
+        if backend != "memory":
+            log.warning(f"Unknown PUBLIC_RATE_LIMIT_STORE '{backend}'. Using in-memory store.")
+        path = None
+        store_key = "memory"
+    with _stores_lock:
+        store = _stores.get(store_key)
+        if store is None:
+            store = FileBucketStore(path) if path else MemoryBucketStore()
+            _stores[store_key] = store
+            log.info(f"Public rate limiting using {store_key} bucket store.")
+        return store
+
+
+def retry_after_header(retry_after_seconds: float) -> str:
+    """Formats a Retry-After value (whole seconds, at least 1)."""
+    if math.isinf(retry_after_seconds):
+        return "3600"
+    return str(max(1, int(math.ceil(retry_after_seconds))))
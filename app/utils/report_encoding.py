@@ -0,0 +1,178 @@
+# app/utils/report_encoding.py
+# Compact (columnar) encoding of report histories for API responses.
+
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+
+log = logging.getLogger(__name__)
+
+COMPACT_VERSION = 1
+# Coordinate precision in decimal places (1e-6 deg is ~0.1 m, like "polyline6")
+COORD_PRECISION = 6
+# Fields with their own encodings; everything else becomes a generic column
+_COORD_KEYS = ("lat", "lon")
+_TIME_KEYS = ("timestamp", "published_at")
+
+
+def _iso_to_ms(value: Any) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(round(dt.timestamp() * 1000))
+    except (ValueError, TypeError):
+        return None
+
+
+def _ms_to_iso(value: Optional[int]) -> Optional[str]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).isoformat()
+
+
+def _encode_signed(value: int, out: List[str]):
+    """Appends one zigzag/5-bit-chunk encoded integer (Google polyline algorithm)."""
+    value = ~(value << 1) if value < 0 else (value << 1)
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode_polyline(points: List[Any], precision: int = COORD_PRECISION) -> str:
+    """Encodes (lat, lon) pairs as a Google encoded polyline string."""
+    factor = 10 ** precision
+    out: List[str] = []
+    prev_lat = prev_lon = 0
+    for lat, lon in points:
+        ilat = int(round(lat * factor))
+        ilon = int(round(lon * factor))
+        _encode_signed(ilat - prev_lat, out)
+        _encode_signed(ilon - prev_lon, out)
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+
+def decode_polyline(encoded: str, precision: int = COORD_PRECISION) -> List[List[float]]:
+    """Decodes a Google encoded polyline string into [lat, lon] pairs."""
+    factor = 10 ** precision
+    points: List[List[float]] = []
+    index = lat = lon = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append([lat / factor, lon / factor])
+    return points
+
+
+def _delta_encode(values: List[Optional[int]]) -> List[Optional[int]]:
+    """Delta-encodes integers against the previous non-null value (nulls kept as null)."""
+    out: List[Optional[int]] = []
+    prev = 0
+    for value in values:
+        if value is None:
+            out.append(None)
+        else:
+            out.append(value - prev)
+            prev = value
+    return out
+
+
+def _delta_decode(deltas: List[Optional[int]]) -> List[Optional[int]]:
+    out: List[Optional[int]] = []
+    prev = 0
+    for delta in deltas:
+        if delta is None:
+            out.append(None)
+        else:
+            prev += delta
+            out.append(prev)
+    return out
+
+
+def encode_reports_compact(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Encodes a report list (order preserved) into a columnar document:
+
+        {"v": 1, "n": count, "p": 6,
+         "ll": "<polyline of lat/lon>", "llx": [indexes with no coordinates],
+         "t": [delta epoch-ms of timestamp], "pt": [delta epoch-ms of published_at],
+         "cols": {field: [values] | {"c": constant}}}
+
+    Coordinates are rounded to COORD_PRECISION decimals and timestamps to
+    milliseconds; every other field round-trips exactly.
+    """
+    reports = [r for r in reports if isinstance(r, dict)]
+    coords = []
+    missing = []
+    for i, report in enumerate(reports):
+        lat, lon = report.get("lat"), report.get("lon")
+        if lat is None or lon is None:
+            missing.append(i)
+        else:
+            coords.append((float(lat), float(lon)))
+
+    column_names: List[str] = []
+    seen = set(_COORD_KEYS) | set(_TIME_KEYS)
+    for report in reports:
+        for key in report:
+            if key not in seen:
+                seen.add(key)
+                column_names.append(key)
+
+    cols: Dict[str, Any] = {}
+    for name in column_names:
+        values = [report.get(name) for report in reports]
+        if values and all(v == values[0] for v in values[1:]):
+            cols[name] = {"c": values[0]}  # Constant column (e.g. status, floor)
+        else:
+            cols[name] = values
+
+    return {
+        "v": COMPACT_VERSION,
+        "n": len(reports),
+        "p": COORD_PRECISION,
+        "ll": encode_polyline(coords),
+        "llx": missing,
+        "t": _delta_encode([_iso_to_ms(r.get("timestamp")) for r in reports]),
+        "pt": _delta_encode([_iso_to_ms(r.get("published_at")) for r in reports]),
+        "cols": cols,
+    }
+
+
+def decode_reports_compact(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Inverse of encode_reports_compact (mirrors AppUtils.decodeCompactReports in utils.js)."""
+    count = int(doc.get("n", 0))
+    coords = iter(decode_polyline(doc.get("ll", ""), int(doc.get("p", COORD_PRECISION))))
+    missing = set(doc.get("llx", []))
+    timestamps = _delta_decode(doc.get("t", []))
+    published = _delta_decode(doc.get("pt", []))
+    cols = doc.get("cols", {})
+    reports: List[Dict[str, Any]] = []
+    for i in range(count):
+        lat_lon = [None, None] if i in missing else next(coords)
+        report = {
+            "timestamp": _ms_to_iso(timestamps[i]) if i < len(timestamps) else None,
+            "published_at": _ms_to_iso(published[i]) if i < len(published) else None,
+            "lat": lat_lon[0],
+            "lon": lat_lon[1],
+        }
+        for name, column in cols.items():
+            report[name] = column["c"] if isinstance(column, dict) else column[i]
+        reports.append(report)
+    return reports
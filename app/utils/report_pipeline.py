@@ -0,0 +1,238 @@
+# app/utils/report_pipeline.py
+# Per-device report processing after a fetch (conversion, dedupe, stay compaction, detail levels),
+# inline or in an optional process pool.
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple, Sequence
+
+from .trajectory import build_detail_levels, compact_stays
+
+log = logging.getLogger(__name__)
+
+# Config keys the pipeline reads (copied into each work unit; the app config is not picklable)
+PIPELINE_SETTINGS = (
+    "HISTORY_STAY_COMPACTION_ENABLED",
+    "HISTORY_STAY_RADIUS_M",
+    "HISTORY_STAY_MAX_ACCURACY_M",
+    "HISTORY_STAY_MIN_POINTS",
+    "HISTORY_DETAIL_MEDIUM_TOLERANCE_M",
+    "HISTORY_DETAIL_LOW_TOLERANCE_M",
+    "HISTORY_DETAIL_LOW_BUCKET_SECONDS",
+    "HISTORY_ARCHIVE_ENABLED",
+)
+
+# A report crosses the process boundary as a plain tuple in this order
+# (datetimes/strings/numbers only: a fraction of the size of pickled dicts or FindMy objects)
+_VALUE_ATTRS = (
+    ("timestamp",),
+    ("published_at",),
+    ("latitude", "lat"),
+    ("longitude", "lon"),
+    ("horizontal_accuracy", "horizontalAccuracy"),
+    ("altitude",),
+    ("vertical_accuracy", "verticalAccuracy"),
+    ("battery",),
+    ("status",),
+    ("description",),
+    ("confidence",),
+    ("floor",),
+)
+
+
+def to_utc(dt_input: Any) -> Optional[datetime]:
+    """A datetime or ISO string as an aware UTC datetime (naive values are taken as UTC)."""
+    if not dt_input:
+        return None
+    try:
+        if isinstance(dt_input, datetime):
+            return dt_input.astimezone(timezone.utc) if dt_input.tzinfo else dt_input.replace(tzinfo=timezone.utc)
+        if isinstance(dt_input, str):
+            dt_str = dt_input.replace("Z", "+00:00")  # Handle Z for UTC
+            # fromisoformat takes at most 6 fractional digits: trim before any +/- offset
+            if "." in dt_str:
+                head, tail = dt_str.split(".", 1)
+                offset_index = next((tail.find(sign) for sign in "+-" if sign in tail), -1)
+                if offset_index != -1:
+                    dt_str = head + "." + tail[:offset_index][:6] + tail[offset_index:]
+                else:
+                    dt_str = head + "." + tail[:6]
+            dt = datetime.fromisoformat(dt_str)
+            return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    except (ValueError, TypeError) as ve:
+        log.warning(f"Could not parse/convert timestamp '{dt_input}': {ve}")
+    return None
+
+
+def report_values(report: Any) -> Tuple:
+    """Extracts the fields of a FindMy report object (or report-like dict) as a plain tuple."""
+    if isinstance(report, dict):
+        get = report.get
+    else:
+        def get(attr, default=None):
+            return getattr(report, attr, default)
+    values = []
+    for attrs in _VALUE_ATTRS:
+        value = get(attrs[0])
+        if value is None and len(attrs) > 1:
+            value = get(attrs[1])
+        values.append(value)
+    return tuple(values)
+
+
+def report_dict(values: Sequence) -> Dict[str, Any]:
+    """The cached report dictionary (UTC ISO timestamps, float coordinates) for report_values() output."""
+    ts, published, lat, lon, h_acc, alt, v_acc, batt, status, desc, conf, floor = values
+    ts_aware = to_utc(ts)
+    pub_aware = to_utc(published)
+    return {
+        "timestamp": ts_aware.isoformat() if ts_aware else None,
+        "published_at": pub_aware.isoformat() if pub_aware else None,
+        "lat": float(lat) if lat is not None else None,
+        "lon": float(lon) if lon is not None else None,
+        "horizontalAccuracy": float(h_acc) if h_acc is not None else None,
+        "altitude": float(alt) if alt is not None else None,
+        "verticalAccuracy": float(v_acc) if v_acc is not None else None,
+        "battery": batt,
+        "status": status,
+        "description": desc,
+        "confidence": conf,
+        "floor": floor,
+    }
+
+
+def process_device(values_list: List[Tuple], settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts one device's raw report values into its cache entry parts.
+
+    Reports are deduplicated by timestamp (last occurrence wins) and sorted
+    newest first; with HISTORY_STAY_COMPACTION_ENABLED stationary runs are folded
+    into stay records, then the simplified detail levels are built.
+
+    Returns:
+        {"reports": [...], "levels": {...}, "merged": int, "errors": [...], "raw": [...] or None}.
+        "raw" (the uncompacted list) is only set when compaction ran and
+        HISTORY_ARCHIVE_ENABLED asks for raw reports to be archived.
+    """
+    errors: List[str] = []
+    unique = {}
+    for values in values_list:
+        report = report_dict(values)
+        if report.get("timestamp"):
+            unique[report["timestamp"]] = report
+    reports = sorted(unique.values(), key=lambda r: r["timestamp"], reverse=True)
+
+    raw = None
+    merged = 0
+    if reports and settings.get("HISTORY_STAY_COMPACTION_ENABLED", True):
+        if settings.get("HISTORY_ARCHIVE_ENABLED"):
+            raw = reports
+        try:
+            reports, merged = compact_stays(
+                reports,
+                radius_m=float(settings.get("HISTORY_STAY_RADIUS_M", 25)),
+                max_accuracy_m=float(settings.get("HISTORY_STAY_MAX_ACCURACY_M", 100)),
+                min_points=int(settings.get("HISTORY_STAY_MIN_POINTS", 3)),
+            )
+        except Exception as e:
+            errors.append(f"Stay compaction failed: {e}")
+    try:
+        levels = build_detail_levels(reports, settings)
+    except Exception as e:
+        levels = None
+        errors.append(f"Failed to build history levels: {e}")
+    return {"reports": reports, "levels": levels, "merged": merged, "errors": errors, "raw": raw}
+
+
+def _process_batch(batch: List[Tuple[str, List[Tuple]]], settings: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Pool entry point: one work unit of (device_id, values_list) pairs."""
+    return [(device_id, process_device(values_list, settings)) for device_id, values_list in batch]
+
+
+# --- Process Pool ---
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # Never fork: the app is multithreaded (waitress, scheduler), so a forked
+            # child could inherit locks held by other threads
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            if context.get_start_method() == "forkserver":
+                context.set_forkserver_preload([__name__])
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_workers = workers
+            log.info(f"Report processing pool started ({workers} processes, {context.get_start_method()}).")
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def shutdown_pool():
+    """Stops the pool's processes (it is recreated on next use)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def _batches(devices: Dict[str, List[Tuple]], batch_reports: int) -> List[List[Tuple[str, List[Tuple]]]]:
+    """Groups devices into work units of about `batch_reports` reports (a device is never split)."""
+    batches: List[List[Tuple[str, List[Tuple]]]] = []
+    current: List[Tuple[str, List[Tuple]]] = []
+    size = 0
+    for device_id, values_list in sorted(devices.items(), key=lambda item: len(item[1]), reverse=True):
+        if current and size + len(values_list) > batch_reports:
+            batches.append(current)
+            current, size = [], 0
+        current.append((device_id, values_list))
+        size += len(values_list)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def process_devices(devices: Dict[str, List[Tuple]], config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Runs process_device() for every device of one fetch.
+
+    With FETCH_PROCESS_POOL_WORKERS > 0 and at least FETCH_PROCESS_POOL_MIN_REPORTS
+    reports in total, devices are grouped into work units of about
+    FETCH_PROCESS_POOL_BATCH_REPORTS reports and processed in a shared pool of
+    worker processes (all users' fetch threads submit to the same pool, so a
+    sweep uses every core). Smaller fetches, or a broken pool, run inline.
+    """
+    settings = {key: config[key] for key in PIPELINE_SETTINGS if key in config}
+    workers = int(config.get("FETCH_PROCESS_POOL_WORKERS", 0))
+    total = sum(len(values_list) for values_list in devices.values())
+    if workers > 0 and total >= int(config.get("FETCH_PROCESS_POOL_MIN_REPORTS", 2000)):
+        pool = _get_pool(workers)
+        try:
+            futures = [
+                pool.submit(_process_batch, batch, settings)
+                for batch in _batches(devices, max(1, int(config.get("FETCH_PROCESS_POOL_BATCH_REPORTS", 20000))))
+            ]
+            return {device_id: result for future in futures for device_id, result in future.result()}
+        except BrokenProcessPool as e:
+            log.error(f"Report processing pool broke ({e}); processing this fetch inline.")
+            _discard_pool(pool)
+    return {device_id: process_device(values_list, settings) for device_id, values_list in devices.items()}
@@ -0,0 +1,154 @@
+# app/utils/sampling_profiler.py
+# Time-boxed in-process sampling profiler over all threads (collapsed stacks / speedscope).
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, List, Tuple
+
+log = logging.getLogger(__name__)
+
+_run_lock = threading.Lock()  # One profile at a time per process
+# Paths are shown relative to the project root when possible
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+Frame = Tuple[str, str, int]  # (function, file, first line)
+# Leaf functions of parked threads (idle pool workers, scheduler waits); skipped unless include_idle
+_IDLE_LEAVES = frozenset({"wait", "sleep", "select", "poll", "accept", "_wait_for_tstate_lock"})
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is already running in this process."""
+
+
+class ProfileResult:
+    """Samples grouped by thread name as {thread: Counter({(frame, ...): count})}, root frame first."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.duration = 0.0
+        self.sample_count = 0
+        self.stacks: Dict[str, Counter] = {}
+
+    def to_collapsed(self) -> str:
+        """Brendan Gregg's collapsed format ("thread;frame;frame count"), for flamegraph.pl/speedscope."""
+        lines = []
+        for thread_name, stacks in sorted(self.stacks.items()):
+            for stack, count in stacks.most_common():
+                frames = ";".join(_frame_label(f) for f in stack)
+                lines.append(f"{thread_name};{frames} {count}" if frames else f"{thread_name} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self, name: str = "findmy-webapp") -> Dict[str, Any]:
+        """speedscope file format: one sampled profile per thread sharing a frame table."""
+        frame_index: Dict[Frame, int] = {}
+        frames: List[Dict[str, Any]] = []
+        profiles = []
+        for thread_name, stacks in sorted(self.stacks.items()):
+            samples, weights = [], []
+            for stack, count in stacks.items():
+                indexes = []
+                for frame in stack:
+                    index = frame_index.get(frame)
+                    if index is None:
+                        index = len(frames)
+                        frame_index[frame] = index
+                        frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                    indexes.append(index)
+                samples.append(indexes)
+                weights.append(round(count * self.interval, 6))
+            profiles.append({
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(self.duration, 6),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "name": name,
+            "exporter": "app.utils.sampling_profiler",
+        }
+
+
+def _short_path(path: str) -> str:
+    if path.startswith(_ROOT + os.sep):
+        return os.path.relpath(path, _ROOT)
+    for marker in ("site-packages" + os.sep, "lib" + os.sep + "python"):
+        position = path.rfind(marker)
+        if position != -1:
+            return path[position + len(marker):] if marker.startswith("site") else os.path.basename(path)
+    return path
+
+
+def _frame_label(frame: Frame) -> str:
+    return f"{frame[0]} ({frame[1]}:{frame[2]})"
+
+
+def _walk(frame, cache: Dict[Any, Frame]) -> Tuple[Frame, ...]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        entry = cache.get(code)
+        if entry is None:
+            entry = (code.co_name, _short_path(code.co_filename), code.co_firstlineno)
+            cache[code] = entry
+        stack.append(entry)
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def profile_threads(duration: float, interval: float = 0.01, include_idle: bool = False) -> ProfileResult:
+    """
+    Samples every thread's stack (except the caller's) for `duration` seconds.
+
+    Args:
+        duration: Seconds to sample for.
+        interval: Seconds between samples (overhead scales with 1/interval and thread count).
+        include_idle: Keep samples whose leaf frame is a wait/sleep/select primitive.
+
+    Raises:
+        ProfilerBusy: If another profile is running.
+    """
+    if not _run_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running.")
+    try:
+        result = ProfileResult(interval)
+        own_ident = threading.get_ident()
+        code_cache: Dict[Any, Frame] = {}
+        started = time.perf_counter()
+        deadline = started + duration
+        next_sample = started
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = _walk(frame, code_cache)
+                if not include_idle and stack and stack[-1][0] in _IDLE_LEAVES:
+                    continue
+                thread_name = names.get(ident, f"thread-{ident}")
+                result.stacks.setdefault(thread_name, Counter())[stack] += 1
+            result.sample_count += 1
+            next_sample += interval
+            time.sleep(max(0.0, next_sample - time.perf_counter()))
+        result.duration = time.perf_counter() - started
+        log.info(
+            f"Sampling profile finished: {result.sample_count} samples over {result.duration:.1f}s "
+            f"({len(result.stacks)} threads)."
+        )
+        return result
+    finally:
+        _run_lock.release()
+
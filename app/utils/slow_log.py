@@ -0,0 +1,283 @@
+# app/utils/slow_log.py
+# Always-on log of slow HTTP requests and scheduler jobs with the context that explains them.
+
+import contextvars
+import functools
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+
+log = logging.getLogger(__name__)
+
+MAX_FILES_PER_ENTRY = 50  # Bounds an entry when a handler walks many per-user files
+STACK_LIMIT = 40  # Innermost frames kept per stack sample
+
+# Thresholds and buffer size; replaced by configure() from the app config
+_settings: Dict[str, Any] = {
+    "enabled": True,
+    "thresholds": {"request": 1.0, "job": 60.0},
+}
+_entries: deque = deque(maxlen=200)
+_entries_lock = threading.Lock()
+
+_current: contextvars.ContextVar[Optional["_Activity"]] = contextvars.ContextVar("slow_log_activity", default=None)
+_active: Dict[int, "_Activity"] = {}  # thread ident -> running activity (for the stack sampler)
+_active_lock = threading.Lock()
+_sampler: Optional[threading.Thread] = None
+
+
+class _Activity:
+    """Context accumulated while one request or job runs."""
+
+    __slots__ = ("kind", "name", "context", "thread_ident", "thread_name", "started_at", "start",
+                 "threshold", "files", "lock_waits", "stack", "parent")
+
+    def __init__(self, kind: str, name: str, context: Dict[str, Any], threshold: float):
+        thread = threading.current_thread()
+        self.kind = kind
+        self.name = name
+        self.context = context
+        self.thread_ident = thread.ident
+        self.thread_name = thread.name
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.threshold = threshold
+        self.files: Dict[str, Dict[str, Any]] = {}  # path -> {reads, writes, bytes, ms}
+        self.lock_waits: Dict[str, Dict[str, Any]] = {}  # lock -> {count, wait_ms}
+        self.stack: Optional[List[str]] = None
+        self.parent: Optional["_Activity"] = None
+
+    def to_entry(self, duration: float) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(duration * 1000, 1),
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "thread": self.thread_name,
+            **self.context,
+            "files": sorted(self.files.values(), key=lambda f: f["ms"], reverse=True),
+            "lock_waits": sorted(self.lock_waits.values(), key=lambda w: w["wait_ms"], reverse=True),
+            "stack": self.stack,
+        }
+
+
+def configure(config: Dict[str, Any]):
+    """Applies SLOW_LOG_* settings (called at app start and by standalone workers)."""
+    global _entries
+    _settings["enabled"] = bool(config.get("SLOW_LOG_ENABLED", True))
+    _settings["thresholds"] = {
+        "request": int(config.get("SLOW_REQUEST_THRESHOLD_MS", 1000)) / 1000.0,
+        "job": int(config.get("SLOW_JOB_THRESHOLD_MS", 60000)) / 1000.0,
+    }
+    max_entries = max(1, int(config.get("SLOW_LOG_MAX_ENTRIES", 200)))
+    with _entries_lock:
+        if _entries.maxlen != max_entries:
+            _entries = deque(_entries, maxlen=max_entries)
+
+
+# --- Context Capture (called from json_utils and lock_stats; no-ops outside an activity) ---
+
+def note_file(operation: str, file_path: Any, size: int, seconds: float):
+    """Records a JSON file read ("read") or write ("write") by the current activity."""
+    activity = _current.get()
+    if activity is None:
+        return
+    key = str(file_path)
+    entry = activity.files.get(key)
+    if entry is None:
+        if len(activity.files) >= MAX_FILES_PER_ENTRY:
+            return
+        entry = {"path": key, "reads": 0, "writes": 0, "bytes": 0, "ms": 0.0}
+        activity.files[key] = entry
+    entry["reads" if operation == "read" else "writes"] += 1
+    entry["bytes"] = size  # Latest size of the file
+    entry["ms"] = round(entry["ms"] + seconds * 1000, 3)
+
+
+def note_lock_wait(lock_name: str, seconds: float):
+    """Records time the current activity spent waiting for a contended lock."""
+    activity = _current.get()
+    if activity is None:
+        return
+    entry = activity.lock_waits.get(lock_name)
+    if entry is None:
+        entry = {"lock": lock_name, "count": 0, "wait_ms": 0.0}
+        activity.lock_waits[lock_name] = entry
+    entry["count"] += 1
+    entry["wait_ms"] = round(entry["wait_ms"] + seconds * 1000, 3)
+
+
+# --- Stack Sampling ---
+
+def _sample_loop():
+    """Captures one stack per activity that has run past its threshold while it is still running."""
+    while True:
+        with _active_lock:
+            activities = list(_active.values())
+        if activities:
+            now = time.perf_counter()
+            frames = None
+            for activity in activities:
+                if activity.stack is not None or now - activity.start < activity.threshold:
+                    continue
+                if frames is None:
+                    frames = sys._current_frames()
+                frame = frames.get(activity.thread_ident)
+                if frame is not None:
+                    activity.stack = [
+                        line.rstrip() for line in traceback.format_stack(frame, limit=STACK_LIMIT)
+                    ]
+            del frames
+        time.sleep(max(0.05, min(0.25, min(_settings["thresholds"].values()) / 2)))
+
+
+def _ensure_sampler():
+    global _sampler
+    if _sampler is not None:
+        return
+    with _active_lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="SlowLogSampler", daemon=True)
+            _sampler.start()
+
+
+# --- Activities ---
+
+def begin(kind: str, name: str, **context) -> Optional[_Activity]:
+    """Starts tracking an activity in the current thread/context. Pair with finish()."""
+    if not _settings["enabled"]:
+        return None
+    threshold = _settings["thresholds"].get(kind, 1.0)
+    activity = _Activity(kind, name, context, threshold)
+    activity.parent = _current.get()
+    _current.set(activity)
+    with _active_lock:
+        _active[activity.thread_ident] = activity
+    _ensure_sampler()
+    return activity
+
+
+def finish(activity: Optional[_Activity], **context) -> Optional[Dict[str, Any]]:
+    """
+    Ends an activity and, if it ran past its threshold, appends it to the ring buffer.
+
+    Returns:
+        The recorded entry, or None if the activity was fast (or tracking is off).
+    """
+    if activity is None:
+        return None
+    duration = time.perf_counter() - activity.start
+    _current.set(activity.parent)
+    with _active_lock:
+        if activity.parent is not None:
+            _active[activity.thread_ident] = activity.parent
+        else:
+            _active.pop(activity.thread_ident, None)
+    if duration < activity.threshold:
+        return None
+    activity.context.update(context)
+    entry = activity.to_entry(duration)
+    with _entries_lock:
+        _entries.append(entry)
+    log.warning(
+        f"Slow {activity.kind} '{activity.name}': {entry['duration_ms']:.0f}ms "
+        f"(threshold {entry['threshold_ms']:.0f}ms, {len(activity.files)} files, "
+        f"{sum(w['wait_ms'] for w in entry['lock_waits']):.0f}ms lock wait)"
+    )
+    return entry
+
+
+@contextmanager
+def track(kind: str, name: str, **context):
+    """Context-manager form of begin()/finish(); records the exception type on failure."""
+    activity = begin(kind, name, **context)
+    try:
+        yield activity
+    except BaseException as e:
+        finish(activity, error=type(e).__name__)
+        raise
+    finish(activity)
+
+
+def slow_job(name: str):
+    """Decorator tracking a scheduler job as a "job" activity."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track("job", name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def recent_entries(kind: Optional[str] = None, min_ms: float = 0, limit: int = 50) -> List[Dict[str, Any]]:
+    """Most recent slow entries first, optionally filtered by kind and minimum duration."""
+    with _entries_lock:
+        entries = list(_entries)
+    entries.reverse()
+    selected = [
+        e for e in entries
+        if (kind is None or e["kind"] == kind) and e["duration_ms"] >= min_ms
+    ]
+    return selected[:limit]
+
+
+def thresholds_ms() -> Dict[str, float]:
+    return {kind: seconds * 1000 for kind, seconds in _settings["thresholds"].items()}
+
+
+# --- Flask Integration ---
+
+def init_slow_log(app):
+    """
+    Applies the app's SLOW_LOG_* config and tracks every HTTP request. Entries
+    carry the URL rule, method, status, user id and request/response body sizes.
+    """
+    from flask import g, request  # Keeps the module importable without Flask
+    from flask_login import current_user
+
+    configure(app.config)
+    if not _settings["enabled"]:
+        log.info("Slow request/job log disabled (SLOW_LOG_ENABLED=false).")
+        return
+
+    @app.before_request
+    def start_slow_log():
+        g._slow_activity = begin("request", request.path, method=request.method)
+
+    @app.after_request
+    def note_slow_log_response(response):
+        activity = getattr(g, "_slow_activity", None)
+        if activity is not None:
+            activity.context["status"] = response.status_code
+            activity.context["response_bytes"] = response.content_length
+        return response
+
+    @app.teardown_request
+    def finish_slow_log(exc):
+        activity = g.pop("_slow_activity", None)
+        if activity is None:
+            return
+        if request.url_rule is not None:
+            activity.name = request.url_rule.rule  # Bounded: /api/devices/<device_id>/...
+        try:
+            user = current_user.get_id() if current_user.is_authenticated else None
+        except Exception:
+            user = None
+        finish(
+            activity,
+            path=request.path,
+            user=user,
+            request_bytes=request.content_length,
+            **({"status": 500, "error": type(exc).__name__} if exc is not None else {}),
+        )
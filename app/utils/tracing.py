@@ -0,0 +1,213 @@
+# app/utils/tracing.py
+# Lightweight structured trace spans with OTLP/HTTP (JSON) or local JSONL export.
+
+import contextvars
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from .json_utils import dumps_bytes
+
+log = logging.getLogger(__name__)
+
+TRACE_FILE_SUFFIX = ".jsonl"
+# Span of the running operation in this thread/context (None outside a trace)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+_file_lock = threading.Lock()
+
+
+class _Trace:
+    """Spans finished so far in one trace; exported together when the root ends."""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.trace_id = secrets.token_hex(16)
+        self.config = config
+        self.finished: List["Span"] = []
+        self.lock = threading.Lock()
+
+
+class Span:
+    """
+    One timed operation. Use as a context manager, or call end() explicitly
+    (spans must still end in LIFO order within a thread).
+    """
+
+    def __init__(self, name: str, trace: Optional[_Trace], parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.span_id = secrets.token_hex(8) if trace else ""
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        self._token = _current_span.set(self) if trace else None
+
+    @property
+    def recording(self) -> bool:
+        return self.trace is not None
+
+    def set_attribute(self, key: str, value: Any):
+        if self.trace is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        if self.trace is not None:
+            self.attributes.update(attributes)
+
+    def record_error(self, error: Any):
+        if self.trace is not None:
+            self.error = str(error)[:500]
+
+    def end(self):
+        if self.trace is None or self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                _current_span.set(self.parent)  # Ended from another context; best effort
+        with self.trace.lock:
+            self.trace.finished.append(self)
+        if self.parent is None:
+            _export(self.trace)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_error(f"{exc_type.__name__}: {exc}")
+        self.end()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": datetime.fromtimestamp(self.start_ns / 1e9, tz=timezone.utc).isoformat(),
+            "duration_ms": round(((self.end_ns or self.start_ns) - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def start_trace(name: str, config: Dict[str, Any], **attributes) -> Span:
+    """Starts a root span (a new trace) if TRACING_ENABLED, else a no-op span."""
+    if not config.get("TRACING_ENABLED", True):
+        return Span(name, None, None, {})
+    return Span(name, _Trace(config), None, attributes)
+
+
+def start_span(name: str, **attributes) -> Span:
+    """Starts a child of the current span; a no-op outside a trace (e.g. request handlers)."""
+    parent = _current_span.get()
+    if parent is None or parent.trace is None:
+        return Span(name, None, None, {})
+    return Span(name, parent.trace, parent, attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+# --- Export ---
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_payload(trace: _Trace, spans: List[Span]) -> Dict[str, Any]:
+    service_name = trace.config.get("TRACE_SERVICE_NAME", "findmy-webapp")
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "app.utils.tracing"},
+                "spans": [
+                    {
+                        "traceId": trace.trace_id,
+                        "spanId": span.span_id,
+                        "parentSpanId": span.parent.span_id if span.parent else "",
+                        "name": span.name,
+                        "kind": 1,  # SPAN_KIND_INTERNAL
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+                        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+                    }
+                    for span in spans
+                ],
+            }],
+        }]
+    }
+
+
+def _export_otlp(trace: _Trace, spans: List[Span], endpoint: str) -> bool:
+    import requests  # Only needed when a collector is configured
+
+    try:
+        response = requests.post(
+            endpoint,
+            data=dumps_bytes(_otlp_payload(trace, spans)),
+            headers={"Content-Type": "application/json"},
+            timeout=float(trace.config.get("TRACE_OTLP_TIMEOUT_SECONDS", 5)),
+        )
+        if response.status_code >= 300:
+            log.warning(f"OTLP export to {endpoint} failed: HTTP {response.status_code}")
+            return False
+        return True
+    except requests.RequestException as e:
+        log.warning(f"OTLP export to {endpoint} failed: {e}")
+        return False
+
+
+def _export_file(trace: _Trace, spans: List[Span]):
+    trace_dir = Path(trace.config.get("TRACE_DIRECTORY") or Path(trace.config["DATA_DIRECTORY"]) / "traces")
+    now = datetime.now(timezone.utc)
+    path = trace_dir / f"{now.strftime('%Y-%m-%d')}{TRACE_FILE_SUFFIX}"
+    payload = b"".join(dumps_bytes(span.to_dict()) + b"\n" for span in spans)
+    with _file_lock:
+        try:
+            trace_dir.mkdir(parents=True, exist_ok=True)
+            new_file = not path.exists()
+            with open(path, "ab") as f:
+                f.write(payload)
+        except OSError as e:
+            log.error(f"Failed to write trace file {path}: {e}")
+            return
+        if new_file:  # Prune once per day file
+            retention_days = int(trace.config.get("TRACE_RETENTION_DAYS", 3))
+            cutoff = (now - timedelta(days=retention_days)).strftime("%Y-%m-%d")
+            for old in trace_dir.glob(f"*{TRACE_FILE_SUFFIX}"):
+                if old.name[:10] < cutoff:
+                    try:
+                        os.remove(old)
+                    except OSError:
+                        pass
+
+
+def _export(trace: _Trace):
+    """Sends a finished trace to the OTLP collector, or appends it to the local JSONL file."""
+    with trace.lock:
+        spans = sorted(trace.finished, key=lambda s: s.start_ns)
+    try:
+        endpoint = trace.config.get("TRACE_OTLP_ENDPOINT")
+        if endpoint and _export_otlp(trace, spans, endpoint):
+            return
+        _export_file(trace, spans)
+    except Exception as e:
+        log.error(f"Trace export failed: {e}", exc_info=True)
@@ -0,0 +1,238 @@
+# app/utils/trajectory.py
+# Trajectory simplification (Douglas-Peucker, time buckets, stay compaction) for report histories.
+
+import logging
+import math
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
+
+log = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371008.8
+# Named levels served by /api/devices?detail=...; "full" is the stored list itself
+DETAIL_LEVELS = ("low", "medium", "full")
+
+
+def _parse_ts(value: Any) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    except (ValueError, TypeError):
+        return None
+
+
+def _has_coords(report: Dict[str, Any]) -> bool:
+    return report.get("lat") is not None and report.get("lon") is not None
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _project(reports: List[Dict[str, Any]], indexes: List[int]) -> List[Tuple[float, float]]:
+    """Equirectangular projection to metres around the mean latitude (fine at tracker scales)."""
+    mean_lat = sum(float(reports[i]["lat"]) for i in indexes) / len(indexes)
+    kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(mean_lat))
+    ky = math.radians(1) * EARTH_RADIUS_M
+    return [(float(reports[i]["lon"]) * kx, float(reports[i]["lat"]) * ky) for i in indexes]
+
+
+def _segment_distance(p: Tuple[float, float], a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(p[0] - (a[0] + t * dx), p[1] - (a[1] + t * dy))
+
+
+def douglas_peucker(reports: List[Dict[str, Any]], tolerance_m: float, indexes: Optional[List[int]] = None) -> List[int]:
+    """
+    Simplifies a track with the Douglas-Peucker algorithm.
+
+    Args:
+        reports: Report dicts (any order; the track follows list order).
+        tolerance_m: Maximum distance in metres a dropped point may lie from the simplified line.
+        indexes: Optional subset of report indexes to simplify (defaults to all with coordinates).
+
+    Returns:
+        The kept report indexes, in ascending order. Endpoints are always kept.
+    """
+    if indexes is None:
+        indexes = [i for i, r in enumerate(reports) if _has_coords(r)]
+    if len(indexes) <= 2 or tolerance_m <= 0:
+        return list(indexes)
+
+    points = _project(reports, indexes)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]  # Iterative: long histories would overflow recursion
+    while stack:
+        first, last = stack.pop()
+        max_dist, max_at = 0.0, -1
+        for k in range(first + 1, last):
+            dist = _segment_distance(points[k], points[first], points[last])
+            if dist > max_dist:
+                max_dist, max_at = dist, k
+        if max_at != -1 and max_dist > tolerance_m:
+            keep[max_at] = True
+            stack.append((first, max_at))
+            stack.append((max_at, last))
+    return [indexes[k] for k, kept in enumerate(keep) if kept]
+
+
+def time_bucket_downsample(reports: List[Dict[str, Any]], bucket_seconds: int, indexes: Optional[List[int]] = None) -> List[int]:
+    """
+    Keeps one report per time bucket: the most accurate one (lowest horizontalAccuracy).
+
+    Returns:
+        The kept report indexes, in ascending order.
+    """
+    if indexes is None:
+        indexes = [i for i, r in enumerate(reports) if _has_coords(r)]
+    if bucket_seconds <= 0:
+        return list(indexes)
+
+    best: Dict[int, Tuple[float, int]] = {}  # bucket -> (accuracy, index)
+    for i in indexes:
+        ts = _parse_ts(reports[i].get("timestamp"))
+        if ts is None:
+            continue
+        bucket = int(ts // bucket_seconds)
+        accuracy = reports[i].get("horizontalAccuracy")
+        accuracy = float(accuracy) if accuracy is not None else math.inf
+        current = best.get(bucket)
+        if current is None or accuracy < current[0]:
+            best[bucket] = (accuracy, i)
+    return sorted(i for _, i in best.values())
+
+
+def _with_latest(indexes: List[int], reports: List[Dict[str, Any]]) -> List[int]:
+    """Reports are stored newest first; index 0 drives the device's latest status, so keep it."""
+    if reports and 0 not in indexes:
+        return [0] + indexes
+    return indexes
+
+
+def build_detail_levels(reports: List[Dict[str, Any]], config: Dict[str, Any]) -> Dict[str, List[int]]:
+    """
+    Precomputes the simplified levels of a (newest-first) report list.
+
+    "medium" is Douglas-Peucker at HISTORY_DETAIL_MEDIUM_TOLERANCE_M; "low" first
+    keeps the best report per HISTORY_DETAIL_LOW_BUCKET_SECONDS bucket and then
+    applies HISTORY_DETAIL_LOW_TOLERANCE_M. Levels are stored as index lists into
+    the report list, so they cost a few integers per kept point.
+    """
+    medium = douglas_peucker(reports, float(config.get("HISTORY_DETAIL_MEDIUM_TOLERANCE_M", 10)))
+    bucketed = time_bucket_downsample(reports, int(config.get("HISTORY_DETAIL_LOW_BUCKET_SECONDS", 600)))
+    low = douglas_peucker(reports, float(config.get("HISTORY_DETAIL_LOW_TOLERANCE_M", 50)), bucketed)
+    return {"medium": _with_latest(medium, reports), "low": _with_latest(low, reports)}
+
+
+def select_reports(
+    reports: List[Dict[str, Any]],
+    detail: str = "full",
+    levels: Optional[Dict[str, List[int]]] = None,
+    tolerance_m: Optional[float] = None,
+    config: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Returns the reports for a detail level (or an explicit tolerance), preserving order.
+
+    Precomputed `levels` are used when present and consistent with the list;
+    otherwise the level is computed on the fly (e.g. for caches written before
+    levels existed).
+    """
+    if tolerance_m is not None:
+        return [reports[i] for i in _with_latest(douglas_peucker(reports, tolerance_m), reports)]
+    if detail == "full" or not reports:
+        return reports
+    indexes = (levels or {}).get(detail)
+    if not isinstance(indexes, list) or any(not isinstance(i, int) or i >= len(reports) for i in indexes):
+        indexes = build_detail_levels(reports, config or {}).get(detail, [])
+    return [reports[i] for i in indexes]
+
+
+# --- Stay Compaction ---
+
+def _stay_record(members: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Folds a chronological run of reports into one report-shaped "stay" record.
+
+    The record is the newest report unchanged (its own fix stays authoritative
+    for live position, geofences and shares); the run's centroid and best
+    accuracy go under `stay`.
+    """
+    latest = members[-1]
+    accuracies = [float(r["horizontalAccuracy"]) for r in members if r.get("horizontalAccuracy") is not None]
+    record = dict(latest)
+    record["stay"] = {
+        "first_seen": members[0].get("timestamp"),
+        "last_seen": latest.get("timestamp"),
+        "count": len(members),
+        "lat": round(sum(float(r["lat"]) for r in members) / len(members), 7),
+        "lon": round(sum(float(r["lon"]) for r in members) / len(members), 7),
+        "horizontalAccuracy": min(accuracies) if accuracies else None,
+    }
+    return record
+
+
+def compact_stays(
+    reports: List[Dict[str, Any]],
+    radius_m: float = 25,
+    max_accuracy_m: float = 100,
+    min_points: int = 3,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Merges runs of consecutive reports that stay near each other into stay records.
+
+    A report joins the current run while it lies within max(radius_m, its own
+    horizontal accuracy capped at max_accuracy_m) of the run's centroid. Runs of
+    at least min_points reports become one record: the newest report with
+    `stay: {first_seen, last_seen, count, lat, lon, horizontalAccuracy}` (centroid
+    and best accuracy of the run); shorter runs are kept as they are.
+
+    Args:
+        reports: Deduplicated reports, newest first (as stored in the cache).
+
+    Returns:
+        A tuple (compacted reports newest first, number of reports merged away).
+    """
+    output: List[Dict[str, Any]] = []  # Chronological
+    run: List[Dict[str, Any]] = []
+    sum_lat = sum_lon = 0.0
+
+    def flush():
+        if len(run) >= min_points:
+            output.append(_stay_record(run))
+        else:
+            output.extend(run)
+
+    for report in reversed(reports):
+        if not _has_coords(report) or "stay" in report:
+            flush()
+            run, sum_lat, sum_lon = [], 0.0, 0.0
+            output.append(report)
+            continue
+        lat, lon = float(report["lat"]), float(report["lon"])
+        if run:
+            accuracy = report.get("horizontalAccuracy")
+            join_radius = max(radius_m, min(float(accuracy), max_accuracy_m) if accuracy is not None else 0.0)
+            if haversine_m(sum_lat / len(run), sum_lon / len(run), lat, lon) > join_radius:
+                flush()
+                run, sum_lat, sum_lon = [], 0.0, 0.0
+        run.append(report)
+        sum_lat += lat
+        sum_lon += lon
+    flush()
+
+    output.reverse()
+    return output, len(reports) - len(output)
@@ -0,0 +1,165 @@
+# app/worker.py
+"""
+Standalone fetch worker, run next to the web processes on the same data directory:
+
+    FETCH_WORKER_ENABLED=true python -m app.worker
+
+With FETCH_WORKER_ENABLED set (for the web processes and the worker), the
+worker owns the background scheduler (periodic fetch sweeps, pruning, outbox
+delivery) and every immediate fetch, so decryption, key derivation and JSON
+work no longer compete with request handling for the web processes' GIL.
+
+The two sides share nothing but the data directory and the change feed
+(app/utils/change_feed.py): web processes publish "fetch_requested" (refresh
+button, credential save, uploads, 2FA) and the worker publishes
+"fetch_completed", on which web processes rebuild the owner's share snapshots
+and drop cached /api/devices bodies. A second worker waits as a standby
+until the first exits (scheduler lock file, see app/scheduler/leader.py).
+"""
+
+import logging
+import os
+import signal
+import sys
+import threading
+from typing import Dict, Any, Set
+
+from app.scheduler.leader import SchedulerLeader, leader_lock_path
+from app.utils import change_feed
+from app.utils.change_feed import ChangeFeedSubscriber
+
+log = logging.getLogger("app.worker")
+
+
+# --- Worker Side ---
+
+class FetchRequestHandler:
+    """Runs requested fetches in threads, at most one per user at a time."""
+
+    def __init__(self, config: Dict[str, Any]):
+        from app.services.user_data_service import UserDataService
+
+        self.config = config
+        self.uds = UserDataService(config)
+        self._running: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Dict[str, Any]):
+        user_id = event.get("user")
+        if not user_id:
+            return
+        with self._lock:
+            if user_id in self._running:
+                log.info(f"Fetch for user '{user_id}' already running; request ({event.get('reason')}) merged.")
+                return
+            self._running.add(user_id)
+        try:
+            apple_id, apple_password, _ = self.uds.load_apple_credentials_and_state(user_id)
+            if not apple_id or not apple_password:
+                log.warning(f"Requested fetch for user '{user_id}' skipped: credentials missing or undecryptable.")
+                self._done(user_id)
+                return
+            log.info(f"Starting requested fetch for user '{user_id}' ({event.get('reason')}).")
+            threading.Thread(
+                target=self._run,
+                args=(user_id, apple_id, apple_password),
+                name=f"WorkerFetch-{user_id}",
+                daemon=True,
+            ).start()
+        except Exception:
+            self._done(user_id)
+            raise
+
+    def _run(self, user_id: str, apple_id: str, apple_password: str):
+        from app.scheduler.tasks import run_fetch_for_user_task
+
+        try:
+            run_fetch_for_user_task(user_id, apple_id, apple_password, self.config)
+        finally:
+            self._done(user_id)
+
+    def _done(self, user_id: str):
+        with self._lock:
+            self._running.discard(user_id)
+
+
+# --- Web Side ---
+
+def start_web_listener(app) -> ChangeFeedSubscriber:
+    """
+    Subscribes a web process to "fetch_completed" events: the owner's share
+    snapshots are rebuilt at once (public viewers never pay for the parse, as
+    when the fetch ran in-process) and cached /api/devices bodies are dropped.
+    """
+    from app.services.device_payload_cache import DevicePayloadCache
+    from app.services.share_snapshot import ShareSnapshotService
+    from app.services.user_data_service import UserDataService
+
+    config = app.config
+
+    def on_fetch_completed(event: Dict[str, Any]):
+        user_id = event.get("user")
+        if not user_id:
+            return
+        uds = UserDataService(config)
+        DevicePayloadCache(config, uds).invalidate(user_id)
+        if event.get("outcome") == "ok":
+            ShareSnapshotService(config, uds).refresh_owner(user_id)
+
+    return ChangeFeedSubscriber(
+        config, on_fetch_completed, event_types=(change_feed.FETCH_COMPLETED,), name="FetchResultListener"
+    ).start()
+
+
+def main() -> int:
+    logging.basicConfig(
+        level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
+        format="%(asctime)s - %(levelname)s - [%(threadName)s:%(name)s] - %(message)s",
+    )
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+
+    from app import create_app, background_scheduler
+
+    app = create_app()  # Adds the scheduler jobs (unless TESTING)
+    config = app.config
+    if not config.get("FETCH_WORKER_ENABLED"):
+        log.critical(
+            "FETCH_WORKER_ENABLED is not set. Set it for the web processes and this worker, "
+            "otherwise the web processes keep running fetches and the scheduler themselves."
+        )
+        return 2
+
+    stop = threading.Event()
+
+    def shutdown_handler(signum, frame):
+        log.warning(f"Received signal {signum}. Stopping fetch worker...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, shutdown_handler)
+    signal.signal(signal.SIGINT, shutdown_handler)
+
+    leader = SchedulerLeader(leader_lock_path(config))
+    retry_seconds = max(1, int(config.get("SCHEDULER_LEADER_RETRY_SECONDS", 30)))
+    while not leader.try_acquire():
+        log.info(f"Fetch worker {leader.current_leader_pid() or '?'} is active; standing by ({retry_seconds}s).")
+        if stop.wait(retry_seconds):
+            return 0
+
+    subscriber = ChangeFeedSubscriber(
+        config, FetchRequestHandler(config), event_types=(change_feed.FETCH_REQUESTED,), name="FetchRequestListener"
+    ).start()
+    background_scheduler.start()
+    log.info(f"Fetch worker running (pid {os.getpid()}): scheduler started, listening for fetch requests.")
+    try:
+        stop.wait()
+    finally:
+        subscriber.stop()
+        if background_scheduler.running:
+            background_scheduler.shutdown(wait=False)
+        leader.release()
+    log.warning("Fetch worker stopped.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# Repeatable performance benchmarks against synthetic data (see benchmarks/run.py).
@@ -0,0 +1,226 @@
+# benchmarks/datagen.py
+# Builds realistic data/ trees (users, devices, reports, geofences, subscriptions, shares).
+
+import argparse
+import base64
+import logging
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+from werkzeug.security import generate_password_hash
+
+from app.services.user_data_service import UserDataService
+from app.utils.helpers import generate_geofence_id
+from app.utils.json_utils import dumps_bytes
+
+from .fake_apple import BASE_LAT, BASE_LON, FakeAppleAccount, patched_login
+
+log = logging.getLogger(__name__)
+
+BENCH_PASSWORD = "bench-password"
+DEVICE_MODELS = (("Accessory/Tag", "tag"), ("iPhone", "phone"), ("Backpack", "backpack"), ("Car", "car"))
+COLORS = ("#4285F4", "#DB4437", "#F4B400", "#0F9D58", "#AB47BC", "#00ACC1")
+
+
+def _user_id(index: int) -> str:
+    return f"bench_user_{index:03d}"
+
+
+def write_history_segments(config: Dict[str, Any], user_id: str, entries: int, days_back: int, rng: random.Random):
+    """
+    Writes notification history straight into dated log segments (the on-disk
+    format of NotificationHistoryLog), spread over the last `days_back` days so
+    pruning has whole segments to drop.
+    """
+    log_dir = Path(config["DATA_DIRECTORY"]) / user_id / config.get("USER_NOTIFICATIONS_LOG_DIRNAME", "notifications_log")
+    log_dir.mkdir(parents=True, exist_ok=True)
+    now = datetime.now(timezone.utc)
+    by_segment: Dict[str, List[Tuple[datetime, bytes]]] = {}
+    for i in range(entries):
+        ts = now - timedelta(seconds=rng.uniform(0, days_back * 86400))
+        entry = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "timestamp": ts.isoformat(),
+            "title": f"Device {i % 7} entered Home",
+            "body": "Geofence event (synthetic)",
+            "is_read": rng.random() < 0.7,
+            "data": {"type": "geofence", "device_id": f"dev_{i % 7}"},
+        }
+        record = {"op": "create", "entry": entry, "ts": ts.timestamp()}
+        by_segment.setdefault(ts.strftime("%Y-%m-%d") + ".jsonl", []).append((ts, dumps_bytes(record) + b"\n"))
+    for name, lines in by_segment.items():
+        lines.sort(key=lambda item: item[0])
+        with open(log_dir / name, "ab") as f:
+            f.write(b"".join(line for _, line in lines))
+
+
+def add_expired_shares(uds: UserDataService, manifest: Dict[str, Any], count: int) -> List[str]:
+    """Adds `count` shares that expired an hour ago (work for the share pruning job)."""
+    expired_at = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    share_ids = []
+    owners = [(user_id, device_id) for user_id, devices in manifest["devices"].items() for device_id in devices]
+    for i in range(count):
+        user_id, device_id = owners[i % len(owners)]
+        share = uds.add_share(user_id, device_id, duration_hours=1, note="expired (synthetic)")
+        if share:
+            uds.share_registry.update(share["share_id"], {"expires_at": expired_at})
+            share_ids.append(share["share_id"])
+    return share_ids
+
+
+def generate_dataset(
+    config: Dict[str, Any],
+    users: int = 5,
+    devices: int = 4,
+    reports: int = 1000,
+    keys_per_device: int = 1,
+    geofences: int = 3,
+    subscriptions: int = 2,
+    shares: int = 2,
+    expired_shares: int = 2,
+    history_entries: int = 200,
+    history_days: int = 60,
+    seed: int = 1,
+) -> Dict[str, Any]:
+    """
+    Populates config["DATA_DIRECTORY"] through the app's own services, then
+    runs one (fake-backend) fetch per user so caches, share snapshots,
+    timelines and notification state exist exactly as in production.
+
+    Args:
+        config: App config (DATA_DIRECTORY/USERS_FILE/SHARES_FILE point at the target tree).
+        users, devices: Number of users and .keys devices per user.
+        reports: Reports per device (split across its keys) returned by the fake backend.
+        keys_per_device: Private keys per .keys file (one Apple request each).
+        geofences, subscriptions: Per user; each device links every geofence.
+        shares, expired_shares: Live shares per user; expired shares in total.
+        history_entries, history_days: Notification history per user and its age spread.
+        seed: Makes the tree reproducible.
+
+    Returns:
+        A manifest: {"users": [...], "devices": {user: [...]}, "shares": [...], "expired_shares": [...], "params": {...}}.
+    """
+    from app.scheduler.tasks import run_fetch_for_user_task  # Imports the scheduler stack
+
+    rng = random.Random(seed)
+    uds = UserDataService(config)
+    password_hash = generate_password_hash(BENCH_PASSWORD, method="pbkdf2:sha256:1000")  # Cheap on purpose
+    user_ids = [_user_id(i) for i in range(users)]
+    uds.save_users({uid: {"email": f"{uid}@bench.invalid", "password_hash": password_hash} for uid in user_ids})
+
+    manifest: Dict[str, Any] = {
+        "users": user_ids,
+        "devices": {},
+        "shares": [],
+        "expired_shares": [],
+        "params": {
+            "users": users, "devices": devices, "reports": reports, "keys_per_device": keys_per_device,
+            "geofences": geofences, "subscriptions": subscriptions, "shares": shares,
+            "expired_shares": expired_shares, "history_entries": history_entries,
+            "history_days": history_days, "seed": seed,
+        },
+    }
+    for user_id in user_ids:
+        user_dir = uds._get_user_data_dir(user_id)
+        uds.save_apple_credentials_and_state(
+            user_id, f"{user_id}@icloud.invalid", "not-a-real-password", FakeAppleAccount().export()
+        )
+
+        geofence_config = {}
+        for g in range(geofences):
+            geofence_config[generate_geofence_id()] = {
+                "name": f"Zone {g + 1}",
+                "lat": BASE_LAT + rng.uniform(-0.2, 0.2),
+                "lng": BASE_LON + rng.uniform(-0.3, 0.3),
+                "radius": rng.choice((150.0, 500.0, 2000.0, 10000.0)),
+            }
+        uds.save_geofences_config(user_id, geofence_config)
+
+        devices_config = {}
+        for d in range(devices):
+            device_id = f"{user_id}_dev{d:02d}"
+            key_lines = [
+                f"Private key: {base64.b64encode(rng.randbytes(28)).decode('ascii')}" for _ in range(keys_per_device)
+            ]
+            (user_dir / f"{device_id}.keys").write_text("\n".join(key_lines) + "\n", encoding="utf-8")
+            model, icon = DEVICE_MODELS[d % len(DEVICE_MODELS)]
+            devices_config[device_id] = {
+                "name": f"{model} {d + 1}",
+                "label": chr(ord("A") + d % 26),
+                "color": COLORS[d % len(COLORS)],
+                "model": model,
+                "icon": icon,
+                "linked_geofences": [
+                    {"id": gf_id, "notify_entry": True, "notify_exit": True} for gf_id in geofence_config
+                ],
+            }
+        uds.save_devices_config(user_id, devices_config)
+        manifest["devices"][user_id] = list(devices_config)
+
+        uds.save_subscriptions(user_id, {
+            f"https://push.bench.invalid/{user_id}/{s}": {
+                "endpoint": f"https://push.bench.invalid/{user_id}/{s}",
+                "keys": {
+                    "p256dh": base64.urlsafe_b64encode(rng.randbytes(65)).decode("ascii").rstrip("="),
+                    "auth": base64.urlsafe_b64encode(rng.randbytes(16)).decode("ascii").rstrip("="),
+                },
+            }
+            for s in range(subscriptions)
+        })
+
+        for s in range(shares if devices else 0):
+            share = uds.add_share(user_id, manifest["devices"][user_id][s % devices], duration_hours=0, note=f"Share {s + 1}")
+            if share:
+                manifest["shares"].append(share["share_id"])
+
+        write_history_segments(config, user_id, history_entries, history_days, rng)
+
+    if devices:
+        manifest["expired_shares"] = add_expired_shares(uds, manifest, expired_shares)
+
+    account = FakeAppleAccount(reports_per_key=max(1, reports // max(1, keys_per_device)))
+    with patched_login(account):
+        for user_id in user_ids:
+            run_fetch_for_user_task(user_id, f"{user_id}@icloud.invalid", "not-a-real-password", config)
+    log.info(
+        f"Generated {users} users x {devices} devices x {reports} reports in {config['DATA_DIRECTORY']} "
+        f"({account.calls} fake Apple requests)."
+    )
+    return manifest
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser):
+    """Adds the generate_dataset() size options to a CLI parser."""
+    data = parser.add_argument_group("dataset")
+    data.add_argument("--users", type=int, default=5)
+    data.add_argument("--devices", type=int, default=4, help="Devices per user.")
+    data.add_argument("--reports", type=int, default=1000, help="Reports per device per fetch.")
+    data.add_argument("--keys-per-device", type=int, default=1)
+    data.add_argument("--geofences", type=int, default=3, help="Geofences per user (all linked to every device).")
+    data.add_argument("--subscriptions", type=int, default=2, help="Push subscriptions per user.")
+    data.add_argument("--shares", type=int, default=2, help="Live shares per user.")
+    data.add_argument("--expired-shares", type=int, default=20)
+    data.add_argument("--history-entries", type=int, default=200, help="Notification history entries per user.")
+    data.add_argument("--history-days", type=int, default=60)
+    data.add_argument("--seed", type=int, default=1)
+    return data
+
+
+def dataset_kwargs(args: argparse.Namespace) -> Dict[str, Any]:
+    """generate_dataset() keyword arguments from parsed add_dataset_arguments() options."""
+    return {
+        "users": args.users,
+        "devices": args.devices,
+        "reports": args.reports,
+        "keys_per_device": args.keys_per_device,
+        "geofences": args.geofences,
+        "subscriptions": args.subscriptions,
+        "shares": args.shares,
+        "expired_shares": args.expired_shares,
+        "history_entries": args.history_entries,
+        "history_days": args.history_days,
+        "seed": args.seed,
+    }
@@ -0,0 +1,174 @@
+# benchmarks/harness.py
+# App setup against a scratch data tree, timing loops and JSON result files.
+
+import gc
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable
+
+try:
+    import resource  # Unix only; peak RSS is reported when available
+except ImportError:
+    resource = None
+
+log = logging.getLogger(__name__)
+
+RESULTS_VERSION = 1
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def create_bench_app(data_dir: Path, rate_limits: bool = False):
+    """
+    Creates the Flask app in testing mode with its data tree at `data_dir`.
+
+    FLASK_ENV must already be "testing" when app.config is first imported
+    (benchmarks/run.py sets it). Unless `rate_limits` is set, Flask-Limiter
+    and the public share token buckets are disabled so benchmarks measure
+    handlers, not throttling.
+    """
+    from app.config import config as app_config
+
+    data_dir = Path(data_dir)
+    app_config.DATA_DIRECTORY = data_dir
+    app_config.USERS_FILE = data_dir / "users.json"
+    app_config.SHARES_FILE = data_dir / "shares.json"
+    if not rate_limits:
+        app_config.PUBLIC_RATE_LIMIT_ENABLED = False
+
+    from app import create_app, limiter
+
+    app = create_app()
+    if not rate_limits:
+        limiter.enabled = False
+    return app
+
+
+def login_client(app, user_id: str):
+    """A test client whose session is logged in as user_id (Flask-Login session keys)."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = user_id
+        session["_fresh"] = True
+    return client
+
+
+def peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage // 1024 if sys.platform == "darwin" else usage  # macOS reports bytes
+
+
+def measure(
+    func: Callable[[], Any],
+    repeat: int = 5,
+    warmup: int = 1,
+    setup: Optional[Callable[[], Any]] = None,
+    ops: int = 1,
+) -> Dict[str, Any]:
+    """
+    Times `func` over `repeat` rounds after `warmup` untimed rounds.
+
+    Args:
+        func: One round of work.
+        repeat: Timed rounds.
+        warmup: Untimed rounds first (fills caches; set 0 for cold-only work).
+        setup: Called before every round, untimed (e.g. to recreate work for a pruning job).
+        ops: Operations per round (requests, users...), for per-op figures.
+
+    Returns:
+        Round statistics in seconds plus per-op median and ops/s.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+    samples: List[float] = []
+    gc_was_enabled = gc.isenabled()
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        gc.disable()  # Keep collector pauses from landing in random rounds
+        try:
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "unit": "s",
+        "repeat": repeat,
+        "ops_per_round": ops,
+        "min": samples[0],
+        "median": median,
+        "mean": statistics.fmean(samples),
+        "p95": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "max": samples[-1],
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "per_op_median": median / ops if ops else median,
+        "ops_per_second": ops / median if median > 0 else None,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=5
+        )
+        revision = result.stdout.strip()
+        if revision:
+            dirty = subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                cwd=REPO_ROOT, capture_output=True, text=True, timeout=5,
+            ).stdout.strip()
+            return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return None
+
+
+def environment_info() -> Dict[str, Any]:
+    from app.utils.json_utils import JSON_BACKEND
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "json_backend": JSON_BACKEND,
+    }
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Per-benchmark median ratios (current / baseline) for benchmarks present in both.
+    Rows with ratio > 1 + threshold are flagged as regressions.
+    """
+    rows = []
+    base_results = baseline.get("results", {})
+    for name, result in current.get("results", {}).items():
+        base = base_results.get(name)
+        if not base or not base.get("per_op_median") or "per_op_median" not in result:
+            continue
+        ratio = result["per_op_median"] / base["per_op_median"]
+        rows.append({
+            "name": name,
+            "baseline_ms": round(base["per_op_median"] * 1000, 3),
+            "current_ms": round(result["per_op_median"] * 1000, 3),
+            "ratio": round(ratio, 3),
+            "regression": ratio > 1 + threshold,
+        })
+    return rows
@@ -0,0 +1,108 @@
+# benchmarks/loadserver.py
+"""
+Serves the app under waitress on a synthetic data tree, with the background
+scheduler fetching from the fake Apple backend. Started by benchmarks/loadtest.py;
+can also be run by hand to poke at a loaded instance:
+
+    python -m benchmarks.loadserver --data-dir /tmp/findmy-load --port 5055 --threads 4
+
+An empty --data-dir is populated first (dataset options as in benchmarks/run.py)
+and its manifest written to <data-dir>/manifest.json; an existing tree is reused.
+"""
+
+import os
+
+os.environ["FLASK_ENV"] = "testing"  # Before anything imports app.config
+# config.py validates ProductionConfig at import even when testing; a fixed seed satisfies it
+os.environ.setdefault("SECRET_SEED", "findmy-bench")
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+from .datagen import add_dataset_arguments, dataset_kwargs, generate_dataset
+from .fake_apple import FakeAppleAccount, patched_login
+from .harness import create_bench_app
+
+log = logging.getLogger("benchmarks.loadserver")
+
+MANIFEST_NAME = "manifest.json"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve findmy-webapp on synthetic data for load tests.")
+    add_dataset_arguments(parser)
+    server = parser.add_argument_group("server")
+    server.add_argument("--data-dir", type=Path, required=True)
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--port", type=int, default=5055)
+    server.add_argument("--threads", type=int, default=int(os.getenv("WAITRESS_THREADS", 4)))
+    server.add_argument("--fetch-interval-minutes", type=int, default=1,
+                        help="Master fetch job interval (0 disables the scheduler).")
+    server.add_argument("--rate-limits", action="store_true",
+                        help="Keep Flask-Limiter and the public share token buckets enabled.")
+    backend = parser.add_argument_group("fake backend")
+    backend.add_argument("--latency-ms", type=float, default=150.0, help="Latency per fake fetch_reports call.")
+    backend.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--verbose", action="store_true", help="Show app logging (warnings only by default).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s [%(threadName)s:%(name)s] %(message)s",
+    )
+    log.setLevel(logging.INFO)
+
+    try:
+        from waitress import serve
+    except ImportError:
+        print("waitress is not installed.", file=sys.stderr)
+        return 1
+
+    data_dir = args.data_dir
+    data_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = data_dir / MANIFEST_NAME
+    # Checked before create_app, which writes users.json (and .locks) into the directory
+    reuse = manifest_path.exists()
+    if not reuse and any(data_dir.iterdir()):
+        print(f"{data_dir} is not empty and has no {MANIFEST_NAME}.", file=sys.stderr)
+        return 2
+
+    app = create_bench_app(data_dir, rate_limits=args.rate_limits)
+    if reuse:
+        log.info(f"Reusing dataset in {data_dir}")
+    else:
+        log.info(f"Generating dataset in {data_dir} ...")
+        manifest = generate_dataset(app.config, **dataset_kwargs(args))
+        manifest_path.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+
+    account = FakeAppleAccount(
+        reports_per_key=max(1, args.reports // max(1, args.keys_per_device)),
+        latency_s=args.latency_ms / 1000.0,
+        jitter_s=args.jitter_ms / 1000.0,
+    )
+    with patched_login(account):
+        # create_app skips the scheduler in testing mode; start it as run.py would
+        from app import background_scheduler
+        from app.scheduler.tasks import schedule_jobs
+
+        if args.fetch_interval_minutes > 0:
+            app.config["FETCH_INTERVAL_MINUTES"] = args.fetch_interval_minutes
+            schedule_jobs(app, background_scheduler)
+            background_scheduler.start()
+        log.info(f"Serving on http://{args.host}:{args.port} with {args.threads} threads (pid {os.getpid()})")
+        try:
+            serve(app, host=args.host, port=args.port, threads=args.threads, backlog=2048, _quiet=True)
+        finally:
+            if background_scheduler.running:
+                background_scheduler.shutdown(wait=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
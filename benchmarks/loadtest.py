@@ -0,0 +1,601 @@
+# benchmarks/loadtest.py
+"""
+Load test: drives a locally started server (benchmarks/loadserver.py: waitress,
+background scheduler, fake Apple backend) with realistic client mixes and
+reports latency percentiles, throughput, error rates and server-side CPU/RSS.
+
+    python -m benchmarks.loadtest                                   # all scenarios, defaults
+    python -m benchmarks.loadtest --threads 4 --pollers 10,25,50,100 --duration 60
+    python -m benchmarks.loadtest --scenarios mixed --mixed-pollers 40 --viewers 50
+    python -m benchmarks.loadtest --server-url http://127.0.0.1:5055 --manifest /tmp/load/manifest.json --server-pid 1234
+
+Client classes (closed loop, one thread and keep-alive session each):
+    poller  - logged-in dashboard: GET /api/devices?reports=compact (with
+              If-None-Match) and /api/notifications/unread_count every --poll-interval.
+    viewer  - anonymous share page: GET /public/api/shared/<id> every --viewer-interval.
+    refresh - every --refresh-every seconds, --refresh-burst users POST
+              /api/user/refresh at once, then poll /api/devices every 5s until
+              last_updated changes (as app.js does, up to 90s).
+
+Scenarios: "pollers" runs once per --pollers level (the capacity curve),
+"viewers" and "refresh" run their class alone, "mixed" runs all three.
+The summary reports the largest poller level that met --slo-p95-ms and
+--max-error-rate, scaled to the dashboard's real 5-minute polling interval.
+
+Clients run in this process; with many hundreds of clients the generator's
+own GIL becomes the limit (watch "client_cpu_cores" in the results).
+"""
+
+import os
+
+os.environ["FLASK_ENV"] = "testing"  # Before anything imports app.config
+# config.py validates ProductionConfig at import even when testing; a fixed seed satisfies it
+os.environ.setdefault("SECRET_SEED", "findmy-bench")
+
+import argparse
+import json
+import math
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+import requests
+
+from .datagen import BENCH_PASSWORD, add_dataset_arguments
+from .harness import RESULTS_VERSION, environment_info
+from .loadserver import MANIFEST_NAME
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DASHBOARD_POLL_SECONDS = 300  # FETCH_DEVICES_INTERVAL in static/js/config.js
+REFRESH_POLL_SECONDS = 5  # app.js polls this often after a manual refresh...
+REFRESH_POLL_MAX_SECONDS = 90  # ...for at most this long
+
+
+# --- Measurement ---
+
+class Recorder:
+    """Thread-safe latency/status samples per client class, kept only inside the measured window."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[Tuple[float, bool]]] = {}
+        self._statuses: Dict[str, Dict[str, int]] = {}
+        self.window_start = float("inf")
+        self.window_end = float("inf")
+
+    def record(self, client_class: str, started: float, latency: float, status: Optional[int], ok: bool):
+        if not self.window_start <= started < self.window_end:
+            return
+        with self._lock:
+            self._samples.setdefault(client_class, []).append((latency, ok))
+            counts = self._statuses.setdefault(client_class, {})
+            key = str(status) if status is not None else "connection_error"
+            counts[key] = counts.get(key, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        window = max(1e-9, self.window_end - self.window_start)
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            statuses = {name: dict(counts) for name, counts in self._statuses.items()}
+        result = {}
+        for name, values in samples.items():
+            latencies = sorted(latency for latency, _ in values)
+            errors = sum(1 for _, ok in values if not ok)
+            result[name] = {
+                "requests": len(values),
+                "errors": errors,
+                "error_rate": round(errors / len(values), 4) if values else 0.0,
+                "rps": round(len(values) / window, 2),
+                "p50_ms": _percentile_ms(latencies, 0.50),
+                "p95_ms": _percentile_ms(latencies, 0.95),
+                "p99_ms": _percentile_ms(latencies, 0.99),
+                "max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+                "statuses": statuses.get(name, {}),
+            }
+        return result
+
+
+def _percentile_ms(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))  # Nearest rank
+    return round(sorted_values[index] * 1000, 1)
+
+
+class ProcessSampler:
+    """Samples CPU time, RSS and thread count of a process from /proc (Linux only)."""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.available = pid is not None and Path(f"/proc/{pid}/stat").exists()
+        self._ticks = os.sysconf("SC_CLK_TCK") if self.available else 100
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._rss_max_kb = 0
+        self._threads_max = 0
+
+    def _read(self) -> Optional[Dict[str, float]]:
+        try:
+            stat = Path(f"/proc/{self.pid}/stat").read_text()
+            fields = stat[stat.rindex(")") + 2:].split()
+            status = Path(f"/proc/{self.pid}/status").read_text()
+        except (OSError, ValueError):
+            return None
+        values = {"cpu_s": (int(fields[11]) + int(fields[12])) / self._ticks, "rss_kb": 0, "threads": 0}
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                values["rss_kb"] = int(line.split()[1])
+            elif line.startswith("Threads:"):
+                values["threads"] = int(line.split()[1])
+        return values
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            values = self._read()
+            if values:
+                self._rss_max_kb = max(self._rss_max_kb, values["rss_kb"])
+                self._threads_max = max(self._threads_max, values["threads"])
+
+    def start(self):
+        if not self.available:
+            return
+        self._start_values = self._read()
+        self._start_time = time.monotonic()
+        self._rss_max_kb = self._start_values["rss_kb"] if self._start_values else 0
+        self._threads_max = self._start_values["threads"] if self._start_values else 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="ProcessSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Optional[Dict[str, Any]]:
+        if not self.available or self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        end = self._read()
+        if not end or not self._start_values:
+            return None
+        elapsed = max(1e-9, time.monotonic() - self._start_time)
+        cpu = end["cpu_s"] - self._start_values["cpu_s"]
+        return {
+            "cpu_seconds": round(cpu, 2),
+            "cpu_cores": round(cpu / elapsed, 3),
+            "rss_start_kb": self._start_values["rss_kb"],
+            "rss_max_kb": max(self._rss_max_kb, end["rss_kb"]),
+            "rss_end_kb": end["rss_kb"],
+            "threads_max": max(self._threads_max, end["threads"]),
+        }
+
+
+# --- Virtual Clients ---
+
+class Client:
+    """One closed-loop virtual client with its own keep-alive session."""
+
+    client_class = "client"
+
+    def __init__(self, base_url: str, recorder: Recorder, stop: threading.Event, args: argparse.Namespace,
+                 rng: random.Random, cookies=None):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.stop = stop
+        self.args = args
+        self.rng = rng
+        self.session = requests.Session()
+        if cookies is not None:
+            self.session.cookies.update(cookies)
+
+    def request(self, method: str, path: str, client_class: Optional[str] = None, ok_statuses=(200,), **kwargs):
+        started = time.monotonic()
+        try:
+            response = self.session.request(
+                method, self.base_url + path, timeout=self.args.timeout, allow_redirects=False, **kwargs
+            )
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, None
+        self.recorder.record(
+            client_class or self.client_class, started, time.monotonic() - started, status, status in ok_statuses
+        )
+        return response
+
+    def think(self, seconds: float) -> bool:
+        """Sleeps `seconds` +/-20%; False once the scenario is stopping."""
+        return not self.stop.wait(seconds * self.rng.uniform(0.8, 1.2))
+
+    def run(self):
+        raise NotImplementedError
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self._run_safely, name=f"Load-{self.client_class}", daemon=True)
+        thread.start()
+        return thread
+
+    def _run_safely(self):
+        try:
+            # Spread the first requests over one interval instead of a thundering herd
+            if self.think(self.rng.uniform(0, self.first_delay())):
+                self.run()
+        finally:
+            self.session.close()
+
+    def first_delay(self) -> float:
+        return 0.0
+
+
+class Poller(Client):
+    client_class = "poller"
+
+    def first_delay(self) -> float:
+        return self.args.poll_interval
+
+    def run(self):
+        etag = None
+        while True:
+            headers = {"If-None-Match": etag} if etag else {}
+            response = self.request("GET", "/api/devices?reports=compact", ok_statuses=(200, 304), headers=headers)
+            if response is not None and response.headers.get("ETag"):
+                etag = response.headers["ETag"]
+            self.request("GET", "/api/notifications/unread_count", client_class="poller_unread")
+            if not self.think(self.args.poll_interval):
+                return
+
+
+class Viewer(Client):
+    client_class = "viewer"
+
+    def __init__(self, *a, share_ids: List[str], **kw):
+        super().__init__(*a, **kw)
+        self.share_id = self.rng.choice(share_ids)
+        self.etag = None
+
+    def first_delay(self) -> float:
+        return self.args.viewer_interval
+
+    def run(self):
+        while True:
+            headers = {"If-None-Match": self.etag} if self.etag else {}
+            response = self.request(
+                "GET", f"/public/api/shared/{self.share_id}", ok_statuses=(200, 304), headers=headers
+            )
+            if response is not None and response.headers.get("ETag"):
+                self.etag = response.headers["ETag"]
+            if not self.think(self.args.viewer_interval):
+                return
+
+
+class RefreshBurst(Client):
+    """Every --refresh-every seconds, fires --refresh-burst concurrent refresh flows."""
+
+    client_class = "refresh"
+
+    def __init__(self, *a, user_cookies: List[Any], **kw):
+        super().__init__(*a, **kw)
+        self.user_cookies = user_cookies
+
+    def first_delay(self) -> float:
+        return min(5.0, self.args.refresh_every)
+
+    def _refresh_flow(self, cookies):
+        client = Client(self.base_url, self.recorder, self.stop, self.args, random.Random(self.rng.random()), cookies)
+        try:
+            before = client.request("GET", "/api/devices?reports=compact", client_class="refresh_poll")
+            initial = _last_updated(before)
+            if client.request("POST", "/api/user/refresh", ok_statuses=(202,)) is None:
+                return
+            deadline = time.monotonic() + REFRESH_POLL_MAX_SECONDS
+            while time.monotonic() < deadline and not self.stop.wait(REFRESH_POLL_SECONDS):
+                response = client.request("GET", "/api/devices?reports=compact", client_class="refresh_poll")
+                if _last_updated(response) not in (None, initial):
+                    return
+        finally:
+            client.session.close()
+
+    def run(self):
+        while True:
+            burst = self.rng.sample(self.user_cookies, min(self.args.refresh_burst, len(self.user_cookies)))
+            for cookies in burst:
+                threading.Thread(target=self._refresh_flow, args=(cookies,), name="Load-refresh-flow",
+                                 daemon=True).start()
+            if not self.think(self.args.refresh_every):
+                return
+
+
+def _last_updated(response) -> Optional[str]:
+    if response is None or response.status_code != 200:
+        return None
+    try:
+        return response.json().get("last_updated")
+    except ValueError:
+        return None
+
+
+# --- Server and Sessions ---
+
+def login_all(base_url: str, user_ids: List[str], timeout: float) -> List[Any]:
+    """Logs every dataset user in once (POST /login, as the form does) and returns their cookie jars."""
+    jars = []
+    for user_id in user_ids:
+        with requests.Session() as session:
+            response = session.post(
+                f"{base_url}/login",
+                data={"username": user_id, "password": BENCH_PASSWORD, "remember": "y"},
+                allow_redirects=False,
+                timeout=timeout,
+            )
+            if response.status_code != 302 or not session.cookies:
+                raise RuntimeError(f"Login as {user_id} failed (HTTP {response.status_code})")
+            jars.append(session.cookies.copy())
+    return jars
+
+
+def start_server(args: argparse.Namespace, data_dir: Path) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "benchmarks.loadserver",
+        "--data-dir", str(data_dir),
+        "--host", "127.0.0.1",
+        "--port", str(args.port),
+        "--threads", str(args.threads),
+        "--fetch-interval-minutes", str(args.fetch_interval_minutes),
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+    ]
+    for option in ("users", "devices", "reports", "keys_per_device", "geofences", "subscriptions", "shares",
+                   "expired_shares", "history_entries", "history_days", "seed"):
+        command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    if args.rate_limits:
+        command.append("--rate-limits")
+    if args.verbose:
+        command.append("--verbose")
+    return subprocess.Popen(command, cwd=Path(__file__).resolve().parent.parent)
+
+
+def wait_ready(base_url: str, process: Optional[subprocess.Popen], timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode} before becoming ready")
+        try:
+            if requests.get(f"{base_url}/login", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} not ready after {timeout:.0f}s")
+
+
+# --- Scenarios ---
+
+def run_scenario(
+    name: str,
+    base_url: str,
+    manifest: Dict[str, Any],
+    user_cookies: List[Any],
+    args: argparse.Namespace,
+    server_pid: Optional[int],
+    pollers: int = 0,
+    viewers: int = 0,
+    refresh: bool = False,
+) -> Dict[str, Any]:
+    recorder = Recorder()
+    stop = threading.Event()
+    rng = random.Random(f"{args.seed}-{name}")
+    clients: List[Client] = []
+    for i in range(pollers):
+        clients.append(Poller(base_url, recorder, stop, args, random.Random(rng.random()),
+                              user_cookies[i % len(user_cookies)]))
+    if viewers and not manifest["shares"]:
+        print(f"[{name}] dataset has no live shares; skipping viewers", file=sys.stderr)
+        viewers = 0
+    for _ in range(viewers):
+        clients.append(Viewer(base_url, recorder, stop, args, random.Random(rng.random()), share_ids=manifest["shares"]))
+    if refresh:
+        clients.append(RefreshBurst(base_url, recorder, stop, args, random.Random(rng.random()),
+                                    user_cookies=user_cookies))
+
+    server = ProcessSampler(server_pid)
+    client_cpu_start = time.process_time()
+    threads = [client.start() for client in clients]
+    time.sleep(args.warmup)
+    recorder.window_start = time.monotonic()
+    server.start()
+    time.sleep(args.duration)
+    recorder.window_end = time.monotonic()
+    resources = server.stop()
+    client_cpu = time.process_time() - client_cpu_start
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=args.timeout + 5)
+
+    return {
+        "scenario": name,
+        "clients": {"pollers": pollers, "viewers": viewers, "refresh_burst": args.refresh_burst if refresh else 0},
+        "duration_s": args.duration,
+        "classes": recorder.summary(),
+        "server": resources,
+        "client_cpu_cores": round(client_cpu / (args.warmup + args.duration), 3),
+    }
+
+
+def capacity_summary(results: List[Dict[str, Any]], args: argparse.Namespace) -> Dict[str, Any]:
+    """Largest poller level within the SLO, and the dashboards that represents at the real polling interval."""
+    passing = []
+    for result in results:
+        if not result["scenario"].startswith("pollers"):
+            continue
+        stats = result["classes"].get("poller")
+        if stats and stats["p95_ms"] is not None and stats["p95_ms"] <= args.slo_p95_ms \
+                and stats["error_rate"] <= args.max_error_rate:
+            passing.append(result["clients"]["pollers"])
+    max_pollers = max(passing) if passing else 0
+    return {
+        "waitress_threads": args.threads,
+        "slo_p95_ms": args.slo_p95_ms,
+        "max_error_rate": args.max_error_rate,
+        "max_pollers_within_slo": max_pollers,
+        "poll_interval_s": args.poll_interval,
+        "equivalent_dashboards_at_5min": int(max_pollers * DASHBOARD_POLL_SECONDS / args.poll_interval),
+    }
+
+
+def print_result(result: Dict[str, Any]):
+    print(f"\n== {result['scenario']}  {result['clients']}")
+    print(f"   {'class':<15}{'req':>8}{'rps':>9}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, s in sorted(result["classes"].items()):
+        print(
+            f"   {name:<15}{s['requests']:>8}{s['rps']:>9.1f}{s['error_rate'] * 100:>7.2f}"
+            f"{s['p50_ms'] or 0:>9.1f}{s['p95_ms'] or 0:>9.1f}{s['p99_ms'] or 0:>9.1f}{s['max_ms'] or 0:>9.1f}"
+        )
+    server = result["server"]
+    if server:
+        print(
+            f"   server: {server['cpu_cores']:.2f} cores, RSS {server['rss_start_kb'] // 1024}"
+            f" -> {server['rss_end_kb'] // 1024} MiB (max {server['rss_max_kb'] // 1024}),"
+            f" {server['threads_max']} threads; client {result['client_cpu_cores']:.2f} cores"
+        )
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load-test findmy-webapp under waitress on synthetic data.")
+    add_dataset_arguments(parser)
+    parser.set_defaults(users=20, shares=3)
+    server = parser.add_argument_group("server")
+    server.add_argument("--threads", type=int, default=4, help="WAITRESS_THREADS for the started server.")
+    server.add_argument("--port", type=int, default=5055)
+    server.add_argument("--fetch-interval-minutes", type=int, default=1, help="Scheduler fetch interval (0: off).")
+    server.add_argument("--latency-ms", type=float, default=150.0, help="Fake Apple latency per request.")
+    server.add_argument("--jitter-ms", type=float, default=50.0)
+    server.add_argument("--rate-limits", action="store_true", help="Keep rate limiting enabled on the server (login allows 10/min per IP: use --users <= 10).")
+    server.add_argument("--data-dir", type=Path, help="Data tree to reuse/populate (default: a temp dir).")
+    server.add_argument("--keep-data", action="store_true")
+    server.add_argument("--startup-timeout", type=float, default=600.0, help="Includes dataset generation.")
+    server.add_argument("--server-url", help="Test an already running server instead (needs --manifest).")
+    server.add_argument("--manifest", type=Path, help="manifest.json of the running server's dataset.")
+    server.add_argument("--server-pid", type=int, help="PID of the running server, for resource sampling.")
+    load = parser.add_argument_group("load")
+    load.add_argument("--scenarios", default="pollers,viewers,refresh,mixed")
+    load.add_argument("--pollers", default="5,10,25,50", help="Poller levels for the capacity curve.")
+    load.add_argument("--viewers", type=int, default=25)
+    load.add_argument("--mixed-pollers", type=int, default=25)
+    load.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between a poller's rounds.")
+    load.add_argument("--viewer-interval", type=float, default=2.0)
+    load.add_argument("--refresh-burst", type=int, default=5, help="Users refreshing at once.")
+    load.add_argument("--refresh-every", type=float, default=20.0)
+    load.add_argument("--duration", type=float, default=30.0, help="Measured seconds per scenario.")
+    load.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before each window.")
+    load.add_argument("--cooldown", type=float, default=3.0, help="Pause between scenarios.")
+    load.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout.")
+    load.add_argument("--slo-p95-ms", type=float, default=500.0)
+    load.add_argument("--max-error-rate", type=float, default=0.01)
+    load.add_argument("--output", type=Path, help="Results file (default: benchmarks/results/load-<timestamp>.json).")
+    parser.add_argument("--verbose", action="store_true", help="Show server logging (warnings only by default).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - {"pollers", "viewers", "refresh", "mixed"}
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+    poller_levels = [int(level) for level in args.pollers.split(",") if level.strip()]
+
+    process = None
+    data_dir = None
+    if args.server_url:
+        if not args.manifest:
+            print("--server-url needs --manifest.", file=sys.stderr)
+            return 2
+        base_url = args.server_url.rstrip("/")
+        manifest_path = args.manifest
+        server_pid = args.server_pid
+    else:
+        data_dir = args.data_dir or Path(tempfile.mkdtemp(prefix="findmy-load-"))
+        base_url = f"http://127.0.0.1:{args.port}"
+        manifest_path = data_dir / MANIFEST_NAME
+        process = start_server(args, data_dir)
+        server_pid = process.pid
+
+    results: List[Dict[str, Any]] = []
+    try:
+        print(f"Waiting for {base_url} ...")
+        wait_ready(base_url, process, args.startup_timeout)
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        user_cookies = login_all(base_url, manifest["users"], args.timeout)
+
+        plan: List[Tuple[str, Dict[str, Any]]] = []
+        if "pollers" in scenarios:
+            plan += [(f"pollers-{level}", {"pollers": level}) for level in poller_levels]
+        if "viewers" in scenarios:
+            plan.append(("viewers", {"viewers": args.viewers}))
+        if "refresh" in scenarios:
+            plan.append(("refresh", {"refresh": True}))
+        if "mixed" in scenarios:
+            plan.append(("mixed", {"pollers": args.mixed_pollers, "viewers": args.viewers, "refresh": True}))
+
+        for index, (name, load) in enumerate(plan):
+            if index:
+                time.sleep(args.cooldown)
+            print(f"Running {name} ({args.warmup:.0f}s warmup + {args.duration:.0f}s) ...")
+            result = run_scenario(name, base_url, manifest, user_cookies, args, server_pid, **load)
+            results.append(result)
+            print_result(result)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if data_dir is not None and not args.keep_data and not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    capacity = capacity_summary(results, args)
+    if any(r["scenario"].startswith("pollers") for r in results):
+        print(
+            f"\nCapacity with {args.threads} waitress threads: {capacity['max_pollers_within_slo']} pollers every "
+            f"{args.poll_interval:g}s within p95 <= {args.slo_p95_ms:g} ms "
+            f"(~{capacity['equivalent_dashboards_at_5min']} open dashboards at the 5-minute interval)"
+        )
+
+    document = {
+        "version": RESULTS_VERSION,
+        "kind": "load",
+        "environment": environment_info(),
+        "dataset": manifest["params"],
+        "server": {
+            "url": base_url,
+            "waitress_threads": None if args.server_url else args.threads,
+            "fetch_interval_minutes": None if args.server_url else args.fetch_interval_minutes,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "rate_limits": args.rate_limits,
+        },
+        "load": {
+            "poll_interval_s": args.poll_interval,
+            "viewer_interval_s": args.viewer_interval,
+            "refresh_every_s": args.refresh_every,
+            "warmup_s": args.warmup,
+            "duration_s": args.duration,
+        },
+        "capacity": capacity,
+        "scenarios": results,
+    }
+    output = args.output or RESULTS_DIR / f"load-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
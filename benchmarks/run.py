@@ -0,0 +1,355 @@
+# benchmarks/run.py
+"""
+Runs the benchmark suite against a freshly generated synthetic data tree.
+
+    python -m benchmarks.run                                  # default size, all benchmarks
+    python -m benchmarks.run --users 20 --devices 8 --reports 5000 --latency-ms 150
+    python -m benchmarks.run --only api_devices_cold,public_share --repeat 20
+    python -m benchmarks.run --compare benchmarks/results/v1.json --max-regression 0.15
+
+Results (environment, dataset parameters and per-benchmark statistics) are
+written as JSON to --output. With --compare, per-op medians are compared
+against an earlier results file and the exit status is 1 if any benchmark
+regressed by more than --max-regression.
+"""
+
+import os
+
+os.environ["FLASK_ENV"] = "testing"  # Before anything imports app.config
+# config.py validates ProductionConfig at import even when testing; a fixed seed satisfies it
+os.environ.setdefault("SECRET_SEED", "findmy-bench")
+
+import argparse
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Callable
+
+from .datagen import (
+    add_dataset_arguments,
+    add_expired_shares,
+    dataset_kwargs,
+    generate_dataset,
+    write_history_segments,
+)
+from .fake_apple import FakeAnisetteServer, FakeAppleAccount, patched_login
+from .harness import (
+    RESULTS_VERSION,
+    compare_results,
+    create_bench_app,
+    environment_info,
+    login_client,
+    measure,
+    peak_rss_kb,
+)
+
+log = logging.getLogger("benchmarks")
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+class BenchContext:
+    """Everything a benchmark needs: the app, its config, the generated manifest and CLI args."""
+
+    def __init__(self, app, manifest: Dict[str, Any], args: argparse.Namespace):
+        from app.services.user_data_service import UserDataService
+
+        self.app = app
+        self.config = app.config
+        self.manifest = manifest
+        self.args = args
+        self.uds = UserDataService(app.config)
+        self.users: List[str] = manifest["users"]
+
+    def fake_account(self) -> FakeAppleAccount:
+        return FakeAppleAccount(
+            reports_per_key=max(1, self.args.reports // max(1, self.args.keys_per_device)),
+            latency_s=self.args.latency_ms / 1000.0,
+            jitter_s=self.args.jitter_ms / 1000.0,
+        )
+
+    def measure(self, func: Callable[[], Any], ops: int, setup: Callable[[], Any] = None, warmup: int = None):
+        return measure(
+            func,
+            repeat=self.args.repeat,
+            warmup=self.args.warmup if warmup is None else warmup,
+            setup=setup,
+            ops=max(1, ops),
+        )
+
+
+def _get_ok(client, url: str):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {url} returned HTTP {response.status_code}")
+    return response
+
+
+# --- Benchmarks (name -> function(ctx) returning measure() stats) ---
+
+def bench_fetch_accessory_data(ctx: BenchContext) -> Dict[str, Any]:
+    """AppleDataService.fetch_accessory_data per user (fake backend with --latency-ms per request)."""
+    from app.services.apple_data_service import AppleDataService
+
+    account = ctx.fake_account()
+    service = AppleDataService(ctx.config, ctx.uds)
+
+    def run():
+        for user_id in ctx.users:
+            service.fetch_accessory_data(user_id, account)
+
+    return ctx.measure(run, ops=len(ctx.users))
+
+
+def bench_fetch_task(ctx: BenchContext) -> Dict[str, Any]:
+    """Whole per-user fetch task (fetch, cache save, snapshots, timeline, notifications), users in sequence."""
+    from app.scheduler.tasks import run_fetch_for_user_task
+
+    account = ctx.fake_account()
+
+    def run():
+        with patched_login(account):
+            for user_id in ctx.users:
+                run_fetch_for_user_task(user_id, f"{user_id}@icloud.invalid", "not-a-real-password", ctx.config)
+
+    return ctx.measure(run, ops=len(ctx.users))
+
+
+def bench_fetch_concurrent(ctx: BenchContext) -> Dict[str, Any]:
+    """All users' fetch tasks in parallel threads, as the master fetch job spawns them (lock contention)."""
+    from app.scheduler.tasks import run_fetch_for_user_task
+
+    account = ctx.fake_account()
+
+    def run():
+        with patched_login(account):
+            threads = [
+                threading.Thread(
+                    target=run_fetch_for_user_task,
+                    args=(user_id, f"{user_id}@icloud.invalid", "not-a-real-password", ctx.config),
+                    name=f"FetchUser-{user_id}",
+                )
+                for user_id in ctx.users
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+    return ctx.measure(run, ops=len(ctx.users))
+
+
+def _api_devices(ctx: BenchContext, query: str, cold: bool) -> Dict[str, Any]:
+    from app.services.device_payload_cache import DevicePayloadCache
+
+    clients = {user_id: login_client(ctx.app, user_id) for user_id in ctx.users}
+    payload_cache = DevicePayloadCache(ctx.config, ctx.uds)
+
+    def invalidate():
+        for user_id in ctx.users:
+            payload_cache.invalidate(user_id)
+
+    def run():
+        for client in clients.values():
+            _get_ok(client, f"/api/devices{query}")
+
+    return ctx.measure(run, ops=len(clients), setup=invalidate if cold else None)
+
+
+def bench_api_devices_cold(ctx: BenchContext) -> Dict[str, Any]:
+    """GET /api/devices with the per-user body cache invalidated before every round."""
+    return _api_devices(ctx, "", cold=True)
+
+
+def bench_api_devices_warm(ctx: BenchContext) -> Dict[str, Any]:
+    """GET /api/devices served from the per-user body cache."""
+    return _api_devices(ctx, "", cold=False)
+
+
+def bench_api_devices_compact_low(ctx: BenchContext) -> Dict[str, Any]:
+    """GET /api/devices?reports=compact&detail=low, cold (what the map loads first)."""
+    return _api_devices(ctx, "?reports=compact&detail=low", cold=True)
+
+
+def bench_public_share(ctx: BenchContext) -> Dict[str, Any]:
+    """GET /public/api/shared/<id> for every live share (anonymous viewers)."""
+    client = ctx.app.test_client()
+    share_ids = ctx.manifest["shares"]
+
+    def run():
+        for share_id in share_ids:
+            _get_ok(client, f"/public/api/shared/{share_id}")
+
+    return ctx.measure(run, ops=len(share_ids))
+
+
+def bench_notifications_check(ctx: BenchContext) -> Dict[str, Any]:
+    """Notification checks for every device's latest report, batched per user as in the fetch task."""
+    from app.services.notification_service import NotificationService
+
+    latest = {}
+    for user_id in ctx.users:
+        cache = ctx.uds.load_cache_from_file(user_id) or {}
+        latest[user_id] = {
+            device_id: (device_data["config"], device_data["reports"][0])
+            for device_id, device_data in (cache.get("data") or {}).items()
+            if device_data.get("config") and device_data.get("reports")
+        }
+
+    def run():
+        notifier = NotificationService(ctx.config, ctx.uds)
+        notifier.begin_digest()
+        for user_id, devices in latest.items():
+            notifier.begin_state_batch(user_id)
+            for device_id, (device_config, report) in devices.items():
+                notifier.check_device_notifications(user_id, device_id, report, device_config)
+            notifier.flush_state_batch(user_id, valid_device_ids=set(devices))
+
+    return ctx.measure(run, ops=sum(len(d) for d in latest.values()))
+
+
+def bench_prune_notification_history(ctx: BenchContext) -> Dict[str, Any]:
+    """The daily history pruning job, with fresh out-of-retention segments written before each round."""
+    import random
+    from app.scheduler.tasks import prune_all_notification_histories_job
+
+    rng = random.Random(ctx.args.seed)
+
+    def setup():
+        for user_id in ctx.users:
+            write_history_segments(ctx.config, user_id, ctx.args.history_entries, ctx.args.history_days, rng)
+
+    return ctx.measure(lambda: prune_all_notification_histories_job(ctx.config), ops=len(ctx.users), setup=setup)
+
+
+def bench_prune_shares(ctx: BenchContext) -> Dict[str, Any]:
+    """The share pruning job, with --expired-shares expired shares added before each round."""
+    from app.scheduler.tasks import prune_shares_job
+
+    def setup():
+        add_expired_shares(ctx.uds, ctx.manifest, ctx.args.expired_shares)
+
+    return ctx.measure(lambda: prune_shares_job(ctx.config), ops=max(1, ctx.args.expired_shares), setup=setup)
+
+
+def bench_anisette_probe(ctx: BenchContext) -> Dict[str, Any]:
+    """get_available_anisette_server against a local fake Anisette server (--anisette-latency-ms)."""
+    from app.utils.helpers import get_available_anisette_server
+
+    with FakeAnisetteServer(latency_s=ctx.args.anisette_latency_ms / 1000.0) as server:
+        return ctx.measure(lambda: get_available_anisette_server([server.url]), ops=1)
+
+
+BENCHMARKS: Dict[str, Callable[[BenchContext], Dict[str, Any]]] = {
+    "fetch_accessory_data": bench_fetch_accessory_data,
+    "fetch_task": bench_fetch_task,
+    "fetch_concurrent": bench_fetch_concurrent,
+    "api_devices_cold": bench_api_devices_cold,
+    "api_devices_warm": bench_api_devices_warm,
+    "api_devices_compact_low": bench_api_devices_compact_low,
+    "public_share": bench_public_share,
+    "notifications_check": bench_notifications_check,
+    "prune_notification_history": bench_prune_notification_history,
+    "prune_shares": bench_prune_shares,
+    "anisette_probe": bench_anisette_probe,
+}
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run findmy-webapp benchmarks on synthetic data.")
+    data = add_dataset_arguments(parser)
+    data.add_argument("--data-dir", type=Path, help="Generate into this directory (default: a temp dir).")
+    data.add_argument("--keep-data", action="store_true", help="Do not delete the generated tree.")
+    backend = parser.add_argument_group("fake backend")
+    backend.add_argument("--latency-ms", type=float, default=0.0, help="Latency per fake fetch_reports call.")
+    backend.add_argument("--jitter-ms", type=float, default=0.0)
+    backend.add_argument("--anisette-latency-ms", type=float, default=50.0)
+    run = parser.add_argument_group("run")
+    run.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--warmup", type=int, default=1)
+    run.add_argument("--output", type=Path, help="Results file (default: benchmarks/results/<timestamp>.json).")
+    run.add_argument("--compare", type=Path, help="Earlier results file to compare against.")
+    run.add_argument("--max-regression", type=float, default=0.2, help="Allowed per-op slowdown for --compare.")
+    run.add_argument("--verbose", action="store_true", help="Show app logging (warnings only by default).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    log.setLevel(logging.INFO)
+
+    selected = list(BENCHMARKS)
+    if args.only:
+        selected = [name.strip() for name in args.only.split(",") if name.strip()]
+        unknown = [name for name in selected if name not in BENCHMARKS]
+        if unknown:
+            print(f"Unknown benchmarks: {', '.join(unknown)}", file=sys.stderr)
+            return 2
+
+    data_dir = args.data_dir or Path(tempfile.mkdtemp(prefix="findmy-bench-"))
+    if data_dir.exists() and any(data_dir.iterdir()):
+        print(f"Data directory {data_dir} is not empty.", file=sys.stderr)
+        return 2
+    try:
+        app = create_bench_app(data_dir)
+        log.info(f"Generating dataset in {data_dir} ...")
+        manifest = generate_dataset(app.config, **dataset_kwargs(args))
+        ctx = BenchContext(app, manifest, args)
+
+        results: Dict[str, Any] = {}
+        for name in selected:
+            log.info(f"Running {name} ...")
+            try:
+                results[name] = BENCHMARKS[name](ctx)
+            except Exception as e:
+                log.exception(f"Benchmark {name} failed")
+                results[name] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            r = results[name]
+            print(
+                f"{name:<28} median {r['median'] * 1000:10.2f} ms/round  "
+                f"{r['per_op_median'] * 1000:9.3f} ms/op  p95 {r['p95'] * 1000:10.2f} ms"
+            )
+    finally:
+        if not args.keep_data and not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    document = {
+        "version": RESULTS_VERSION,
+        "environment": environment_info(),
+        "dataset": manifest["params"],
+        "backend": {
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "anisette_latency_ms": args.anisette_latency_ms,
+        },
+        "peak_rss_kb": peak_rss_kb(),
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if baseline.get("dataset") != document["dataset"]:
+            print("Warning: baseline was produced with different dataset parameters.", file=sys.stderr)
+        rows = compare_results(baseline, document, args.max_regression)
+        for row in rows:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{row['name']:<28} {row['baseline_ms']:9.3f} -> {row['current_ms']:9.3f} ms/op  x{row['ratio']:.2f}{flag}")
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
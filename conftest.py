@@ -0,0 +1,8 @@
+# conftest.py
+# Shared pytest setup for the root-level test_*.py modules.
+
+import os
+
+os.environ.setdefault("FLASK_ENV", "testing")  # Before anything imports app.config
+# config.py validates ProductionConfig at import even when testing; a fixed seed satisfies it
+os.environ.setdefault("SECRET_SEED", "findmy-tests")
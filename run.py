@@ -10,6 +10,8 @@ load_dotenv()
 
 # Import create_app and the background_scheduler instance
 from app import create_app, background_scheduler
+from app.scheduler.leader import start_scheduler
+from app.worker import start_web_listener
 
 # --- Logging Setup ---
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -42,14 +44,18 @@ log.info("Flask app instance created.")
 
 # --- Start Scheduler (Moved Here) ---
 # This logic now runs whether run.py is executed directly or imported by WSGI server
-if not app.config.get("TESTING", False):
+if __name__ == "__mp_main__":
+    # Report processing pool processes (FETCH_PROCESS_POOL_WORKERS) re-import this script
+    log.info("Imported by a report processing pool process, scheduler start skipped.")
+elif not app.config.get("TESTING", False):
     log.info(
         f"Checking scheduler status before start. Is running: {background_scheduler.running}, State: {background_scheduler.state}"
     )
     if not background_scheduler.running:
         try:
             log.info("Attempting to start the background scheduler...")
-            background_scheduler.start()
+            # Only one process per data directory runs it (SCHEDULER_MODE, app/scheduler/leader.py)
+            scheduler_leader = start_scheduler(app, background_scheduler)
             time.sleep(0.1)  # Give a moment for state update
             log.info(
                 f"Scheduler start() called. Current state: {background_scheduler.state}, Is running: {background_scheduler.running}"
@@ -65,6 +71,10 @@ else:
     log.info("Detected TESTING environment, scheduler start skipped.")
 # --- End Scheduler Start ---
 
+# --- Fetch Worker Results (FETCH_WORKER_ENABLED: fetches run in `python -m app.worker`) ---
+if app.config.get("FETCH_WORKER_ENABLED") and not app.config.get("TESTING", False) and __name__ != "__mp_main__":
+    fetch_result_listener = start_web_listener(app)
+
 
 # --- Signal Handling for Graceful Shutdown ---
 def shutdown_handler(signum, frame):
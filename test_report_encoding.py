@@ -0,0 +1,124 @@
+# test_report_encoding.py
+# Round trips of the compact report encoding and its polyline coordinates.
+
+import pytest
+
+from app.utils.report_encoding import (
+    COORD_PRECISION,
+    decode_polyline,
+    decode_reports_compact,
+    encode_polyline,
+    encode_reports_compact,
+)
+
+
+def report(timestamp, lat, lon, **fields):
+    return {"timestamp": timestamp, "published_at": timestamp, "lat": lat, "lon": lon, **fields}
+
+
+# --- Polyline ---
+
+def test_polyline_matches_reference_encoding():
+    # Example from Google's "Encoded Polyline Algorithm Format" documentation (precision 5)
+    points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    assert encode_polyline(points, precision=5) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@", precision=5) == [list(p) for p in points]
+
+
+def test_polyline_empty():
+    assert encode_polyline([]) == ""
+    assert decode_polyline("") == []
+
+
+@pytest.mark.parametrize("points", [
+    [(-33.868820, 151.209296), (-34.603684, -58.381559), (-0.000001, -0.000001)],
+    [(0.0, 0.0), (-90.0, -180.0), (90.0, 180.0), (0.0, 0.0)],
+    [(52.520008, 13.404954), (52.520008, 13.404954), (52.520009, 13.404953)],  # Zero and one-unit deltas
+])
+def test_polyline_round_trip_negative_and_extreme_coordinates(points):
+    assert decode_polyline(encode_polyline(points)) == [list(p) for p in points]
+
+
+def test_polyline_rounds_to_precision_6():
+    points = [(48.85661234, 2.35224449), (-48.85661278, -2.35224451)]
+    decoded = decode_polyline(encode_polyline(points))
+    assert decoded == [[48.856612, 2.352244], [-48.856613, -2.352245]]
+    for (lat, lon), (dlat, dlon) in zip(points, decoded):
+        assert abs(lat - dlat) <= 0.5 * 10 ** -COORD_PRECISION
+        assert abs(lon - dlon) <= 0.5 * 10 ** -COORD_PRECISION
+
+
+def test_polyline_rounding_does_not_accumulate():
+    # Deltas are taken between rounded values, so 1000 sub-precision steps cannot drift
+    points = [(10 + i * 0.0000004, -10 - i * 0.0000004) for i in range(1000)]
+    decoded = decode_polyline(encode_polyline(points))
+    assert decoded[-1] == [round(points[-1][0], 6), round(points[-1][1], 6)]
+
+
+# --- Compact reports ---
+
+def test_compact_round_trip():
+    reports = [
+        report("2024-05-01T08:10:00+00:00", -33.868820, 151.209296, horizontalAccuracy=12, status=0, confidence=2),
+        report("2024-05-01T08:05:00+00:00", -33.869001, 151.208870, horizontalAccuracy=35, status=0, confidence=3),
+        report("2024-05-01T08:00:00+00:00", -33.869420, 151.208100, horizontalAccuracy=8, status=0, confidence=1),
+    ]
+    doc = encode_reports_compact(reports)
+    assert doc["n"] == 3
+    assert doc["llx"] == []
+    assert doc["cols"]["status"] == {"c": 0}  # Constant column
+    assert doc["cols"]["horizontalAccuracy"] == [12, 35, 8]
+    assert decode_reports_compact(doc) == reports
+
+
+def test_compact_rounds_coordinates_and_timestamps():
+    reports = [report("2024-05-01T08:00:00.123456+00:00", 51.50000049, -0.12000051)]
+    decoded = decode_reports_compact(encode_reports_compact(reports))
+    assert decoded[0]["lat"] == 51.5
+    assert decoded[0]["lon"] == -0.120001
+    assert decoded[0]["timestamp"] == "2024-05-01T08:00:00.123000+00:00"
+
+
+def test_compact_normalizes_timestamps_to_utc():
+    reports = [
+        report("2024-05-01T08:00:00Z", 1.0, 1.0),
+        report("2024-05-01T10:00:00+02:00", 1.0, 1.0),
+        report("2024-05-01T08:00:00", 1.0, 1.0),  # Naive: taken as UTC
+    ]
+    decoded = decode_reports_compact(encode_reports_compact(reports))
+    assert {r["timestamp"] for r in decoded} == {"2024-05-01T08:00:00+00:00"}
+
+
+def test_compact_missing_coordinates():
+    reports = [
+        report("2024-05-01T08:10:00+00:00", -1.5, -2.5),
+        report("2024-05-01T08:05:00+00:00", None, None),
+        {"timestamp": "2024-05-01T08:02:00+00:00", "published_at": None, "lat": 3.0},  # No lon
+        report("2024-05-01T08:00:00+00:00", -1.25, -2.75),
+    ]
+    doc = encode_reports_compact(reports)
+    assert doc["llx"] == [1, 2]
+    decoded = decode_reports_compact(doc)
+    assert [(r["lat"], r["lon"]) for r in decoded] == [(-1.5, -2.5), (None, None), (None, None), (-1.25, -2.75)]
+
+
+def test_compact_missing_fields_decode_as_none():
+    reports = [
+        report("2024-05-01T08:10:00+00:00", 1.0, 2.0, horizontalAccuracy=5),
+        {"timestamp": None, "lat": 1.0, "lon": 2.0, "stay": {"count": 3}},
+        {"lat": 1.0, "lon": 2.0, "published_at": "not a date"},
+    ]
+    decoded = decode_reports_compact(encode_reports_compact(reports))
+    assert decoded[0]["stay"] is None
+    assert decoded[1]["horizontalAccuracy"] is None
+    assert decoded[1]["stay"] == {"count": 3}
+    assert [r["timestamp"] for r in decoded] == ["2024-05-01T08:10:00+00:00", None, None]
+    assert [r["published_at"] for r in decoded] == ["2024-05-01T08:10:00+00:00", None, None]
+    # Every decoded report has the union of the fields
+    assert all(set(r) == set(decoded[0]) for r in decoded)
+
+
+def test_compact_empty_and_non_dict_entries():
+    assert decode_reports_compact(encode_reports_compact([])) == []
+    reports = [report("2024-05-01T08:00:00+00:00", 1.0, 2.0), None, "junk"]
+    assert decode_reports_compact(encode_reports_compact(reports)) == reports[:1]
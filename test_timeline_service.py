@@ -0,0 +1,199 @@
+# test_timeline_service.py
+# Segmentation edge cases and incremental vs. single-pass timeline updates.
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.timeline_service import TimelineService, _Point
+
+T0 = datetime(2024, 5, 1, 8, 0, tzinfo=timezone.utc)
+HOME = (52.520000, 13.405000)
+OFFICE = (52.500000, 13.450000)  # ~3.8 km from HOME
+CAFE = (52.510000, 13.380000)
+
+
+def make_service(**overrides) -> TimelineService:
+    config = {
+        "TIMELINE_STAY_RADIUS_M": 75,
+        "TIMELINE_MIN_STAY_MINUTES": 10,
+        "TIMELINE_MIN_TRIP_DISTANCE_M": 200,
+        "TIMELINE_PLACE_RADIUS_M": 150,
+        "TIMELINE_RETENTION_DAYS": 0,  # Fixed 2024 timestamps must not age out
+    }
+    config.update(overrides)
+    return TimelineService(config, SimpleNamespace(file_locks={}))
+
+
+def point(minute: float, lat: float, lon: float) -> _Point:
+    ts = T0 + timedelta(minutes=minute)
+    return _Point(ts, ts, lat, lon)
+
+
+def dwell(start_minute: int, minutes: int, where, step: int = 5):
+    return [point(m, *where) for m in range(start_minute, start_minute + minutes + 1, step)]
+
+
+def travel(start_minute: int, minutes: int, origin, destination, steps: int = 6):
+    """Evenly spaced points strictly between origin and destination."""
+    return [
+        point(
+            start_minute + minutes * k / steps,
+            origin[0] + (destination[0] - origin[0]) * k / steps,
+            origin[1] + (destination[1] - origin[1]) * k / steps,
+        )
+        for k in range(1, steps)
+    ]
+
+
+def day_track():
+    """HOME -> OFFICE -> CAFE (short stay) -> OFFICE, then heading HOME (open trip)."""
+    return (
+        dwell(0, 40, HOME)
+        + travel(40, 24, HOME, OFFICE)
+        + dwell(64, 120, OFFICE, step=10)
+        + travel(184, 12, OFFICE, CAFE)
+        + dwell(196, 30, CAFE)
+        + travel(226, 12, CAFE, OFFICE)
+        + dwell(238, 60, OFFICE, step=10)
+        + travel(298, 24, OFFICE, HOME)[:3]
+    )
+
+
+def to_reports(points):
+    """Newest-first report dicts, as stored in the fetch cache."""
+    return [
+        {"timestamp": p.end.isoformat(), "lat": p.lat, "lon": p.lon, "horizontalAccuracy": 10}
+        for p in reversed(points)
+    ]
+
+
+def timeline_without_stamp(timeline):
+    return {key: value for key, value in timeline.items() if key != "updated_at"}
+
+
+# --- segment_points ---
+
+def test_segment_points_empty_and_single_point():
+    service = make_service()
+    assert service.segment_points([]) == []
+    assert service.segment_points([point(0, *HOME)]) == []
+
+
+def test_segment_points_short_dwell_is_not_a_stay():
+    service = make_service()
+    assert service.segment_points(dwell(0, 5, HOME, step=1)) == []
+
+
+def test_segment_points_dwell_at_exactly_min_stay_is_a_stay():
+    segments = make_service().segment_points(dwell(0, 10, HOME))
+    assert [s["type"] for s in segments] == ["stay"]
+    assert segments[0]["duration_s"] == 600
+    assert segments[0]["count"] == 3
+
+
+def test_segment_points_stay_trip_stay():
+    points = dwell(0, 30, HOME) + travel(30, 20, HOME, OFFICE) + dwell(50, 30, OFFICE)
+    segments = make_service().segment_points(points)
+    assert [s["type"] for s in segments] == ["stay", "trip", "stay"]
+    trip = segments[1]
+    # The trip is anchored on the last HOME point and the first OFFICE point
+    assert trip["start"] == (T0 + timedelta(minutes=30)).isoformat()
+    assert trip["end"] == (T0 + timedelta(minutes=50)).isoformat()
+    assert trip["from"] == {"lat": HOME[0], "lon": HOME[1]}
+    assert trip["to"] == {"lat": OFFICE[0], "lon": OFFICE[1]}
+    assert trip["count"] == 7
+    assert 3500 < trip["distance_m"] < 4000
+
+
+def test_segment_points_short_wander_merges_into_previous_stay():
+    nearby = (HOME[0] + 0.001, HOME[1])  # ~110 m: outside the stay radius, under the trip minimum
+    points = dwell(0, 20, HOME) + dwell(25, 20, nearby) + dwell(50, 20, HOME)
+    segments = make_service().segment_points(points)
+    assert [s["type"] for s in segments] == ["stay"]
+    assert segments[0]["start"] == T0.isoformat()
+    assert segments[0]["end"] == (T0 + timedelta(minutes=70)).isoformat()
+    assert segments[0]["count"] == len(points)
+
+
+def test_segment_points_moving_only_is_one_open_trip():
+    segments = make_service().segment_points(travel(0, 30, HOME, OFFICE, steps=10))
+    assert [s["type"] for s in segments] == ["trip"]
+    assert segments[0]["count"] == 9
+
+
+def test_segment_points_movement_below_trip_distance_is_dropped():
+    drift = [point(m, HOME[0] + 0.0004 * m, HOME[1]) for m in range(0, 4)]  # ~130 m in 3 minutes
+    assert make_service().segment_points(drift) == []
+
+
+def test_segment_points_trailing_movement_is_an_open_trip():
+    points = dwell(0, 30, HOME) + travel(30, 20, HOME, OFFICE)[:3]
+    segments = make_service().segment_points(points)
+    assert [s["type"] for s in segments] == ["stay", "trip"]
+    assert segments[1]["from"] == {"lat": HOME[0], "lon": HOME[1]}
+
+
+def test_segment_points_stay_record_spans_first_seen():
+    service = make_service()
+    reports = [{
+        "timestamp": (T0 + timedelta(minutes=30)).isoformat(),
+        "lat": HOME[0] + 0.0001, "lon": HOME[1],  # Newest fix; the centroid is under "stay"
+        "stay": {"first_seen": T0.isoformat(), "count": 7, "lat": HOME[0], "lon": HOME[1]},
+    }]
+    segments = service.segment_points(service._points_from_reports(reports))
+    assert segments == [{
+        "type": "stay",
+        "start": T0.isoformat(),
+        "end": (T0 + timedelta(minutes=30)).isoformat(),
+        "duration_s": 1800,
+        "lat": HOME[0],
+        "lon": HOME[1],
+        "count": 7,
+    }]
+
+
+# --- Incremental updates ---
+
+def test_single_pass_day_track():
+    timeline = make_service()._update_device(None, to_reports(day_track()))
+    assert [s["type"] for s in timeline["segments"]] == ["stay", "trip", "stay", "trip", "stay", "trip", "stay", "trip"]
+    assert [p["visits"] for p in timeline["places"]] == [2, 1, 1]
+
+
+@pytest.mark.parametrize("cut", range(1, len(day_track())))
+def test_incremental_update_matches_single_pass(cut):
+    service = make_service()
+    points = day_track()
+    expected = service._update_device(None, to_reports(points))
+
+    first = service._update_device(None, to_reports(points[:cut]))
+    updated = service._update_device(first, to_reports(points))
+    assert timeline_without_stamp(updated) == timeline_without_stamp(expected)
+
+
+@pytest.mark.parametrize("cut", range(1, len(day_track())))
+def test_repeated_incremental_updates_match_single_pass(cut):
+    service = make_service()
+    points = day_track()
+    expected = service._update_device(None, to_reports(points))
+
+    timeline = service._update_device(None, to_reports(points[:cut]))
+    timeline = service._update_device(timeline, to_reports(points[:cut]))  # Nothing new
+    for end in range(cut + 1, len(points) + 1):
+        timeline = service._update_device(timeline, to_reports(points[:end]))
+    assert timeline_without_stamp(timeline) == timeline_without_stamp(expected)
+
+
+def test_stay_keeps_start_from_before_the_fetched_window():
+    service = make_service()
+    points = dwell(0, 60, HOME)
+    first = service._update_device(None, to_reports(points[:4]))
+    # The next fetch only returns reports from minute 30 on
+    updated = service._update_device(first, to_reports(points[6:]))
+    assert len(updated["segments"]) == 1
+    stay = updated["segments"][0]
+    assert stay["start"] == T0.isoformat()
+    assert stay["end"] == (T0 + timedelta(minutes=60)).isoformat()
+    assert stay["duration_s"] == 3600